@@ -1,7 +1,14 @@
+from time import time, perf_counter
+time_start = perf_counter()
+
+# Measuring times of all following imports, those are logged when first form is shown
+from startup_timing import ImportTimer
+import_timer = ImportTimer()
+import_timer.install()
+
 from sys import executable
 from os import path, environ
 from datetime import datetime
-from time import time
 from logging import basicConfig, FileHandler, StreamHandler, DEBUG, getLogger
 from PyQt6 import QtWidgets
 from ui import App
@@ -33,7 +40,7 @@ if __name__ == "__main__":
 
     # Running application
     try:
-        root = App(logger, timestamp)
+        root = App(logger, timestamp, time_start, import_timer)
         root.build("reports/2023/quarter/P_6-04_a.json", "reports/2023/quarter/P_6-04_a.pdf")
 
         timestamp_end = datetime.fromtimestamp(time()).strftime("%Y-%m-%d_%H-%M-%S")
@@ -0,0 +1,131 @@
+from numpy import argsort, concatenate, cumsum, nan_to_num, searchsorted, zeros
+
+# Columns of trial balance given by TrialBalanceReader.get_final_df, accounts are followed by amounts
+AMOUNT_COLUMNS = ("debit_turnover", "credit_turnover", "end_balance")
+
+# Character sorted after all characters of account numbers, used for finding end of accounts with given prefix
+PREFIX_END = "\uffff"
+
+class AccountPrefixIndex:
+    '''
+    Trial balance sorted by accounts once with cumulative sums of amounts. Sum of amounts over accounts starting with
+    given prefix is found by binary search instead of filtering the whole trial balance.
+
+    Args:
+        final_df (DataFrame): Trial balance in shape given by TrialBalanceReader.get_final_df, first column contains
+            accounts, following columns contain debit turnovers, credit turnovers and end balances
+    '''
+
+    def __init__(self, final_df):
+        accounts = final_df.iloc[:, 0].astype(str).to_numpy().astype(str)
+        order = argsort(accounts, kind="stable")
+        self.accounts = accounts[order]
+
+        # Cumulative sums starting with zero, sum of rows from i to j is cumsums[j] - cumsums[i]
+        self.cumsums = {}
+        for column_no, amount_column in enumerate(AMOUNT_COLUMNS, start=1):
+            amounts = nan_to_num(final_df.iloc[:, column_no].to_numpy(dtype=float)[order])
+            self.cumsums[amount_column] = concatenate((zeros(1), cumsum(amounts)))
+
+    def get_rows(self, prefix):
+        '''
+        Finds rows of sorted accounts starting with given prefix
+
+        Args:
+            prefix (str): Beginning of account number, e.g. synthetic account "501"
+
+        Returns:
+            rows (tuple): First row and row after last row with given prefix
+        '''
+        return (int(searchsorted(self.accounts, prefix, side="left")),
+                int(searchsorted(self.accounts, prefix + PREFIX_END, side="left")))
+
+    def get_range_rows(self, prefix_from, prefix_to):
+        '''
+        Finds rows of sorted accounts with prefix between given prefixes including both of them
+
+        Args:
+            prefix_from (str): Beginning of first account, e.g. "501"
+            prefix_to (str): Beginning of last account, e.g. "504"
+
+        Returns:
+            rows (tuple): First row and row after last row in given range
+        '''
+        return (int(searchsorted(self.accounts, prefix_from, side="left")),
+                int(searchsorted(self.accounts, prefix_to + PREFIX_END, side="left")))
+
+    def sum_rows(self, rows, amount_column):
+        '''
+        Sums amounts of given rows of sorted accounts
+
+        Args:
+            rows (list): Tuples with first row and row after last row, overlapping rows are summed only once
+            amount_column (str): One of AMOUNT_COLUMNS
+
+        Returns:
+            amount (float): Sum of amounts
+        '''
+        cumsums = self.cumsums[amount_column]
+        amount = 0.0
+        row_end_last = 0
+
+        for row_start, row_end in sorted(rows):
+            row_start = max(row_start, row_end_last)
+            if row_end > row_start:
+                amount += cumsums[row_end] - cumsums[row_start]
+                row_end_last = row_end
+
+        return float(amount)
+
+    def sum_prefixes(self, prefixes, amount_column):
+        '''
+        Sums amounts of accounts starting with any of given prefixes, each account is summed only once
+
+        Args:
+            prefixes (list): Beginnings of account numbers
+            amount_column (str): One of AMOUNT_COLUMNS
+
+        Returns:
+            amount (float): Sum of amounts
+        '''
+        return self.sum_rows([self.get_rows(prefix) for prefix in prefixes], amount_column)
+
+    def sum_prefix(self, prefix, amount_column):
+        '''
+        Sums amounts of accounts starting with given prefix
+
+        Args:
+            prefix (str): Beginning of account number
+            amount_column (str): One of AMOUNT_COLUMNS
+
+        Returns:
+            amount (float): Sum of amounts
+        '''
+        return self.sum_rows([self.get_rows(prefix)], amount_column)
+
+    def sum_range(self, prefix_from, prefix_to, amount_column):
+        '''
+        Sums amounts of accounts with prefix between given prefixes including both of them
+
+        Args:
+            prefix_from (str): Beginning of first account
+            prefix_to (str): Beginning of last account
+            amount_column (str): One of AMOUNT_COLUMNS
+
+        Returns:
+            amount (float): Sum of amounts
+        '''
+        return self.sum_rows([self.get_range_rows(prefix_from, prefix_to)], amount_column)
+
+    def count_prefix(self, prefix):
+        '''
+        Counts accounts starting with given prefix
+
+        Args:
+            prefix (str): Beginning of account number
+
+        Returns:
+            count (int): Number of accounts
+        '''
+        row_start, row_end = self.get_rows(prefix)
+        return row_end - row_start
@@ -0,0 +1,898 @@
+from sys import argv
+from os import path, cpu_count, listdir, getpid
+from json import load, dump
+from time import perf_counter, thread_time
+from threading import Event
+from datetime import datetime
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from logging import basicConfig, FileHandler, StreamHandler, DEBUG, getLogger
+from trial_balance_cache import TrialBalanceCache
+from report_state import ReportState
+from report_pipeline import ReportPipeline
+from report_optimizer import ReportOptimizer
+from stage_metrics import StageMetrics, get_peak_rss
+from excel_reader import list_sheets
+from licence_check import is_licence_token_valid
+from calculation_plan import CalculationPlan
+from compact_trial_balance import CompactTrialBalance
+from account_index import AccountPrefixIndex
+from report_writer import ReportWriter, ReportTemplate
+
+class BatchJob:
+    '''
+    One trial balance to be processed by batch runner
+
+    Args:
+        trial_balance_path (str): Path to the excel file with trial balance
+        sheet (str): Sheet with trial balance in excel file, first sheet is used if not given
+        account_col (str): Column with account numbers
+        debit_turnover_col (str): Column with debit turnovers
+        credit_turnover_col (str): Column with credit turnovers
+        end_balance_col (str): Column with end balances
+        report_output_path (str): Path to file with report output, generated next to trial balance if not given
+    '''
+
+    def __init__(self, trial_balance_path, sheet, account_col, debit_turnover_col, credit_turnover_col,
+                 end_balance_col, report_output_path=None):
+        self.trial_balance_path = trial_balance_path
+        self.sheet = sheet
+        self.account_col = account_col
+        self.debit_turnover_col = debit_turnover_col
+        self.credit_turnover_col = credit_turnover_col
+        self.end_balance_col = end_balance_col
+        self.report_output_path = report_output_path
+
+    @classmethod
+    def from_dict(cls, job_dict):
+        '''
+        Creates job from one item of manifest
+
+        Args:
+            job_dict (dict): Item of manifest with keys named as arguments of this class
+
+        Returns:
+            job (BatchJob): Created job
+        '''
+        return cls(job_dict["trial_balance_path"], job_dict.get("sheet"), job_dict["account_col"],
+                   job_dict["debit_turnover_col"], job_dict["credit_turnover_col"], job_dict["end_balance_col"],
+                   job_dict.get("report_output_path"))
+
+def load_manifest(manifest_path):
+    '''
+    Reads manifest with trial balances to be processed
+
+    Args:
+        manifest_path (str): Path to json file with list of jobs, see BatchJob for keys of each job
+
+    Returns:
+        jobs (list): List of BatchJob instances in order given by manifest
+    '''
+    with open(manifest_path, encoding="utf-8") as manifest_file:
+        manifest = load(manifest_file)
+
+    return [BatchJob.from_dict(job_dict) for job_dict in manifest]
+
+def find_reports(reports_dir):
+    '''
+    Finds reports in folder with reports of one year and interval, e.g. reports/2023/quarter. Report consists of config
+    and template with the same name, e.g. P_6-04_a.json and P_6-04_a.pdf.
+
+    Args:
+        reports_dir (str): Path to folder with reports
+
+    Returns:
+        reports (list): Tuples with paths to report config and report template sorted by name of report
+
+    Raises:
+        ValueError: If more reports have the same report code, their outputs would overwrite each other
+    '''
+    reports = []
+    report_codes = {}
+    for file_name in sorted(listdir(reports_dir)):
+        report_name, extension = path.splitext(file_name)
+        report_config_path = path.join(reports_dir, file_name)
+        report_template_path = path.join(reports_dir, f"{report_name}.pdf")
+
+        if extension.lower() == ".json" and path.exists(report_template_path):
+            with open(report_config_path, encoding="utf-8") as report_config_file:
+                report_code_snake_case = load(report_config_file)["Info"]["01"]["1"].get("report_code_snake_case")
+
+            if report_code_snake_case in report_codes:
+                raise ValueError(f"Reports {report_codes[report_code_snake_case]} and {file_name} have the same "
+                                 f"report code {report_code_snake_case}")
+            report_codes[report_code_snake_case] = file_name
+
+            reports.append((report_config_path, report_template_path))
+
+    return reports
+
+def get_figures(report_calculated):
+    '''
+    Gets figures of calculated report without settings of their calculation and layout
+
+    Args:
+        report_calculated (dict): Calculated report in the same structure as Calculator.calculation_handler
+
+    Returns:
+        figures (dict): Figures in the same structure as report config, info cells are left out
+    '''
+    figures = {}
+    for section, rows in report_calculated.items():
+        for row, columns in rows.items():
+            for column, cell in columns.items():
+                if cell["method"] != "info":
+                    figures.setdefault(section, {}).setdefault(row, {})[column] = cell["figure"]
+
+    return figures
+
+class JobCancelled(Exception):
+    '''
+    Raised when processing of report job was cancelled
+    '''
+
+class ReportJob:
+    '''
+    Processing of one trial balance by stages reading, calculating and writing. Start of each stage is reported by
+    callback and job can be cancelled from another thread, the cancellation takes effect before next stage.
+
+    Args:
+        job (BatchJob): Trial balance with its columns
+        report_output_path (str): Path to file with report output
+        calculation_plan (CalculationPlan): Plan prepared from report config
+        report_template (ReportTemplate): Report template already loaded
+        trial_balance_cache (TrialBalanceCache): Cache of trial balances already read, trial balances are always read
+            from file if not given
+        progress_callback (function): Called with name of stage when stage starts
+        stage_metrics (StageMetrics): Collector of metrics of stages, metrics are only kept in memory if not given
+        incremental (bool): Reuses figures and pages of last run saved in state file next to report output
+        optimize (bool): Rewrites report output in optimized form after writing, see ReportOptimizer
+    '''
+
+    STAGES = ("reading", "calculating", "writing")
+
+    def __init__(self, job, report_output_path, calculation_plan, report_template, trial_balance_cache=None,
+                 progress_callback=None, stage_metrics=None, incremental=False, optimize=False):
+        self.job = job
+        self.report_output_path = report_output_path
+        self.calculation_plan = calculation_plan
+        self.report_template = report_template
+        self.trial_balance_cache = trial_balance_cache or TrialBalanceCache(enabled=False)
+        self.progress_callback = progress_callback
+        self.stage_metrics = stage_metrics or StageMetrics()
+        self.incremental = incremental
+        self.optimize = optimize
+
+        self.cancelled = Event()
+        self.timings = {}
+        self.report_calculated = None
+        self.output_sizes = None  # Size of report output before and after optimization in bytes
+
+        # Set by method prepare before first stage
+        self.sheet = None
+        self.report_state = None
+        self.trial_balance_key = None
+        self.reuse_figures = False
+
+    def cancel(self):
+        '''
+        Requests cancellation of job, it can be called from any thread
+        '''
+        self.cancelled.set()
+
+    def start_stage(self, stage):
+        '''
+        Checks cancellation and reports start of stage
+        '''
+        if self.cancelled.is_set():
+            raise JobCancelled(f"Job cancelled before stage {stage}")
+
+        if self.progress_callback is not None:
+            self.progress_callback(stage)
+
+    def run(self, final_df=None):
+        '''
+        Reads trial balance, calculates report and writes it to output file. Timings of finished stages in seconds are
+        kept in attribute timings, detailed metrics of stages are recorded by stage metrics.
+
+        Args:
+            final_df (DataFrame): Trial balance already read, e.g. shared by more reports, it is read if not given
+
+        Returns:
+            report_calculated (dict): Calculated report written to output file
+        '''
+        with self.stage_metrics.profile():
+            return self.run_stages(final_df)
+
+    def prepare(self):
+        '''
+        Finds sheet of trial balance and in incremental mode loads state of last run. Figures of last run are reused if
+        trial balance and calculation settings of all indicators are the same, then trial balance is not read at all.
+        '''
+        if self.sheet is not None:
+            return
+
+        job = self.job
+        self.sheet = job.sheet or list_sheets(job.trial_balance_path)[0]
+        self.report_state = self.load_report_state()
+
+        if self.incremental:
+            self.trial_balance_key = self.trial_balance_cache.get_key(job.trial_balance_path, self.sheet,
+                                                                      job.account_col, job.debit_turnover_col,
+                                                                      job.credit_turnover_col, job.end_balance_col)
+
+        self.reuse_figures = self.report_state is not None and \
+            self.report_state.trial_balance_key == self.trial_balance_key and \
+            not self.report_state.get_changed_indicators(self.calculation_plan)
+
+    def read_trial_balance(self, executor=None):
+        '''
+        Reads trial balance and forms it to shape needed in Calculator class
+
+        Args:
+            executor (Executor): Pool of processes parsing trial balances, trial balance is parsed in this process if
+                not given
+
+        Returns:
+            final_df (DataFrame or CompactTrialBalance): Trial balance in shape given by
+                TrialBalanceReader.get_final_df, trial balance parsed by pool is given in compact form if it can be
+                converted without loss
+        '''
+        self.prepare()
+        job = self.job
+        arguments = (job.trial_balance_path, self.sheet, job.account_col, job.debit_turnover_col,
+                     job.credit_turnover_col, job.end_balance_col)
+
+        self.start_stage("reading")
+        with self.stage_metrics.measure("read", **self.get_context()) as record:
+            if executor is None:
+                final_df = self.trial_balance_cache.get_final_df(*arguments)
+            else:
+                final_df, worker_record = executor.submit(_read_trial_balance_in_worker, self.trial_balance_cache,
+                                                          *arguments).result()
+                record.update(worker_record)
+            record["rows_read"] = len(final_df)
+        self.timings["read"] = record["wall_time"]
+
+        return final_df
+
+    def get_context(self):
+        return {"trial_balance_path": self.job.trial_balance_path, "report_output_path": self.report_output_path}
+
+    def run_stages(self, final_df=None):
+        '''
+        Runs stages of job one after another, each stage is measured. In incremental mode state of last run is used,
+        so reading and calculating are skipped if no calculation setting changed and only changed pages are rendered.
+        '''
+        self.prepare()
+
+        if final_df is None and not self.reuse_figures:
+            final_df = self.read_trial_balance()
+
+        self.calculate(final_df)
+        self.write()
+
+        return self.report_calculated
+
+    def calculate(self, final_df, prefix_index=None):
+        '''
+        Calculates report from trial balance or takes figures of last run if they can be reused
+
+        Args:
+            final_df (DataFrame): Trial balance, not used if figures of last run are reused
+            prefix_index (AccountPrefixIndex): Index of trial balance shared by more reports, see
+                CalculationPlan.evaluate
+        '''
+        self.prepare()
+        context = self.get_context()
+
+        if self.reuse_figures:
+            self.start_stage("reading")
+            self.start_stage("calculating")
+            with self.stage_metrics.measure("calculate", reused=True, **context) as record:
+                self.report_calculated = self.report_state.get_report_calculated(self.calculation_plan)
+            self.timings["read"] = 0.0
+        else:
+            self.start_stage("calculating")
+            with self.stage_metrics.measure("calculate", **context) as record:
+                self.report_calculated = self.calculation_plan.evaluate(final_df, prefix_index)
+                record["indicators_computed"] = len(self.calculation_plan.indicators)
+        self.timings["calculate"] = record["wall_time"]
+
+    def write(self):
+        '''
+        Writes calculated report into output file, pages not changed since last run are taken from last output. In
+        incremental mode state of this run is saved for the next one.
+        '''
+        report_state = self.report_state
+
+        self.start_stage("writing")
+        with self.stage_metrics.measure("write", **self.get_context()) as record:
+            writer = ReportWriter(self.report_calculated, self.report_template, self.report_output_path,
+                                  self.calculation_plan.report_layout)
+            previous_output_data = self.read_previous_output(report_state)
+
+            # Filling of form fields does not render pages, so there are no pages to be reused
+            if previous_output_data is None or self.calculation_plan.report_layout.by_form_fields:
+                writer.write_report()
+            else:
+                writer.write_report_incrementally(previous_output_data, report_state.get_changed_pages(
+                    self.calculation_plan.report_layout, self.report_calculated,
+                    self.report_template.no_pages_template))
+
+            record["pages_merged"] = writer.pages_merged
+            record["pages_reused"] = writer.pages_reused
+        self.timings["write"] = record["wall_time"]
+
+        if self.optimize:
+            with self.stage_metrics.measure("optimize", **self.get_context()) as record:
+                self.output_sizes = ReportOptimizer().optimize(self.report_output_path)
+                record["size_before"], record["size_after"] = self.output_sizes
+            self.timings["optimize"] = record["wall_time"]
+
+        # State refers to output as it is finally saved
+        if self.incremental:
+            with open(self.report_output_path, "rb") as report_output_file:
+                report_output_data = report_output_file.read()
+            ReportState.from_report(self.trial_balance_key, self.report_template.report_template_key,
+                                    report_output_data, self.calculation_plan, self.report_calculated).save(
+                ReportState.get_state_path(self.report_output_path))
+
+    def load_report_state(self):
+        '''
+        Loads state of last run in incremental mode
+
+        Returns:
+            report_state (ReportState): State of last run, None if job is not incremental or there is no state
+        '''
+        if not self.incremental:
+            return None
+
+        return ReportState.load(ReportState.get_state_path(self.report_output_path))
+
+    def read_previous_output(self, report_state):
+        '''
+        Reads report output of last run, it can be reused only if it was written from the same template and it was not
+        changed since
+
+        Returns:
+            previous_output_data (bytes): Content of report output of last run, None if it cannot be reused
+        '''
+        if report_state is None or report_state.template_key != self.report_template.report_template_key:
+            return None
+
+        try:
+            with open(self.report_output_path, "rb") as report_output_file:
+                previous_output_data = report_output_file.read()
+        except OSError:
+            return None
+
+        if ReportState.get_output_key(previous_output_data) != report_state.output_key:
+            return None
+
+        return previous_output_data
+
+class FanOutJob:
+    '''
+    Processing of one trial balance into more reports, e.g. all reports of company for given period. Trial balance is
+    read and indexed by account prefixes only once, each report is calculated from its own copy of the DataFrame, so
+    report changing it does not affect other reports. Report which fails in calculating or writing is skipped and other
+    reports continue, job fails only if reading or all reports fail.
+
+    Args:
+        report_jobs (list): ReportJob instances of the same trial balance, one for each report
+    '''
+
+    def __init__(self, report_jobs):
+        self.report_jobs = report_jobs
+        self.timings = {}
+        self.output_sizes = {}  # Size of optimized report outputs before and after optimization, key is path
+        self.errors = {}  # Errors of failed reports, key is path to report output
+
+    def cancel(self):
+        '''
+        Requests cancellation of all reports, it can be called from any thread
+        '''
+        for report_job in self.report_jobs:
+            report_job.cancel()
+
+    def run(self):
+        '''
+        Reads trial balance once, then calculates all reports and writes them to their output files. Trial balance is
+        not read at all if figures of last run are reused by all reports in incremental mode. Timings of stages are
+        summed over all reports.
+
+        Returns:
+            reports_calculated (list): Calculated reports in the same order as report jobs, None for failed reports
+        '''
+        with self.report_jobs[0].stage_metrics.profile():
+            self.calculate(self.read())
+            self.write()
+
+        return [None if report_job.report_output_path in self.errors else report_job.report_calculated
+                for report_job in self.report_jobs]
+
+    def read(self, executor=None):
+        '''
+        Reads trial balance for all reports
+
+        Args:
+            executor (Executor): Pool of processes parsing trial balances, trial balance is parsed in this process if
+                not given
+
+        Returns:
+            final_df (DataFrame or CompactTrialBalance): Trial balance, see ReportJob.read_trial_balance, None if no
+                report needs it
+        '''
+        for report_job in self.report_jobs:
+            report_job.prepare()
+            if not report_job.reuse_figures:
+                return report_job.read_trial_balance(executor)
+
+        return None
+
+    def run_report_stage(self, report_job, stage, *args):
+        '''
+        Runs stage of one report, error of report is kept and following stages of the report are skipped. Error is
+        raised only if all reports failed or job was cancelled.
+
+        Args:
+            report_job (ReportJob): Report of trial balance
+            stage (function): Method of report job, e.g. report_job.calculate
+            args: Arguments of stage
+        '''
+        if report_job.report_output_path in self.errors:
+            return
+
+        try:
+            stage(*args)
+        except JobCancelled:
+            raise
+        except Exception as exception:
+            self.errors[report_job.report_output_path] = repr(exception)
+            if len(self.errors) == len(self.report_jobs):
+                raise
+
+    def calculate(self, final_df):
+        '''
+        Calculates all reports from the same trial balance, each report gets its own copy of it and the same prefix
+        index
+
+        Args:
+            final_df (DataFrame or CompactTrialBalance): Trial balance given by read, compact form is converted to
+                DataFrame once for all reports
+        '''
+        if isinstance(final_df, CompactTrialBalance):
+            final_df = final_df.to_df()
+
+        prefix_index = None if final_df is None else AccountPrefixIndex(final_df)
+
+        for report_job in self.report_jobs:
+            # Copied for each report just before its calculation, so only one copy is kept at a time
+            self.run_report_stage(report_job, report_job.calculate, None if final_df is None else final_df.copy(),
+                                  prefix_index)
+
+    def write(self):
+        '''
+        Writes all reports to their output files and sums timings of stages over all reports
+        '''
+        for report_job in self.report_jobs:
+            self.run_report_stage(report_job, report_job.write)
+
+        for report_job in self.report_jobs:
+            for stage, timing in report_job.timings.items():
+                self.timings[stage] = self.timings.get(stage, 0.0) + timing
+            if report_job.output_sizes is not None:
+                self.output_sizes[report_job.report_output_path] = report_job.output_sizes
+
+class BatchRunner:
+    '''
+    Processes many trial balances into reports without user interface. Report config and report template are loaded
+    only once for all trial balances. With additional reports each trial balance is read once and fanned out into all
+    reports, see FanOutJob.
+
+    Args:
+        logger (instance): Instance of logger provided by executive file
+        timestamp (str): Stamp with time when executable file was run
+        report_config_path (str): Path to json file with configuration of selected report
+        report_template_path (str): Path to file with report template
+        calculation_plan (CalculationPlan): Plan already prepared from report config, prepared here if not given
+        trial_balance_cache (TrialBalanceCache): Cache of trial balances already read, trial balances are always read
+            from file if not given
+        stage_metrics (StageMetrics): Collector of metrics of stages, metrics are only kept in memory if not given
+        incremental (bool): Reuses figures and pages of last run of each job, see ReportJob
+        additional_reports (list): Tuples with paths to report config and report template of other reports calculated
+            from the same trial balances
+        optimize (bool): Rewrites report outputs in optimized form, see ReportOptimizer
+    '''
+
+    def __init__(self, logger, timestamp, report_config_path, report_template_path, calculation_plan=None,
+                 trial_balance_cache=None, stage_metrics=None, incremental=False, additional_reports=(),
+                 optimize=False):
+        self.logger = logger
+        self.timestamp = timestamp
+        self.report_config_path = report_config_path
+        self.report_template_path = report_template_path
+        self.trial_balance_cache = trial_balance_cache or TrialBalanceCache(enabled=False)
+        self.stage_metrics = stage_metrics or StageMetrics()
+        self.incremental = incremental
+        self.optimize = optimize
+
+        self.calculation_plan = calculation_plan or CalculationPlan(self.report_config_path)
+        self.report_info = self.calculation_plan.report_info
+        self.report_code_snake_case = self.report_info.get("report_code_snake_case")
+
+        self.report_template = ReportTemplate(self.report_template_path)
+
+        # Calculation plans with report templates of all reports, the selected report is the first one
+        self.additional_reports = list(additional_reports)
+        self.reports = [(self.calculation_plan, self.report_template)]
+        for additional_report_config_path, additional_report_template_path in self.additional_reports:
+            self.reports.append((CalculationPlan(additional_report_config_path),
+                                 ReportTemplate(additional_report_template_path)))
+
+        # Output file of each report is named by its report code
+        report_codes = [calculation_plan.report_info.get("report_code_snake_case")
+                        for calculation_plan, _ in self.reports]
+        if len(set(report_codes)) < len(report_codes):
+            raise ValueError(f"Reports have the same report codes, their outputs would overwrite each other: "
+                             f"{report_codes}")
+
+        self.results = []
+        self.pipeline_stats = None
+
+    def get_report_output_path(self, job, calculation_plan=None):
+        '''
+        Creates output file name in the same folder where the trial balance is located. Name of trial balance file is
+        part of output file name, so reports of more trial balances in one folder do not overwrite each other.
+
+        Args:
+            job (BatchJob): Processed job
+            calculation_plan (CalculationPlan): Plan of one of additional reports, selected report if not given
+
+        Returns:
+            report_output_path (str): Path to file with report output
+        '''
+        if calculation_plan is None or calculation_plan is self.calculation_plan:
+            report_code_snake_case = self.report_code_snake_case
+            if job.report_output_path:
+                return job.report_output_path
+        else:
+            # Output of additional report is named after output of selected report given by job
+            report_code_snake_case = calculation_plan.report_info.get("report_code_snake_case")
+            if job.report_output_path:
+                report_output_root, report_output_extension = path.splitext(job.report_output_path)
+                return f"{report_output_root}_{report_code_snake_case}{report_output_extension}"
+
+        report_output_dirname = path.dirname(job.trial_balance_path)
+        trial_balance_name = path.splitext(path.basename(job.trial_balance_path))[0]
+
+        # Incremental run rewrites output of last run, so its name must not change between runs
+        if self.incremental:
+            return path.join(report_output_dirname, f"{report_code_snake_case}_{trial_balance_name}.pdf")
+
+        return path.join(report_output_dirname, f"{report_code_snake_case}_{trial_balance_name}_{self.timestamp}.pdf")
+
+    def create_fan_out_job(self, job):
+        '''
+        Creates processing of trial balance into all reports
+
+        Args:
+            job (BatchJob): Job to be processed
+
+        Returns:
+            fan_out_job (FanOutJob): Processing of job with one report job for each report
+        '''
+        return FanOutJob([ReportJob(job, self.get_report_output_path(job, calculation_plan), calculation_plan,
+                                    report_template, self.trial_balance_cache, stage_metrics=self.stage_metrics,
+                                    incremental=self.incremental, optimize=self.optimize)
+                          for calculation_plan, report_template in self.reports])
+
+    def create_result(self, job, fan_out_job):
+        '''
+        Creates result of job, its timings are filled in during processing
+
+        Returns:
+            result (dict): Status, error message, output file of each report, errors of failed reports, timings of all
+                stages in seconds and sizes of optimized outputs before and after optimization
+        '''
+        report_output_paths = [report_job.report_output_path for report_job in fan_out_job.report_jobs]
+        return {"trial_balance_path": job.trial_balance_path, "report_output_path": report_output_paths[0],
+                "report_output_paths": report_output_paths, "status": "ok", "error": None,
+                "report_errors": fan_out_job.errors, "timings": fan_out_job.timings,
+                "output_sizes": fan_out_job.output_sizes}
+
+    def complete_result(self, result, fan_out_job):
+        '''
+        Marks result of job with some failed reports as error, outputs of other reports are written
+
+        Args:
+            result (dict): Result given by create_result
+            fan_out_job (FanOutJob): Processed job
+        '''
+        if result["status"] == "ok" and fan_out_job.errors:
+            for report_output_path, error in fan_out_job.errors.items():
+                self.logger.error(f"Report {report_output_path} failed: {error}")
+            result["status"] = "error"
+            result["error"] = f"{len(fan_out_job.errors)} of {len(fan_out_job.report_jobs)} reports failed"
+
+    def create_error_result(self, job, exception):
+        '''
+        Creates result of job which failed outside of its processing, e.g. in crashed worker process
+
+        Returns:
+            result (dict): Result in the same form as given by process_job
+        '''
+        report_output_paths = [self.get_report_output_path(job, calculation_plan)
+                               for calculation_plan, _ in self.reports]
+        return {"trial_balance_path": job.trial_balance_path, "report_output_path": report_output_paths[0],
+                "report_output_paths": report_output_paths, "status": "error", "error": repr(exception),
+                "report_errors": {}, "timings": {"total": 0.0}, "output_sizes": {}}
+
+    def process_job(self, job, include_figures=False):
+        '''
+        Reads trial balance, calculates all reports and writes them to output files. Any error is logged and returned in
+        result, so one bad file does not stop the whole batch.
+
+        Args:
+            job (BatchJob): Job to be processed
+            include_figures (bool): Adds figures of each report to result, see get_figures
+
+        Returns:
+            result (dict): Status, error message, output file of each report and timings of all stages in seconds
+        '''
+        fan_out_job = self.create_fan_out_job(job)
+        result = self.create_result(job, fan_out_job)
+        time_start = perf_counter()
+
+        try:
+            reports_calculated = fan_out_job.run()
+            if include_figures:
+                result["figures"] = [None if report_calculated is None else get_figures(report_calculated)
+                                     for report_calculated in reports_calculated]
+        except Exception as exception:
+            self.logger.exception(f"Processing of {job.trial_balance_path} failed")
+            result["status"] = "error"
+            result["error"] = repr(exception)
+        self.complete_result(result, fan_out_job)
+
+        result["timings"]["total"] = perf_counter() - time_start
+        return result
+
+    def run(self, jobs, workers=1):
+        '''
+        Processes all given jobs one after another or in parallel by pool of worker processes
+
+        Args:
+            jobs (list): List of BatchJob instances
+            workers (int): Number of worker processes, 1 processes jobs in this process, 0 uses all CPU cores
+
+        Returns:
+            results (list): Results of all jobs in the same order as given jobs
+        '''
+        if workers == 0:
+            workers = cpu_count() or 1
+
+        if workers == 1 or len(jobs) <= 1:
+            results = (self.process_job(job) for job in jobs)
+        else:
+            results = self.run_parallel(jobs, workers)
+
+        return self.collect_results(jobs, results)
+
+    def run_pipeline(self, jobs, read_workers=2, calculate_workers=1, write_workers=1, queue_size=4,
+                     stats_interval=None):
+        '''
+        Processes all given jobs by pipeline of stages, see ReportPipeline. Statistics of stages are kept in attribute
+        pipeline_stats.
+
+        Args:
+            jobs (list): List of BatchJob instances
+            read_workers (int): Number of threads reading trial balances and of processes parsing them
+            calculate_workers (int): Number of threads calculating reports
+            write_workers (int): Number of threads writing reports
+            queue_size (int): Maximal number of trial balances waiting for each stage
+            stats_interval (float): Interval of logging of statistics of stages in seconds
+
+        Returns:
+            results (list): Results of all jobs in the same order as given jobs
+        '''
+        pipeline = ReportPipeline(self, read_workers, calculate_workers, write_workers, queue_size, stats_interval)
+        results = pipeline.run(jobs)
+        self.pipeline_stats = pipeline.get_stats()
+
+        return self.collect_results(jobs, results)
+
+    def collect_results(self, jobs, results):
+        '''
+        Logs results of jobs including sizes of optimized outputs and keeps them for summary
+
+        Returns:
+            results (list): Results of all jobs in the same order as given jobs
+        '''
+        self.results = []
+        for job, result in zip(jobs, results):
+            self.logger.info(f"{result['status']}: {job.trial_balance_path} in {result['timings']['total']:.3f} s")
+            for report_output_path, (size_before, size_after) in result["output_sizes"].items():
+                self.logger.info(f"Optimized {report_output_path}: {size_before} B -> {size_after} B")
+            self.results.append(result)
+
+        return self.results
+
+    def run_parallel(self, jobs, workers):
+        '''
+        Processes jobs by pool of worker processes. Calculation plan is sent to workers, each worker loads report
+        template once at its start. Failure of worker process is returned as error result of its job, other jobs
+        continue.
+
+        Args:
+            jobs (list): List of BatchJob instances
+            workers (int): Number of worker processes
+
+        Returns:
+            results (list): Results of all jobs in the same order as given jobs
+        '''
+        results = []
+        with self.create_executor(workers) as executor:
+            futures = [executor.submit(_process_job_in_worker, job) for job in jobs]
+
+            for job, future in zip(jobs, futures):
+                try:
+                    results.append(future.result())
+                except Exception as exception:
+                    self.logger.exception(f"Worker processing {job.trial_balance_path} failed")
+                    results.append(self.create_error_result(job, exception))
+
+        return results
+
+    def create_executor(self, workers):
+        '''
+        Creates pool of worker processes, each worker creates its own runner with settings of this runner at its start,
+        see _init_worker. Jobs are submitted to pool as _process_job_in_worker.
+
+        Args:
+            workers (int): Number of worker processes
+
+        Returns:
+            executor (ProcessPoolExecutor): Pool of worker processes
+        '''
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(self.timestamp, self.report_config_path, self.report_template_path,
+                                             self.calculation_plan, self.trial_balance_cache, self.stage_metrics,
+                                             self.incremental, self.additional_reports, self.optimize))
+
+    def write_summary(self, summary_path):
+        '''
+        Writes results of last run to json file
+
+        Args:
+            summary_path (str): Path to json file with summary
+        '''
+        summary = {"timestamp": self.timestamp, "report_config_path": self.report_config_path,
+                   "additional_report_config_paths": [report_config_path
+                                                      for report_config_path, _ in self.additional_reports],
+                   "processed": len(self.results),
+                   "failed": sum(result["status"] != "ok" for result in self.results),
+                   "output_size_before": sum(size_before for result in self.results
+                                             for size_before, _ in result["output_sizes"].values()),
+                   "output_size_after": sum(size_after for result in self.results
+                                            for _, size_after in result["output_sizes"].values()),
+                   "pipeline_stats": self.pipeline_stats, "results": self.results}
+
+        with open(summary_path, "w", encoding="utf-8") as summary_file:
+            dump(summary, summary_file, ensure_ascii=False, indent=4)
+
+# Worker processes ####################################################################################################
+_worker_runner = None
+
+def _init_worker(timestamp, report_config_path, report_template_path, calculation_plan, trial_balance_cache,
+                 stage_metrics=None, incremental=False, additional_reports=(), optimize=False):
+    '''
+    Initializer of worker process. Creates runner with given calculation plan and loaded template, which are reused for
+    all jobs of worker.
+    '''
+    global _worker_runner
+    _worker_runner = BatchRunner(getLogger(__name__), timestamp, report_config_path, report_template_path,
+                                 calculation_plan, trial_balance_cache, stage_metrics, incremental,
+                                 additional_reports, optimize)
+
+def _read_trial_balance_in_worker(trial_balance_cache, *arguments):
+    '''
+    Reads trial balance in worker process. Trial balance is sent back in compact form, so it is pickled faster and takes
+    less memory while it waits for calculating, trial balance which cannot be converted without loss is sent as it is.
+    Reading is measured in worker, thread of reading stage only waits for it.
+
+    Args:
+        trial_balance_cache (TrialBalanceCache): Cache of trial balances already read
+        arguments: Trial balance with its columns, see TrialBalanceCache.get_final_df
+
+    Returns:
+        final_df (CompactTrialBalance or DataFrame): Trial balance
+        worker_record (dict): Wall time and CPU time of reading in worker, peak RSS of worker process and its pid
+    '''
+    time_start = perf_counter()
+    cpu_time_start = thread_time()
+
+    final_df = trial_balance_cache.get_final_df(*arguments)
+    try:
+        final_df = CompactTrialBalance.from_df(final_df)
+    except ValueError:
+        pass
+
+    return final_df, {"worker_pid": getpid(), "worker_wall_time": perf_counter() - time_start,
+                      "cpu_time": thread_time() - cpu_time_start, "process_peak_rss": get_peak_rss()}
+
+def _process_job_in_worker(job, include_figures=False):
+    '''
+    Processes one job by runner of worker process
+    '''
+    return _worker_runner.process_job(job, include_figures)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Processes trial balances listed in manifest into reports.")
+    parser.add_argument("manifest_path", help="Path to json file with list of trial balances and their columns")
+    parser.add_argument("--config", default="reports/2023/quarter/P_6-04_a.json", help="Path to report config")
+    parser.add_argument("--template", default="reports/2023/quarter/P_6-04_a.pdf", help="Path to report template")
+    parser.add_argument("--report", nargs=2, action="append", default=[], metavar=("CONFIG", "TEMPLATE"),
+                        help="Config and template of additional report calculated from the same trial balances")
+    parser.add_argument("--reports-dir", default=None,
+                        help="Folder with configs and templates of additional reports, e.g. reports/2023/quarter")
+    parser.add_argument("--summary", default=None, help="Path to json file with summary of the run")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes, 0 uses all CPU cores")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlaps reading, calculating and writing of trial balances, --workers is not used")
+    parser.add_argument("--read-workers", type=int, default=2, help="Number of processes reading in pipeline")
+    parser.add_argument("--calculate-workers", type=int, default=1, help="Number of threads calculating in pipeline")
+    parser.add_argument("--write-workers", type=int, default=1, help="Number of threads writing in pipeline")
+    parser.add_argument("--queue-size", type=int, default=4, help="Maximal number of jobs waiting for pipeline stage")
+    parser.add_argument("--cache-dir", default="cache/trial_balances", help="Path to folder with cached trial balances")
+    parser.add_argument("--cache-size", type=int, default=500, help="Maximal size of cache in megabytes")
+    parser.add_argument("--no-cache", action="store_true", help="Always read trial balances from files")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Reuses figures and pages of last run, which were not affected by change of report config")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Deduplicates fonts and XObjects and compresses contents of report outputs")
+    parser.add_argument("--metrics", default=None, help="Path to file with json lines with metrics of stages")
+    parser.add_argument("--trace-memory", action="store_true", help="Measures peak of python allocations per stage")
+    parser.add_argument("--profile", default=None,
+                        help="Path to file with profile of one slow job of each process, pid is added to it")
+    parser.add_argument("--profile-threshold", type=float, default=0.0,
+                        help="Only job taking at least given number of seconds is profiled")
+    parser.add_argument("--profiler", choices=("cprofile", "pyinstrument"), default="cprofile",
+                        help="Profiler used for profiling of slow job")
+    args = parser.parse_args(argv[1:])
+
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    log_path = f"logs/log_batch_{timestamp}.txt"
+
+    # Creating logger
+    log_format = "[%(levelname)s] - %(asctime)s - %(name)s - : %(message)s in %(pathname)s:%(lineno)d"
+    basicConfig(handlers=[FileHandler(log_path), StreamHandler()], level=DEBUG, format=log_format)
+    logger = getLogger(__name__)
+    logger.info(f"Batch log file created with timestamp: {timestamp}\n")
+
+    # Collecting additional reports, each trial balance is read once for all reports
+    additional_reports = [tuple(report) for report in args.report]
+    if args.reports_dir:
+        additional_reports += [report for report in find_reports(args.reports_dir)
+                               if path.abspath(report[0]) != path.abspath(args.config)]
+
+    # Running batch
+    trial_balance_cache = TrialBalanceCache(args.cache_dir, args.cache_size * 1024 ** 2, not args.no_cache)
+    stage_metrics = StageMetrics(args.metrics or f"logs/metrics_batch_{timestamp}.jsonl", args.trace_memory,
+                                 args.profile, args.profile_threshold, args.profiler)
+    runner = BatchRunner(logger, timestamp, args.config, args.template, trial_balance_cache=trial_balance_cache,
+                         stage_metrics=stage_metrics, incremental=args.incremental,
+                         additional_reports=additional_reports, optimize=args.optimize)
+
+    # Batch cannot ask for password, it runs only while licence check of last login in application is valid
+    if not is_licence_token_valid(runner.report_info.get("product_name")):
+        logger.error("Licence was not checked lately, log in to application first")
+        raise SystemExit(1)
+
+    if args.pipeline:
+        runner.run_pipeline(load_manifest(args.manifest_path), args.read_workers, args.calculate_workers,
+                            args.write_workers, args.queue_size, stats_interval=10)
+    else:
+        runner.run(load_manifest(args.manifest_path), args.workers)
+    runner.write_summary(args.summary or f"logs/summary_batch_{timestamp}.json")
@@ -0,0 +1,56 @@
+from json import load
+from report_writer import ReportLayout
+
+# Keys of indicator in report config, which only place figure into report template and do not affect calculation
+LAYOUT_KEYS = ("page", "x_position", "y_position", "field_name")
+
+class CalculationPlan:
+    '''
+    Report config loaded and prepared once, so it can be used for calculation of many trial balances. Plan contains only
+    plain python objects, so it can be pickled and sent to worker processes.
+
+    Report info, layout and indicators are prepared here once, indicators are used to find changes of config in
+    incremental mode. The calculation itself is still done by Calculator, which accepts only path to report config and
+    so reads the config again for every trial balance.
+
+    Args:
+        report_config_path (str): Path to json file with configuration of selected report
+    '''
+
+    def __init__(self, report_config_path):
+        self.report_config_path = report_config_path
+
+        with open(self.report_config_path, encoding="utf-8") as report_config_file:
+            self.report_config = load(report_config_file)
+
+        self.report_info = self.report_config.get("Info").get("01").get("1")
+
+        # Indicators with settings of their calculation, key is tuple (section, row, column), used by ReportState
+        self.indicators = {}
+        for section, rows in self.report_config.items():
+            for row, columns in rows.items():
+                for column, cell in columns.items():
+                    if cell["method"] == "info":
+                        continue
+
+                    self.indicators[(section, row, column)] = {key: value for key, value in cell.items()
+                                                               if key not in LAYOUT_KEYS}
+
+        self.report_layout = ReportLayout(self.report_config)
+
+    def evaluate(self, final_df, prefix_index=None):
+        '''
+        Calculates report for given trial balance, Calculator reads report config from its path on every call
+
+        Args:
+            final_df (DataFrame): Trial balance in shape given by TrialBalanceReader.get_final_df
+            prefix_index (AccountPrefixIndex): Index of the same trial balance shared by more reports, Calculator
+                accepts only DataFrame, so the index is used only by plans summing accounts by it
+
+        Returns:
+            report_calculated (dict): The same result as Calculator.calculation_handler
+        '''
+        from calculations import Calculator  # Imported at first use to speed up start of application
+
+        calculator = Calculator(self.report_config_path, final_df)
+        return calculator.calculation_handler()
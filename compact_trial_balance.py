@@ -0,0 +1,202 @@
+from numpy import add, concatenate, cumsum, dtype, empty, int32, int64, iinfo, isnan, rint, searchsorted, unique, \
+    where, zeros
+from pandas import DataFrame, Index, RangeIndex
+from account_index import PREFIX_END
+
+# Amounts are kept in haléře, 1 CZK = 100 haléřů
+AMOUNT_SCALE = 100
+
+# Stored instead of missing amount, no real amount can reach it
+MISSING_AMOUNT = iinfo(int64).min
+
+# Largest difference of amount and its value in haléře still taken as the same amount, e.g. 0.1 + 0.2 and 0.3
+AMOUNT_TOLERANCE = 1e-6
+
+class CompactTrialBalance:
+    '''
+    Trial balance kept in compact form of numpy arrays. Accounts are sorted categorical, i.e. sorted unique account
+    numbers and code of account for each row, amounts are fixed point integers in haléře. Trial balance is converted
+    from and to DataFrame given by TrialBalanceReader.get_final_df without any loss, only float rounding errors of
+    amounts below AMOUNT_TOLERANCE are dropped. Types of amount columns are kept, so integer columns are not turned
+    into floats.
+
+    Batch pipeline keeps trial balances in this form between reading and calculating, see ReportJob.read_trial_balance.
+    Sums of amounts by account prefix are found by binary search in cumulative sums over sorted accounts, which are
+    built at first sum, see AccountPrefixIndex for the same on DataFrame.
+
+    Args:
+        columns (list): Names of columns, first column contains accounts, following columns contain amounts
+        index (range or ndarray): Index of DataFrame, default index is kept only as range
+        categories (ndarray): Sorted unique account numbers
+        codes (ndarray): Position of account of each row in categories
+        amounts (ndarray): Two dimensional array of amounts in haléře, one column for each amount column
+        dtypes (list): Types of amount columns in DataFrame, all amount columns are float64 if not given
+    '''
+
+    __slots__ = ("columns", "index", "categories", "codes", "amounts", "dtypes", "cumsums")
+
+    def __init__(self, columns, index, categories, codes, amounts, dtypes=None):
+        self.columns = columns
+        self.index = index
+        self.categories = categories
+        self.codes = codes
+        self.amounts = amounts
+        self.dtypes = dtypes if dtypes is not None else [dtype("float64")] * amounts.shape[1]
+        self.cumsums = None
+
+    @classmethod
+    def from_df(cls, final_df):
+        '''
+        Creates compact trial balance from DataFrame
+
+        Args:
+            final_df (DataFrame): Trial balance in shape given by TrialBalanceReader.get_final_df
+
+        Returns:
+            compact_trial_balance (CompactTrialBalance): Trial balance in compact form
+
+        Raises:
+            ValueError: If accounts are not strings, amounts are not integers or floats or they have more than two
+                decimal places, then conversion back to DataFrame would not give the same trial balance
+        '''
+        accounts = final_df.iloc[:, 0].to_numpy()
+        if not all(isinstance(account, str) for account in accounts):
+            raise ValueError("Accounts of trial balance are not strings")
+
+        categories, codes = unique(accounts.astype(str), return_inverse=True)
+
+        amounts = empty((len(final_df), len(final_df.columns) - 1), dtype=int64)
+        dtypes = []
+        for column_no, column in enumerate(final_df.columns[1:]):
+            values = final_df[column].to_numpy()
+            dtypes.append(values.dtype)
+
+            if values.dtype.kind in "iu":
+                amounts[:, column_no] = values.astype(int64) * AMOUNT_SCALE
+                continue
+            if values.dtype.kind != "f":
+                raise ValueError(f"Amounts of trial balance in column {column} are not numbers")
+
+            values = values.astype(float)
+            missing = isnan(values)
+            amounts[:, column_no] = rint(where(missing, 0.0, values) * AMOUNT_SCALE)
+
+            if (abs(amounts[:, column_no] / AMOUNT_SCALE - where(missing, 0.0, values)) > AMOUNT_TOLERANCE).any():
+                raise ValueError("Amounts of trial balance have more than two decimal places")
+            amounts[missing, column_no] = MISSING_AMOUNT
+
+        index = final_df.index
+        if isinstance(index, RangeIndex):
+            index = range(index.start, index.stop, index.step)
+        else:
+            index = index.to_numpy()
+
+        return cls(list(final_df.columns), index, categories, codes.astype(int32), amounts, dtypes)
+
+    def to_df(self):
+        '''
+        Creates DataFrame in shape given by TrialBalanceReader.get_final_df
+
+        Returns:
+            final_df (DataFrame): The same trial balance as the one compact trial balance was created from
+        '''
+        amounts = self.amounts / AMOUNT_SCALE
+        amounts[self.amounts == MISSING_AMOUNT] = float("nan")
+
+        final_df = DataFrame({self.columns[0]: self.categories[self.codes].astype(object)}, index=Index(self.index))
+        for column_no, (column, column_dtype) in enumerate(zip(self.columns[1:], self.dtypes)):
+            if column_dtype.kind == "f":
+                final_df[column] = amounts[:, column_no].astype(column_dtype)
+            else:
+                final_df[column] = (self.amounts[:, column_no] // AMOUNT_SCALE).astype(column_dtype)
+
+        return final_df
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        '''
+        Size of arrays of trial balance in bytes
+        '''
+        index_nbytes = 0 if isinstance(self.index, range) else self.index.nbytes
+        return index_nbytes + self.categories.nbytes + self.codes.nbytes + self.amounts.nbytes
+
+    def get_accounts(self):
+        '''
+        Gets account numbers of all rows
+
+        Returns:
+            accounts (ndarray): Account numbers in order of rows
+        '''
+        return self.categories[self.codes]
+
+    def get_amounts(self, amount_column):
+        '''
+        Gets amounts of one column in haléře
+
+        Args:
+            amount_column (str): Name of column with amounts, e.g. "end_balance"
+
+        Returns:
+            amounts (ndarray): Amounts in order of rows, missing amounts are MISSING_AMOUNT
+        '''
+        return self.amounts[:, self.columns.index(amount_column) - 1]
+
+    def get_prefix_codes(self, prefix):
+        '''
+        Finds accounts starting with given prefix by binary search in sorted unique accounts
+
+        Args:
+            prefix (str): Beginning of account number, e.g. synthetic account "501"
+
+        Returns:
+            codes (tuple): First code and code after last code of accounts with given prefix
+        '''
+        return (int(searchsorted(self.categories, prefix, side="left")),
+                int(searchsorted(self.categories, prefix + PREFIX_END, side="left")))
+
+    def get_prefix_mask(self, prefix):
+        '''
+        Finds rows with accounts starting with given prefix
+
+        Args:
+            prefix (str): Beginning of account number, e.g. synthetic account "501"
+
+        Returns:
+            mask (ndarray): True for rows with given prefix
+        '''
+        code_start, code_end = self.get_prefix_codes(prefix)
+        return (self.codes >= code_start) & (self.codes < code_end)
+
+    def get_cumsums(self):
+        '''
+        Gets cumulative sums of amounts over sorted unique accounts, they are built at first use and kept
+
+        Returns:
+            cumsums (ndarray): Row i contains sums of amounts of accounts before categories[i] in haléře, one column
+                for each amount column, missing amounts are skipped
+        '''
+        if self.cumsums is None:
+            account_sums = zeros((len(self.categories), self.amounts.shape[1]), dtype=int64)
+            add.at(account_sums, self.codes, where(self.amounts == MISSING_AMOUNT, 0, self.amounts))
+            self.cumsums = concatenate((zeros((1, self.amounts.shape[1]), dtype=int64), cumsum(account_sums, axis=0)))
+
+        return self.cumsums
+
+    def sum_prefix(self, prefix, amount_column):
+        '''
+        Sums amounts of accounts starting with given prefix exactly in haléře, missing amounts are skipped. Sum is
+        difference of two cumulative sums, so it does not depend on number of rows.
+
+        Args:
+            prefix (str): Beginning of account number
+            amount_column (str): Name of column with amounts
+
+        Returns:
+            amount (int): Sum of amounts in haléře
+        '''
+        code_start, code_end = self.get_prefix_codes(prefix)
+        cumsums = self.get_cumsums()[:, self.columns.index(amount_column) - 1]
+        return int(cumsums[code_end] - cumsums[code_start])
@@ -0,0 +1,379 @@
+from os import path, stat
+from io import BytesIO, StringIO
+from zipfile import ZipFile
+from threading import Lock
+from collections import OrderedDict
+from xml.etree.ElementTree import fromstring, iterparse
+from string import ascii_uppercase
+
+# Namespaces of OpenDocument spreadsheet used in content.xml
+ODS_TABLE = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+ODS_OFFICE = "{urn:oasis:names:tc:opendocument:xmlns:office:1.0}"
+ODS_TEXT = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+# Encodings of csv files exported by Czech accounting systems, the first one decoding the file is used
+CSV_ENCODINGS = ("utf-8-sig", "cp1250")
+CSV_SEPARATORS = (";", "\t", ",")
+
+# Names of columns of trial balance in the same order as columns are chosen by user
+TRIAL_BALANCE_COLUMNS = ("account", "debit_turnover", "credit_turnover", "end_balance")
+
+# Files not read by TrialBalanceReader, their trial balance is projected into xlsx file by write_trial_balance_xlsx.
+# Projected file is parsed again by TrialBalanceReader, so csv and ods files are read slower than the same xlsx file.
+PROJECTED_EXTENSIONS = (".csv", ".ods")
+
+# Sheet and columns with trial balance in xlsx file written by write_trial_balance_xlsx
+PROJECTED_SHEET = "Trial balance"
+PROJECTED_COLUMNS = ("A", "B", "C", "D")
+
+# Contents of files read lately, key is path with size and time of last modification of file. Listing of sheets,
+# hashing by TrialBalanceCache and reading of csv or ods file then read the file from disk only once.
+FILE_CACHE_SIZE = 4
+_file_cache = OrderedDict()
+_file_cache_lock = Lock()
+
+# Larger files are never kept in memory, they are streamed from disk by each reader
+MAX_CACHED_FILE_SIZE = 64 * 1024 ** 2
+
+def get_file_content(file_path):
+    '''
+    Reads content of file or takes it from cache of files read lately
+
+    Args:
+        file_path (str): Path to the file
+
+    Returns:
+        content (bytes): Content of file, None if file is larger than MAX_CACHED_FILE_SIZE
+    '''
+    file_stat = stat(file_path)
+    if file_stat.st_size > MAX_CACHED_FILE_SIZE:
+        return None
+
+    cache_key = (path.abspath(file_path), file_stat.st_size, file_stat.st_mtime_ns)
+    with _file_cache_lock:
+        if cache_key in _file_cache:
+            _file_cache.move_to_end(cache_key)
+            return _file_cache[cache_key]
+
+    with open(file_path, "rb") as cached_file:
+        content = cached_file.read()
+
+    with _file_cache_lock:
+        _file_cache[cache_key] = content
+        while len(_file_cache) > FILE_CACHE_SIZE:
+            _file_cache.popitem(last=False)
+
+    return content
+
+def open_zip(file_path):
+    '''
+    Opens xlsx or ods file as zip archive from content in cache of files, large file is opened from disk
+    '''
+    content = get_file_content(file_path)
+    return ZipFile(file_path if content is None else BytesIO(content))
+
+def read_csv_text(file_path):
+    '''
+    Reads content of csv file decoded by decode_csv
+
+    Args:
+        file_path (str): Path to the csv file
+
+    Returns:
+        csv_text (str): Decoded content of csv file
+    '''
+    content = get_file_content(file_path)
+    if content is None:
+        with open(file_path, "rb") as csv_file:
+            content = csv_file.read()
+
+    return decode_csv(content)
+
+def decode_csv(csv_data):
+    '''
+    Decodes content of csv file by first of CSV_ENCODINGS, which can decode it. Czech texts in cp1250 are not valid
+    utf-8, so utf-8 file is never decoded as cp1250.
+
+    Args:
+        csv_data (bytes): Content of csv file
+
+    Returns:
+        csv_text (str): Decoded content of csv file
+    '''
+    for encoding in CSV_ENCODINGS[:-1]:
+        try:
+            return csv_data.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+
+    return csv_data.decode(CSV_ENCODINGS[-1], errors="replace")
+
+def get_csv_separator(csv_text):
+    '''
+    Finds separator of csv file as the most frequent of CSV_SEPARATORS in first lines, ";" is preferred, because it is
+    used by Czech exports where comma is decimal separator
+    '''
+    lines = csv_text[:64 * 1024].splitlines()[:20]
+    counts = [sum(line.count(separator) for line in lines) for separator in CSV_SEPARATORS]
+    return CSV_SEPARATORS[counts.index(max(counts))] if max(counts) > 0 else CSV_SEPARATORS[0]
+
+def list_sheets(file_path):
+    '''
+    Lists sheets of excel file without loading the workbook. For xlsx only list of sheets in xl/workbook.xml is
+    parsed, for xls workbook is opened on demand without loading its sheets. For ods names of tables are read from
+    content.xml, csv file has only one sheet named after the file. Content of file is kept in cache of files, see
+    get_file_content, so following reading of the same file does not open it again.
+
+    Args:
+        file_path (str): Path to the excel file
+
+    Returns:
+        sheets (list): Names of sheets in the same order as in excel file
+    '''
+    extension = path.splitext(file_path)[1].lower()
+    if extension == ".csv":
+        return [path.splitext(path.basename(file_path))[0]]
+
+    if extension == ".xls":
+        from xlrd import open_workbook  # Imported at first use to speed up start of application
+
+        content = get_file_content(file_path)
+        workbook = open_workbook(file_path, file_contents=content, on_demand=True)
+        try:
+            return workbook.sheet_names()
+        finally:
+            workbook.release_resources()
+
+    if extension == ".ods":
+        with open_zip(file_path) as workbook_zip, workbook_zip.open("content.xml") as content_file:
+            return [element.get(f"{ODS_TABLE}name") for _, element in iterparse(content_file, events=("start",))
+                    if element.tag == f"{ODS_TABLE}table"]
+
+    with open_zip(file_path) as workbook_zip:
+        workbook_xml = fromstring(workbook_zip.read("xl/workbook.xml"))
+
+    return [element.get("name") for element in workbook_xml.iter() if element.tag.rsplit("}", 1)[-1] == "sheet"]
+
+def get_column_index(column_letter):
+    '''
+    Converts excel column letter to index of column
+
+    Args:
+        column_letter (str): Column letter, e.g. "A" or "AB"
+
+    Returns:
+        column_index (int): Index of column starting 0
+    '''
+    column_index = 0
+    for letter in column_letter.upper():
+        column_index = column_index * len(ascii_uppercase) + ascii_uppercase.index(letter) + 1
+
+    return column_index - 1
+
+def convert_csv_amounts(values):
+    '''
+    Converts texts of amounts written with decimal comma and spaces between thousands to numbers, texts which are not
+    amounts are kept as they are
+
+    Args:
+        values (Series): Texts of one column of csv file
+
+    Returns:
+        values (Series): Numbers as floats, other texts as strings and empty cells as None
+    '''
+    from pandas import to_numeric  # Imported at first use to speed up start of application
+
+    numbers = to_numeric(values.str.replace(r"[\s\u00a0]", "", regex=True).str.replace(",", ".", regex=False),
+                         errors="coerce")
+    return numbers.astype(object).where(numbers.notna(), values).where(values.notna(), None)
+
+def read_csv_columns(file_path, column_indexes):
+    '''
+    Reads given columns of csv file by vectorized parser of pandas. Encoding and separator are found out from the
+    content of file, rows with different number of cells, e.g. titles above the trial balance, are allowed.
+
+    Args:
+        file_path (str): Path to the csv file
+        column_indexes (list): Indexes of columns starting 0, the first one is column with accounts kept as text
+
+    Returns:
+        columns (list): Series of values of given columns in the same order as given column indexes
+    '''
+    from pandas import read_csv  # Imported at first use to speed up start of application
+
+    csv_text = read_csv_text(file_path)
+    separator = get_csv_separator(csv_text)
+    no_columns = max(max((line.count(separator) for line in csv_text.splitlines()), default=0) + 1,
+                     max(column_indexes) + 1)
+
+    csv_df = read_csv(StringIO(csv_text), sep=separator, header=None, names=range(no_columns), dtype=str,
+                      skip_blank_lines=False)
+
+    columns = []
+    for position, column_index in enumerate(column_indexes):
+        values = csv_df[column_index].str.strip()
+        values = values.where(values.notna() & (values != ""), None)
+        columns.append(values if position == 0 else convert_csv_amounts(values))
+
+    return columns
+
+def iter_csv_rows(file_path, sheet, column_indexes):
+    '''
+    Reads rows of given columns from csv file, texts of amounts are converted to numbers
+
+    Args:
+        file_path (str): Path to the csv file
+        sheet (str): Not used, csv file has only one sheet
+        column_indexes (list): Indexes of columns starting 0
+
+    Yields:
+        row (tuple): Values of given columns in the same order as given column indexes, empty cells are None
+    '''
+    yield from zip(*(column.tolist() for column in read_csv_columns(file_path, column_indexes)))
+
+def get_ods_cell_value(element):
+    '''
+    Gets value of cell of ods file, numbers are given as floats and other values as texts
+
+    Args:
+        element (Element): Element table:table-cell
+
+    Returns:
+        value (float, str or None): Value of cell, None for empty cell
+    '''
+    value_type = element.get(f"{ODS_OFFICE}value-type")
+    if value_type in ("float", "currency", "percentage"):
+        return float(element.get(f"{ODS_OFFICE}value"))
+
+    text = "\n".join("".join(paragraph.itertext()) for paragraph in element.iter(f"{ODS_TEXT}p"))
+    return text if text else None
+
+def iter_ods_rows(file_path, sheet, column_indexes):
+    '''
+    Reads rows of given columns from ods file by streaming parser of content.xml, so the whole document is never
+    loaded into memory and no other package is needed. Repeated rows and cells are expanded, repeated empty rows at
+    the end of sheet are skipped.
+
+    Args:
+        file_path (str): Path to the ods file
+        sheet (str): Sheet in ods file
+        column_indexes (list): Indexes of columns starting 0
+
+    Yields:
+        row (tuple): Values of given columns in the same order as given column indexes, empty cells are None
+    '''
+    max_col = max(column_indexes)
+    in_sheet = False
+    empty_rows = 0
+
+    with open_zip(file_path) as workbook_zip, workbook_zip.open("content.xml") as content_file:
+        for event, element in iterparse(content_file, events=("start", "end")):
+            if element.tag == f"{ODS_TABLE}table":
+                if event == "start":
+                    in_sheet = element.get(f"{ODS_TABLE}name") == sheet
+                elif in_sheet:
+                    break
+                continue
+
+            if not in_sheet or event != "end" or element.tag != f"{ODS_TABLE}table-row":
+                continue
+
+            row = []
+            for cell in element:
+                if cell.tag not in (f"{ODS_TABLE}table-cell", f"{ODS_TABLE}covered-table-cell"):
+                    continue
+                repeated = min(int(cell.get(f"{ODS_TABLE}number-columns-repeated", 1)), max_col + 1 - len(row))
+                row.extend([get_ods_cell_value(cell)] * repeated)
+                if len(row) > max_col:
+                    break
+
+            values = tuple(row[column_index] if column_index < len(row) else None for column_index in column_indexes)
+            repeated = int(element.get(f"{ODS_TABLE}number-rows-repeated", 1))
+            element.clear()  # Clears attributes too, so repeating of row is read before
+
+            # Empty rows are yielded only if some row with values follows them
+            if all(value is None for value in values):
+                empty_rows += repeated
+                continue
+
+            for _ in range(empty_rows):
+                yield (None,) * len(column_indexes)
+            empty_rows = 0
+
+            for _ in range(repeated):
+                yield values
+
+def iter_trial_balance_rows(file_path, sheet, account_col, debit_turnover_col, credit_turnover_col, end_balance_col):
+    '''
+    Reads rows of columns with trial balance from csv or ods file without loading the whole file into cells. Excel files
+    are read by TrialBalanceReader directly, which is not in this repository and cannot take rows read here.
+
+    Args:
+        file_path (str): Path to the csv or ods file with trial balance
+        sheet (str): Sheet with trial balance in file, not used for csv
+        account_col (str): Column with account numbers
+        debit_turnover_col (str): Column with debit turnovers
+        credit_turnover_col (str): Column with credit turnovers
+        end_balance_col (str): Column with end balances
+
+    Yields:
+        row (tuple): Account, debit turnover, credit turnover and end balance as they are in file
+
+    Raises:
+        ValueError: If file is not csv or ods file
+    '''
+    column_indexes = [get_column_index(column_letter) for column_letter in
+                      (account_col, debit_turnover_col, credit_turnover_col, end_balance_col)]
+
+    extension = path.splitext(file_path)[1].lower()
+    if extension == ".csv":
+        yield from iter_csv_rows(file_path, sheet, column_indexes)
+    elif extension == ".ods":
+        yield from iter_ods_rows(file_path, sheet, column_indexes)
+    else:
+        raise ValueError(f"Rows of {extension} files are read by TrialBalanceReader, not by excel_reader")
+
+def read_trial_balance_columns(file_path, sheet, account_col, debit_turnover_col, credit_turnover_col,
+                               end_balance_col):
+    '''
+    Reads columns with trial balance from csv or ods file into lists, rows are kept as they are in file including
+    headers and totals
+
+    Returns:
+        columns (dict): Lists of values, keys are TRIAL_BALANCE_COLUMNS
+    '''
+    columns = {column: [] for column in TRIAL_BALANCE_COLUMNS}
+    appends = [columns[column].append for column in TRIAL_BALANCE_COLUMNS]
+
+    for row in iter_trial_balance_rows(file_path, sheet, account_col, debit_turnover_col, credit_turnover_col,
+                                       end_balance_col):
+        for append, value in zip(appends, row):
+            append(value)
+
+    return columns
+
+def write_trial_balance_xlsx(file_path, sheet, account_col, debit_turnover_col, credit_turnover_col, end_balance_col,
+                             xlsx_path):
+    '''
+    Writes columns with trial balance read from file into xlsx file containing only these columns in PROJECTED_COLUMNS
+    of PROJECTED_SHEET, so trial balance from csv or ods file can be read by TrialBalanceReader. Rows are streamed
+    from file into workbook in write only mode.
+
+    Args:
+        file_path (str): Path to the file with trial balance
+        sheet (str): Sheet with trial balance in file
+        account_col (str): Column with account numbers
+        debit_turnover_col (str): Column with debit turnovers
+        credit_turnover_col (str): Column with credit turnovers
+        end_balance_col (str): Column with end balances
+        xlsx_path (str): Path to created xlsx file
+    '''
+    from openpyxl import Workbook  # Imported at first use to speed up start of application
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(PROJECTED_SHEET)
+    for row in iter_trial_balance_rows(file_path, sheet, account_col, debit_turnover_col, credit_turnover_col,
+                                       end_balance_col):
+        worksheet.append(row)
+
+    workbook.save(xlsx_path)
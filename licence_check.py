@@ -0,0 +1,206 @@
+from os import path, makedirs, remove, replace, getpid, open as open_file, O_CREAT, O_TRUNC, O_WRONLY
+from json import dumps, loads
+from time import time
+from hmac import new as new_hmac, compare_digest
+from hashlib import sha256
+from secrets import token_bytes
+
+LICENCE_URL = "https://dcba.cz/user_zone/external_request/"  # For production
+# LICENCE_URL = "http://127.0.0.1:8000/user_zone/external_request/"  # For mirror
+
+# Key signing licence tokens, created randomly on each computer and kept in profile of user, never in application
+TOKEN_KEY_PATH = path.join(path.expanduser("~"), ".stats", "licence_token.key")
+TOKEN_KEY_SIZE = 32
+
+# Token saved by application after successful licence check and email of user who logged in last
+TOKEN_PATH = "logs/licence_token.json"
+USERNAME_STAMP_PATH = "logs/username_stamp.txt"
+
+# Results of licence check
+LICENCE_VALID = "licence_valid"
+USER_UNKNOWN = "user_unknown"
+PASSWORD_INVALID = "password_invalid"
+LICENCE_EXPIRED = "licence_expired"
+
+class LicenceClient:
+    '''
+    Checks licence of user on web. Connection is kept in session and reused by following checks, each request has
+    strict timeout.
+
+    Args:
+        url (str): Address of licence check on web
+        timeout (tuple): Timeout for connecting and for reading response in seconds
+    '''
+
+    def __init__(self, url=LICENCE_URL, timeout=(3, 10)):
+        # Imported at first use to speed up start of application
+        from requests import Session
+        from requests.adapters import HTTPAdapter
+
+        self.url = url
+        self.timeout = timeout
+
+        self.session = Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+    def check(self, credentials):
+        '''
+        Sends encrypted credentials to web and evaluates headers of response
+
+        Args:
+            credentials (dict): Encrypted username and password with names of their key files and product name
+
+        Returns:
+            result (str): One of LICENCE_VALID, USER_UNKNOWN, PASSWORD_INVALID, LICENCE_EXPIRED
+        '''
+        response = self.session.get(self.url, params=credentials, timeout=self.timeout)
+
+        if response.headers.get("user_exists") != "True":
+            return USER_UNKNOWN
+        elif response.headers.get("user_is_authenticated") != "True":
+            return PASSWORD_INVALID
+        elif response.headers.get("licence_is_valid") != "True":
+            return LICENCE_EXPIRED
+        return LICENCE_VALID
+
+    def close(self):
+        '''
+        Closes connections of session
+        '''
+        self.session.close()
+
+def load_token_key(key_path=TOKEN_KEY_PATH):
+    '''
+    Loads key for signing of licence tokens. The key is created randomly at first use and its file is readable only by
+    its owner, so token cannot be signed by key known from source of application and token copied to another computer
+    is not valid. The owner can read the key and sign token with any expiration, so token only saves checks on web for
+    honest user, it does not enforce licence against the owner of the key. Damaged key is replaced by new one, key
+    which cannot be saved is used only until application is closed, tokens signed by it are not valid at next launch
+    and licence is checked on web again.
+
+    Args:
+        key_path (str): Path to file with key
+
+    Returns:
+        key (bytes): Key for signing of token
+    '''
+    try:
+        with open(key_path, "rb") as key_file:
+            key = key_file.read()
+    except OSError:
+        key = b""
+
+    if len(key) == TOKEN_KEY_SIZE:
+        return key
+
+    key = token_bytes(TOKEN_KEY_SIZE)
+    try:
+        makedirs(path.dirname(key_path) or ".", exist_ok=True)
+
+        # Writing to temporary file first, so other launch never loads half written key
+        key_path_temp = f"{key_path}.{getpid()}.tmp"
+        with open(open_file(key_path_temp, O_CREAT | O_TRUNC | O_WRONLY, 0o600), "wb") as key_file:
+            key_file.write(key)
+        replace(key_path_temp, key_path)
+    except OSError:
+        pass
+
+    return key
+
+class LicenceToken:
+    '''
+    Local proof of successful licence check signed by key, so following launches of application do not need to check
+    licence on web until token expires
+
+    Args:
+        token_path (str): Path to file with token
+        key (bytes): Key for signing of token, see load_token_key
+        validity (int): Validity of token in seconds
+    '''
+
+    def __init__(self, token_path, key, validity=7 * 24 * 3600):
+        self.token_path = token_path
+        self.key = key
+        self.validity = validity
+
+    def sign(self, payload):
+        '''
+        Creates signature of token content
+
+        Args:
+            payload (str): Content of token
+
+        Returns:
+            signature (str): Hexadecimal signature
+        '''
+        return new_hmac(self.key, payload.encode("utf-8"), sha256).hexdigest()
+
+    def save(self, username, product_name):
+        '''
+        Saves token after successful licence check
+
+        Args:
+            username (str): Email of user
+            product_name (str): Name of product with valid licence
+        '''
+        payload = dumps({"username": username, "product_name": product_name, "expires": time() + self.validity})
+
+        makedirs(path.dirname(self.token_path) or ".", exist_ok=True)
+        with open(self.token_path, "w", encoding="utf-8") as token_file:
+            token_file.write(dumps({"payload": payload, "signature": self.sign(payload)}))
+
+    def is_valid(self, username, product_name):
+        '''
+        Checks if saved token belongs to given user and product, was not changed and did not expire
+
+        Args:
+            username (str): Email of user
+            product_name (str): Name of product
+
+        Returns:
+            valid (bool): True if licence check on web can be skipped
+        '''
+        try:
+            with open(self.token_path, encoding="utf-8") as token_file:
+                token = loads(token_file.read())
+
+            if not compare_digest(self.sign(token["payload"]), token["signature"]):
+                return False
+
+            payload = loads(token["payload"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+        return payload.get("username") == username and payload.get("product_name") == product_name \
+            and payload.get("expires", 0) > time()
+
+    def remove(self):
+        '''
+        Removes saved token, next launch checks licence on web again
+        '''
+        if path.exists(self.token_path):
+            remove(self.token_path)
+
+def is_licence_token_valid(product_name, token_path=TOKEN_PATH, username_stamp_path=USERNAME_STAMP_PATH,
+                           key_path=TOKEN_KEY_PATH):
+    '''
+    Checks licence of run without user interface, e.g. batch runner or report service. Such run cannot ask for password,
+    so it is allowed only while token saved by last licence check in application is valid for user who logged in last.
+
+    Args:
+        product_name (str): Name of product from report info
+        token_path (str): Path to file with token, see LicenceToken
+        username_stamp_path (str): Path to file with email of user who logged in last
+        key_path (str): Path to file with key, see load_token_key
+
+    Returns:
+        valid (bool): True if licence was checked on web lately
+    '''
+    try:
+        with open(username_stamp_path, "r") as username_stamp_file:
+            username = username_stamp_file.read()
+    except OSError:
+        return False
+
+    return LicenceToken(token_path, load_token_key(key_path)).is_valid(username, product_name)
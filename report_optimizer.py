@@ -0,0 +1,195 @@
+from sys import argv
+from os import path, replace, getpid
+from io import BytesIO
+from argparse import ArgumentParser
+from PyPDF2 import PdfFileReader, PdfFileWriter
+from PyPDF2.generic import NameObject, IndirectObject, DictionaryObject, ArrayObject, StreamObject, \
+    DecodedStreamObject
+
+'''
+Optimization of size of report output written by ReportWriter. Identical fonts, XObjects and appearance streams of
+form fields used by more pages are kept only once and content streams are compressed. Object streams are not
+written, PyPDF2 writes only classic cross reference table.
+
+Usage:
+    python report_optimizer.py report_1.pdf report_2.pdf
+'''
+
+# Categories of page resources deduplicated across pages
+SHARED_RESOURCES = ("/Font", "/XObject")
+
+def get_object_key(pdf_object, keys=None, visited=None):
+    '''
+    Gets key of PDF object, objects with the same key have the same content. Referenced objects are compared by their
+    content too, reference creating cycle is compared by its number.
+
+    Args:
+        pdf_object (PdfObject): Object of PDF document
+        keys (dict): Keys of referenced objects already computed, key is number of object
+        visited (set): Numbers of referenced objects being computed
+
+    Returns:
+        key (tuple): Hashable key of object
+    '''
+    keys = {} if keys is None else keys
+    visited = set() if visited is None else visited
+
+    if isinstance(pdf_object, IndirectObject):
+        if pdf_object.idnum in keys:
+            return keys[pdf_object.idnum]
+        if pdf_object.idnum in visited:
+            return ("ref", pdf_object.idnum)
+
+        visited.add(pdf_object.idnum)
+        keys[pdf_object.idnum] = get_object_key(pdf_object.get_object(), keys, visited)
+        visited.discard(pdf_object.idnum)
+        return keys[pdf_object.idnum]
+
+    if isinstance(pdf_object, DictionaryObject):
+        key = tuple(sorted((name, get_object_key(value, keys, visited)) for name, value in pdf_object.items()))
+        if isinstance(pdf_object, StreamObject):
+            return ("stream", key, pdf_object._data)
+        return ("dict", key)
+
+    if isinstance(pdf_object, ArrayObject):
+        return ("array", tuple(get_object_key(value, keys, visited) for value in pdf_object))
+
+    return (type(pdf_object).__name__, repr(pdf_object))
+
+class ReportOptimizer:
+    '''
+    Rewrites report output files in optimized form
+    '''
+
+    def deduplicate_references(self, dictionary, shared_objects, keys):
+        '''
+        Replaces references in dictionary by references to identical objects met before
+
+        Args:
+            dictionary (DictionaryObject): Dictionary changed in place, e.g. fonts of page resources
+            shared_objects (dict): Reference to first object with given key
+            keys (dict): Keys of referenced objects already computed, see get_object_key
+
+        Returns:
+            no_replaced (int): Number of references replaced
+        '''
+        no_replaced = 0
+        for name, reference in list(dictionary.items()):
+            if not isinstance(reference, IndirectObject):
+                continue
+
+            reference_shared = shared_objects.setdefault(get_object_key(reference, keys), reference)
+            if reference_shared.idnum != reference.idnum:
+                dictionary[NameObject(name)] = reference_shared
+                no_replaced += 1
+
+        return no_replaced
+
+    def deduplicate_page(self, page, shared_objects, keys):
+        '''
+        Replaces references to fonts and XObjects of page resources and to appearance streams of form fields of page
+        by references to identical objects used by previous pages
+
+        Args:
+            page (PageObject): Page of report output, it is changed in place
+            shared_objects (dict): Reference to first object with given key
+            keys (dict): Keys of referenced objects already computed, see get_object_key
+
+        Returns:
+            no_replaced (int): Number of references replaced
+        '''
+        no_replaced = 0
+
+        resources = page["/Resources"] if "/Resources" in page else {}
+        for category in SHARED_RESOURCES:
+            if category in resources:
+                no_replaced += self.deduplicate_references(resources[category], shared_objects, keys)
+
+        # Appearance is stream or dictionary of streams for states of field, e.g. /N for normal appearance
+        for annotation in page["/Annots"] if "/Annots" in page else []:
+            annotation = annotation.get_object()
+            if "/AP" not in annotation:
+                continue
+
+            appearances = annotation["/AP"]
+            no_replaced += self.deduplicate_references(appearances, shared_objects, keys)
+            for appearance in appearances.values():
+                appearance = appearance.get_object()
+                if not isinstance(appearance, StreamObject):
+                    no_replaced += self.deduplicate_references(appearance, shared_objects, keys)
+
+        return no_replaced
+
+    def compress_contents(self, page):
+        '''
+        Joins content streams of page into one compressed stream, page with compressed contents only is not changed
+
+        Args:
+            page (PageObject): Page of report output, it is changed in place
+
+        Returns:
+            compressed (bool): Whether contents of page were compressed
+        '''
+        contents = page.get("/Contents")
+        if contents is None:
+            return False
+
+        streams = list(contents) if isinstance(contents, ArrayObject) else [contents]
+        streams = [stream.get_object() for stream in streams]
+        if all("/Filter" in stream for stream in streams):
+            return False
+
+        content = DecodedStreamObject()
+        content.set_data(b"\n".join(stream.get_data() for stream in streams))
+        page[NameObject("/Contents")] = content.flate_encode()
+        return True
+
+    def optimize(self, report_output_path):
+        '''
+        Rewrites report output in optimized form, the file is replaced at once
+
+        Args:
+            report_output_path (str): Path to file with report output
+
+        Returns:
+            sizes (tuple): Size of file in bytes before and after optimization
+        '''
+        with open(report_output_path, "rb") as report_output_file:
+            report_output_data = report_output_file.read()
+
+        report_output = PdfFileReader(BytesIO(report_output_data))
+        output = PdfFileWriter()
+        shared_objects = {}
+        keys = {}
+
+        for page in report_output.pages:
+            self.deduplicate_page(page, shared_objects, keys)
+            self.compress_contents(page)
+            output.add_page(page)
+
+        # Form of report written by filling of form fields
+        root = report_output.trailer["/Root"]
+        if "/AcroForm" in root:
+            output._root_object[NameObject("/AcroForm")] = root.raw_get("/AcroForm")
+
+        report_output_path_temp = f"{report_output_path}.{getpid()}.tmp"
+        with open(report_output_path_temp, "wb") as report_output_file:
+            output.write(report_output_file)
+        replace(report_output_path_temp, report_output_path)
+
+        return len(report_output_data), path.getsize(report_output_path)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Optimizes size of report output files.")
+    parser.add_argument("report_output_paths", nargs="+", help="Paths to files with report output")
+    args = parser.parse_args(argv[1:])
+
+    optimizer = ReportOptimizer()
+    size_before_total, size_after_total = 0, 0
+    for report_output_path in args.report_output_paths:
+        size_before, size_after = optimizer.optimize(report_output_path)
+        size_before_total += size_before
+        size_after_total += size_after
+        print(f"{report_output_path}: {size_before} B -> {size_after} B ({size_after / size_before - 1:+.1%})")
+
+    print(f"Total: {size_before_total} B -> {size_after_total} B")
@@ -0,0 +1,240 @@
+from time import perf_counter
+from queue import Queue
+from threading import Thread, Lock, Event
+from concurrent.futures import ProcessPoolExecutor
+
+# Put into queue of stage to stop one of its worker threads
+STOP = object()
+
+class PipelineItem:
+    '''
+    One trial balance passing through pipeline
+
+    Args:
+        job_no (int): Position of job in batch
+        job (BatchJob): Trial balance with its columns
+        fan_out_job (FanOutJob): Processing of trial balance into all reports
+        result (dict): Result of job given by BatchRunner.create_result
+    '''
+
+    def __init__(self, job_no, job, fan_out_job, result):
+        self.job_no = job_no
+        self.job = job
+        self.fan_out_job = fan_out_job
+        self.result = result
+        self.final_df = None
+        self.time_start = perf_counter()
+
+class PipelineStage:
+    '''
+    Stage of pipeline with bounded input queue and its own worker threads. Worker puts processed item into queue of
+    next stage and waits while that queue is full, so fast stage never runs ahead of slow stage by more than size of
+    queue (backpressure). Item which failed in any stage is passed through following stages without processing.
+
+    Args:
+        name (str): Name of stage
+        function (function): Called with PipelineItem, processes it in place
+        workers (int): Number of worker threads
+        queue_size (int): Maximal number of items waiting for this stage
+        logger (instance): Instance of logger provided by executive file
+        skip_failed (bool): Whether item which failed in previous stage is passed without processing
+    '''
+
+    def __init__(self, name, function, workers, queue_size, logger, skip_failed=True):
+        self.name = name
+        self.function = function
+        self.skip_failed = skip_failed
+        self.workers = workers
+        self.queue = Queue(maxsize=queue_size)
+        self.logger = logger
+        self.next_stage = None
+
+        self.lock = Lock()
+        self.processed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.max_queue_depth = 0
+        self.time_start = None
+        self.threads = []
+
+    def start(self, next_stage=None):
+        '''
+        Starts worker threads of stage
+
+        Args:
+            next_stage (PipelineStage): Stage receiving processed items, items are only processed if not given
+        '''
+        self.next_stage = next_stage
+        self.time_start = perf_counter()
+        self.threads = [Thread(target=self.work, name=f"pipeline-{self.name}-{i}", daemon=True)
+                        for i in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, item):
+        '''
+        Puts item into queue of stage, waits while the queue is full
+        '''
+        self.queue.put(item)
+        with self.lock:
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    def stop(self):
+        '''
+        Lets all worker threads finish items already in queue and waits for them
+        '''
+        for _ in self.threads:
+            self.queue.put(STOP)
+        for thread in self.threads:
+            thread.join()
+
+    def work(self):
+        '''
+        Loop of one worker thread
+        '''
+        while True:
+            item = self.queue.get()
+            if item is STOP:
+                return
+
+            if item.result["status"] == "ok" or not self.skip_failed:
+                time_start = perf_counter()
+                try:
+                    self.function(item)
+                except Exception as exception:
+                    self.logger.exception(f"Stage {self.name} of {item.job.trial_balance_path} failed")
+                    item.result["status"] = "error"
+                    item.result["error"] = repr(exception)
+                    item.final_df = None
+
+                with self.lock:
+                    self.busy_time += perf_counter() - time_start
+                    self.processed += 1
+                    self.failed += item.result["status"] != "ok"
+
+            if self.next_stage is not None:
+                self.next_stage.put(item)
+
+    def get_stats(self):
+        '''
+        Gets statistics of stage. Stage with the highest utilization is bottleneck of pipeline, stage waiting for full
+        queue of next stage has low utilization and its own queue stays empty.
+
+        Returns:
+            stats (dict): Number of workers, actual and maximal queue depth, processed items, throughput in items per
+                second and utilization of workers
+        '''
+        with self.lock:
+            elapsed = perf_counter() - self.time_start if self.time_start is not None else 0.0
+            return {"stage": self.name, "workers": self.workers, "queue_depth": self.queue.qsize(),
+                    "max_queue_depth": self.max_queue_depth, "processed": self.processed, "failed": self.failed,
+                    "throughput": self.processed / elapsed if elapsed > 0 else 0.0,
+                    "utilization": self.busy_time / (elapsed * self.workers) if elapsed > 0 else 0.0}
+
+class ReportPipeline:
+    '''
+    Processes trial balances of batch by pipeline of stages reading, calculating and writing, so reading of next trial
+    balance overlaps with calculating and writing of previous ones. Trial balances are parsed by pool of processes,
+    threads of reading stage only wait for them. Calculating and writing run in threads.
+
+    Args:
+        runner (BatchRunner): Runner with loaded reports, its settings are used for all jobs
+        read_workers (int): Number of threads reading trial balances and of processes parsing them
+        calculate_workers (int): Number of threads calculating reports
+        write_workers (int): Number of threads writing reports
+        queue_size (int): Maximal number of trial balances waiting for each stage
+        stats_interval (float): Interval of logging of statistics of stages in seconds, statistics are not logged
+            during run if not given
+    '''
+
+    def __init__(self, runner, read_workers=2, calculate_workers=1, write_workers=1, queue_size=4,
+                 stats_interval=None):
+        self.runner = runner
+        self.logger = runner.logger
+        self.read_workers = read_workers
+        self.stats_interval = stats_interval
+        self.executor = None
+
+        self.stages = [PipelineStage("read", self.read, read_workers, queue_size, self.logger),
+                       PipelineStage("calculate", self.calculate, calculate_workers, queue_size, self.logger),
+                       PipelineStage("write", self.write, write_workers, queue_size, self.logger),
+                       PipelineStage("done", self.finish, 1, queue_size, self.logger, skip_failed=False)]
+
+        self.results = []
+        self.stopped = Event()
+
+    def read(self, item):
+        item.final_df = item.fan_out_job.read(self.executor)
+
+    def calculate(self, item):
+        item.fan_out_job.calculate(item.final_df)
+        item.final_df = None  # Trial balance is not needed anymore, memory is released before writing
+
+    def write(self, item):
+        item.fan_out_job.write()
+
+    def finish(self, item):
+        # Called also for failed items, so all results are set
+        self.runner.complete_result(item.result, item.fan_out_job)
+        item.result["timings"]["total"] = perf_counter() - item.time_start
+        self.results[item.job_no] = item.result
+
+    def get_stats(self):
+        '''
+        Gets statistics of all stages, see PipelineStage.get_stats
+
+        Returns:
+            stats (list): Statistics of stages in order of pipeline
+        '''
+        return [stage.get_stats() for stage in self.stages[:-1]]
+
+    def log_stats(self):
+        '''
+        Logs statistics of all stages
+        '''
+        for stats in self.get_stats():
+            self.logger.info(f"Stage {stats['stage']}: queue {stats['queue_depth']} (max {stats['max_queue_depth']}), "
+                             f"processed {stats['processed']}, {stats['throughput']:.2f} jobs/s, "
+                             f"utilization {stats['utilization']:.0%}")
+
+    def monitor(self):
+        '''
+        Logs statistics of stages periodically until pipeline stops
+        '''
+        while not self.stopped.wait(self.stats_interval):
+            self.log_stats()
+
+    def run(self, jobs):
+        '''
+        Processes all given jobs by pipeline
+
+        Args:
+            jobs (list): List of BatchJob instances
+
+        Returns:
+            results (list): Results of all jobs in the same order as given jobs, see BatchRunner.process_job
+        '''
+        self.results = [None] * len(jobs)
+        self.stopped.clear()
+
+        with ProcessPoolExecutor(max_workers=self.read_workers) as self.executor:
+            for stage, next_stage in zip(self.stages, self.stages[1:] + [None]):
+                stage.start(next_stage)
+
+            if self.stats_interval:
+                Thread(target=self.monitor, name="pipeline-monitor", daemon=True).start()
+
+            # Putting jobs into first stage waits while reading stage is full, stages are stopped even if creating of
+            # job fails, so their threads do not wait for next item forever
+            try:
+                for job_no, job in enumerate(jobs):
+                    fan_out_job = self.runner.create_fan_out_job(job)
+                    self.stages[0].put(PipelineItem(job_no, job, fan_out_job,
+                                                    self.runner.create_result(job, fan_out_job)))
+            finally:
+                for stage in self.stages:
+                    stage.stop()
+                self.stopped.set()
+
+        self.log_stats()
+        return self.results
@@ -0,0 +1,505 @@
+from sys import argv
+from os import path, environ
+from uuid import uuid4
+from weakref import WeakSet
+from hmac import compare_digest
+from urllib.parse import urlsplit
+from json import dumps, loads
+from time import perf_counter
+from datetime import datetime
+from argparse import ArgumentParser
+from threading import Lock, BoundedSemaphore
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from logging import basicConfig, FileHandler, StreamHandler, DEBUG, getLogger
+from trial_balance_cache import TrialBalanceCache
+from stage_metrics import StageMetrics
+from licence_check import is_licence_token_valid
+from batch_runner import BatchRunner, BatchJob, find_reports, _process_job_in_worker
+
+'''
+Long running local service processing trial balances into reports. Report configs and templates are loaded once by
+each of warm worker processes, so job does not pay start of interpreter, imports and loading of reports.
+
+Endpoints:
+    POST /jobs with json job in the same form as item of batch manifest (see BatchJob), returns result of job with
+        report output paths and figures of each report
+    GET /health returns status of service
+    GET /metrics returns counters of jobs and their latency
+
+Requests must name loopback in Host header, so web page opened in browser cannot send them by DNS rebinding, and jobs
+must be sent as application/json, which browser does not send without asking the service first. If environment
+variable REPORT_SERVICE_SECRET is set, requests must send its value in header X-Service-Secret.
+
+Usage:
+    python report_service.py --port 8765 --workers 4 --reports-dir reports/2023/quarter --output-dir reports/output
+    curl -X POST localhost:8765/jobs -H "Content-Type: application/json" \
+        -d '{"trial_balance_path": "/data/tb.xlsx", "account_col": "A", ...}'
+'''
+
+# Service listens only on loopback, it is never reachable from other computers
+HOST = "127.0.0.1"
+
+# Names of service accepted in Host header of request
+ALLOWED_HOSTS = ("127.0.0.1", "localhost")
+
+# Header with shared secret of service and client
+SECRET_HEADER = "X-Service-Secret"
+
+# Maximal size of body of request in bytes
+MAX_REQUEST_SIZE = 1024 ** 2
+
+class ServiceError(Exception):
+    '''
+    Job was not accepted or not finished by service
+
+    Args:
+        http_status (int): Status of response
+        message (str): Description of error
+    '''
+
+    def __init__(self, http_status, message):
+        super().__init__(message)
+        self.http_status = http_status
+
+class ReportService:
+    '''
+    Processes jobs by pool of warm worker processes. Number of jobs processed or waiting at once is limited, job over
+    the limit is rejected at once, so client can retry later. Job not finished in time is reported as timed out and
+    stopped. Running job cannot be cancelled, so pool is replaced and its worker processes are terminated. Other jobs
+    running or waiting in the pool are stopped too, they are not counted as failed and client is asked to send them
+    again. Job without report output path gets output file with unique name, so jobs with the same trial balance do
+    not overwrite outputs of each other.
+
+    Args:
+        runner (BatchRunner): Runner with loaded reports, its settings are used by all workers
+        workers (int): Number of worker processes
+        max_jobs (int): Maximal number of jobs processed or waiting at once, twice the number of workers if not given
+        timeout (float): Maximal time of job in seconds including waiting for worker
+        output_dir (str): Folder where report output paths given by jobs must lie and where outputs of jobs without
+            report output path are written, job giving report output path is rejected and outputs are written next
+            to trial balance if not given, see check_report_output_path
+        secret (str): Secret which must be sent by client in header X-Service-Secret, not required if not given
+        check_licence (bool): Accepts jobs only while licence check of last login in application is valid, see
+            is_licence_token_valid, service cannot ask for password itself
+    '''
+
+    def __init__(self, runner, workers=2, max_jobs=None, timeout=300.0, output_dir=None, secret=None,
+                 check_licence=True):
+        self.runner = runner
+        self.logger = runner.logger
+        self.workers = workers
+        self.max_jobs = max_jobs or 2 * workers
+        self.timeout = timeout
+        self.output_dir = output_dir
+        self.secret = secret
+        self.check_licence = check_licence
+
+        self.executor = None
+        self.executor_lock = Lock()
+        self.terminated_executors = WeakSet()  # Pools terminated because of job not finished in time
+        self.slots = BoundedSemaphore(self.max_jobs)
+
+        self.lock = Lock()
+        self.time_start = perf_counter()
+        self.counters = {"accepted": 0, "ok": 0, "failed": 0, "rejected": 0, "timed_out": 0, "stopped": 0,
+                         "running": 0}
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.timings = {}
+
+    def start(self):
+        '''
+        Starts worker processes and waits until all of them loaded reports
+        '''
+        with self.executor_lock:
+            self.executor = self.runner.create_executor(self.workers)
+
+            # Pool starts its workers with first jobs, empty jobs make them load reports before first request comes
+            for future in [self.executor.submit(_warm_up_worker) for _ in range(self.workers)]:
+                future.result()
+
+        self.logger.info(f"Service started with {self.workers} workers")
+
+    def stop(self):
+        '''
+        Waits for jobs already submitted and stops worker processes
+        '''
+        with self.executor_lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
+
+    def submit(self, job_dict):
+        '''
+        Processes one job by worker process and waits for its result
+
+        Args:
+            job_dict (dict): Job in the same form as item of batch manifest, see BatchJob
+
+        Returns:
+            result (dict): Result given by BatchRunner.process_job including figures of each report
+
+        Raises:
+            ServiceError: If job is invalid, licence is not checked, over the limit of jobs, not finished in time,
+                stopped together with other job not finished in time or worker process crashed
+        '''
+        try:
+            job = BatchJob.from_dict(job_dict)
+        except (KeyError, TypeError, AttributeError) as exception:
+            raise ServiceError(400, f"Invalid job: {exception!r}")
+
+        if job.report_output_path is not None:
+            job.report_output_path = self.check_report_output_path(job.report_output_path)
+        else:
+            try:
+                job.report_output_path = self.get_report_output_path(job)
+            except (TypeError, ValueError) as exception:
+                raise ServiceError(400, f"Invalid trial balance path: {exception!r}")
+
+        # Token is checked for each job, because service may run longer than token is valid
+        if self.check_licence and not is_licence_token_valid(self.runner.report_info.get("product_name")):
+            raise ServiceError(403, "Licence was not checked lately, log in to application first")
+
+        if not self.slots.acquire(blocking=False):
+            self.count("rejected")
+            raise ServiceError(429, f"Service is processing {self.max_jobs} jobs, try it later")
+
+        time_start = perf_counter()
+        try:
+            executor, future = self.submit_to_pool(job)
+        except ServiceError:
+            self.slots.release()
+            raise
+        self.count("accepted")
+
+        # Slot is released when worker really finishes the job, not when client stops waiting for it
+        self.count("running")
+        future.add_done_callback(self.release_slot)
+
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Job waiting for worker is cancelled, running job is stopped with its worker and slot is released then
+            if not future.cancel():
+                self.logger.error(f"Job {job.trial_balance_path} not finished in {self.timeout} s, stopping it")
+                self.restart(executor, terminate=True)
+            self.count("timed_out")
+            raise ServiceError(504, f"Job {job.trial_balance_path} not finished in {self.timeout} s")
+        except (BrokenProcessPool, CancelledError) as exception:
+            if executor in self.terminated_executors:
+                # Job itself did not fail, it ran or waited in pool terminated because of other job
+                self.logger.warning(f"Job {job.trial_balance_path} stopped together with job not finished in time")
+                self.count("stopped")
+                raise ServiceError(503, "Job stopped together with other job not finished in time, send it again")
+
+            self.logger.exception(f"Worker processing {job.trial_balance_path} crashed or was stopped")
+            self.restart(executor)
+            self.count("failed")
+            raise ServiceError(500, f"Worker processing job crashed or was stopped: {exception!r}")
+
+        self.count("ok" if result["status"] == "ok" else "failed", perf_counter() - time_start, result["timings"])
+        return result
+
+    def check_report_output_path(self, report_output_path):
+        '''
+        Resolves report output path given by job inside output folder of service, so job cannot overwrite other files.
+        Outputs of additional reports are written next to it, see BatchRunner.get_report_output_path.
+
+        Args:
+            report_output_path (str): Path to pdf file relative to output folder or absolute path inside it
+
+        Returns:
+            report_output_path (str): Absolute path with symbolic links resolved
+
+        Raises:
+            ServiceError: If output folder is not set, path lies outside of it or it is not pdf file
+        '''
+        if self.output_dir is None:
+            raise ServiceError(403, "Report output path not allowed, service has no output folder")
+
+        try:
+            output_dir = path.realpath(self.output_dir)
+            report_output_path_resolved = path.realpath(path.join(output_dir, report_output_path))
+        except (TypeError, ValueError) as exception:
+            raise ServiceError(400, f"Invalid report output path: {exception!r}")
+
+        if path.commonpath([output_dir, report_output_path_resolved]) != output_dir or \
+                path.splitext(report_output_path_resolved)[1].lower() != ".pdf":
+            raise ServiceError(403, f"Report output path {report_output_path} is not pdf file in output folder")
+
+        return report_output_path_resolved
+
+    def get_report_output_path(self, job):
+        '''
+        Creates path to output of job without report output path. Output is written to output folder or next to trial
+        balance if service has no output folder, its name is unique for each job, see BatchRunner.get_report_output_path
+        for outputs of additional reports.
+
+        Args:
+            job (BatchJob): Job without report output path
+
+        Returns:
+            report_output_path (str): Path to pdf file
+        '''
+        report_output_dirname = path.realpath(self.output_dir) if self.output_dir is not None \
+            else path.dirname(job.trial_balance_path)
+        trial_balance_name = path.splitext(path.basename(job.trial_balance_path))[0]
+        report_code_snake_case = self.runner.report_code_snake_case
+
+        return path.join(report_output_dirname, f"{report_code_snake_case}_{trial_balance_name}_{uuid4().hex}.pdf")
+
+    def submit_to_pool(self, job):
+        '''
+        Submits job to pool of worker processes, pool found broken is restarted and job is submitted again
+
+        Returns:
+            executor (ProcessPoolExecutor): Pool the job was submitted to
+            future (Future): Future of result of job
+        '''
+        for _ in range(2):
+            with self.executor_lock:
+                executor = self.executor
+            if executor is None:
+                break
+
+            try:
+                return executor, executor.submit(_process_job_in_worker, job, True)
+            except BrokenProcessPool:
+                self.restart(executor)
+            except RuntimeError:
+                break  # Pool shut down by stop
+
+        raise ServiceError(503, "Service is stopped")
+
+    def release_slot(self, future):
+        with self.lock:
+            self.counters["running"] -= 1
+        self.slots.release()
+
+    def restart(self, executor, terminate=False):
+        '''
+        Replaces broken pool of worker processes by new one, jobs waiting in broken pool are lost
+
+        Args:
+            executor (ProcessPoolExecutor): Broken pool, it is replaced only once by all jobs failed in it
+            terminate (bool): Terminates worker processes of pool, so jobs running in them are stopped and their
+                futures fail with BrokenProcessPool
+        '''
+        with self.executor_lock:
+            if self.executor is not executor:
+                return
+
+            # Pool has no public way to stop running jobs, its processes are taken before shutdown forgets them
+            processes = list((executor._processes or {}).values()) if terminate else []
+            if terminate:
+                self.terminated_executors.add(executor)
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+            self.executor = self.runner.create_executor(self.workers)
+
+        self.logger.warning("Pool of worker processes restarted")
+
+    def count(self, counter, latency=None, timings=None):
+        '''
+        Increments counter of jobs, latency and timings of stages are added for finished job
+        '''
+        with self.lock:
+            self.counters[counter] += 1
+
+            if latency is not None:
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+            for stage, timing in (timings or {}).items():
+                self.timings[stage] = self.timings.get(stage, 0.0) + timing
+
+    def get_health(self):
+        '''
+        Gets status of service
+
+        Returns:
+            health (dict): Status, number of workers, uptime in seconds and number of jobs running
+        '''
+        with self.lock:
+            return {"status": "ok" if self.executor is not None else "stopped", "workers": self.workers,
+                    "max_jobs": self.max_jobs, "uptime": perf_counter() - self.time_start,
+                    "running": self.counters["running"]}
+
+    def get_metrics(self):
+        '''
+        Gets counters of jobs since start of service
+
+        Returns:
+            metrics (dict): Numbers of jobs by their outcome, mean and maximal latency of finished jobs in seconds and
+                sum of timings of stages over all jobs
+        '''
+        with self.lock:
+            finished = self.counters["ok"] + self.counters["failed"]
+            return {**self.counters, "latency_mean": self.latency_total / finished if finished else 0.0,
+                    "latency_max": self.latency_max, "timings": dict(self.timings),
+                    "uptime": perf_counter() - self.time_start}
+
+    def serve(self, port):
+        '''
+        Serves requests until interrupted, worker processes are stopped at the end
+
+        Args:
+            port (int): Port on loopback interface
+        '''
+        server = ThreadingHTTPServer((HOST, port), ReportRequestHandler)
+        server.daemon_threads = True
+        server.service = self
+
+        self.start()
+        self.logger.info(f"Service listening on http://{HOST}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.logger.info("Service interrupted")
+        finally:
+            server.server_close()
+            self.stop()
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    '''
+    Handler of requests to ReportService, service is attribute of server
+    '''
+
+    # Timeout of reading request from socket in seconds
+    timeout = 30
+
+    def send_json(self, http_status, body):
+        data = dumps(body, ensure_ascii=False, default=_to_json).encode("utf-8")
+        self.send_response(http_status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def check_request(self):
+        '''
+        Rejects request not addressed to service on loopback or without secret of service
+
+        Raises:
+            ServiceError: If Host header is not loopback or secret is required and not sent
+        '''
+        host = urlsplit(f"//{self.headers.get('Host', '')}").hostname
+        if host not in ALLOWED_HOSTS:
+            raise ServiceError(403, f"Host {host} not allowed")
+
+        secret = self.server.service.secret
+        if secret is not None and not compare_digest(self.headers.get(SECRET_HEADER, "").encode("utf-8"),
+                                                     secret.encode("utf-8")):
+            raise ServiceError(403, f"Header {SECRET_HEADER} missing or wrong")
+
+    def do_GET(self):
+        try:
+            self.check_request()
+        except ServiceError as exception:
+            self.send_json(exception.http_status, {"error": str(exception)})
+            return
+
+        if self.path == "/health":
+            self.send_json(200, self.server.service.get_health())
+        elif self.path == "/metrics":
+            self.send_json(200, self.server.service.get_metrics())
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        try:
+            self.check_request()
+            if self.headers.get_content_type() != "application/json":
+                raise ServiceError(415, "Job must be sent as application/json")
+
+            content_length = self.headers.get("Content-Length")
+            if content_length is None:
+                raise ServiceError(411, "Header Content-Length missing")
+            try:
+                request_size = int(content_length)
+            except ValueError:
+                request_size = -1
+            if request_size < 0:
+                raise ServiceError(400, f"Invalid header Content-Length: {content_length}")
+            if request_size > MAX_REQUEST_SIZE:
+                raise ServiceError(413, f"Request larger than {MAX_REQUEST_SIZE} B")
+
+            try:
+                job_dict = loads(self.rfile.read(request_size))
+            except ValueError as exception:
+                raise ServiceError(400, f"Invalid json: {exception}")
+
+            result = self.server.service.submit(job_dict)
+            self.send_json(200 if result["status"] == "ok" else 500, result)
+        except ServiceError as exception:
+            self.send_json(exception.http_status, {"error": str(exception)})
+
+    def log_message(self, format, *args):
+        self.server.service.logger.info(f"{self.address_string()} - {format % args}")
+
+def _warm_up_worker():
+    '''
+    Does nothing, submitted only to start worker process
+    '''
+
+def _to_json(value):
+    '''
+    Converts numpy numbers in figures to python numbers for json
+    '''
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Local service processing trial balances into reports over HTTP.")
+    parser.add_argument("--config", default="reports/2023/quarter/P_6-04_a.json", help="Path to report config")
+    parser.add_argument("--template", default="reports/2023/quarter/P_6-04_a.pdf", help="Path to report template")
+    parser.add_argument("--report", nargs=2, action="append", default=[], metavar=("CONFIG", "TEMPLATE"),
+                        help="Config and template of additional report calculated from the same trial balances")
+    parser.add_argument("--reports-dir", default=None,
+                        help="Folder with configs and templates of additional reports, e.g. reports/2023/quarter")
+    parser.add_argument("--port", type=int, default=8765, help="Port on loopback interface")
+    parser.add_argument("--workers", type=int, default=2, help="Number of worker processes")
+    parser.add_argument("--max-jobs", type=int, default=None,
+                        help="Maximal number of jobs processed or waiting at once, twice the number of workers if not "
+                             "given")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Maximal time of job in seconds")
+    parser.add_argument("--output-dir", default=None,
+                        help="Folder where report output paths given by jobs must lie and outputs of other jobs are "
+                             "written, jobs giving report output path are rejected if not given")
+    parser.add_argument("--cache-dir", default="cache/trial_balances", help="Path to folder with cached trial balances")
+    parser.add_argument("--cache-size", type=int, default=500, help="Maximal size of cache in megabytes")
+    parser.add_argument("--no-cache", action="store_true", help="Always read trial balances from files")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Deduplicates fonts and XObjects and compresses contents of report outputs")
+    parser.add_argument("--metrics", default=None, help="Path to file with json lines with metrics of stages")
+    args = parser.parse_args(argv[1:])
+
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    log_path = f"logs/log_service_{timestamp}.txt"
+
+    # Creating logger
+    log_format = "[%(levelname)s] - %(asctime)s - %(name)s - : %(message)s in %(pathname)s:%(lineno)d"
+    basicConfig(handlers=[FileHandler(log_path), StreamHandler()], level=DEBUG, format=log_format)
+    logger = getLogger(__name__)
+    logger.info(f"Service log file created with timestamp: {timestamp}\n")
+
+    # Collecting additional reports, each trial balance is read once for all reports
+    additional_reports = [tuple(report) for report in args.report]
+    if args.reports_dir:
+        additional_reports += [report for report in find_reports(args.reports_dir)
+                               if path.abspath(report[0]) != path.abspath(args.config)]
+
+    trial_balance_cache = TrialBalanceCache(args.cache_dir, args.cache_size * 1024 ** 2, not args.no_cache)
+    stage_metrics = StageMetrics(args.metrics or f"logs/metrics_service_{timestamp}.jsonl")
+    runner = BatchRunner(logger, timestamp, args.config, args.template, trial_balance_cache=trial_balance_cache,
+                         stage_metrics=stage_metrics, additional_reports=additional_reports, optimize=args.optimize)
+
+    ReportService(runner, args.workers, args.max_jobs, args.timeout, args.output_dir,
+                  environ.get("REPORT_SERVICE_SECRET")).serve(args.port)
@@ -0,0 +1,158 @@
+from os import path, replace, getpid
+from json import load, dump
+from hashlib import sha256
+
+# Version of state file, state saved by other version is ignored
+STATE_VERSION = 1
+
+class ReportState:
+    '''
+    State of last run of report saved next to report output, so the next run with changed report config can reuse
+    figures and pages which were not affected by the change
+
+    Args:
+        trial_balance_key (str): Key of trial balance given by TrialBalanceCache.get_key
+        template_key (str): Hash of report template
+        output_key (str): Hash of report output
+        indicators (dict): Settings of calculation of indicators, the same structure as report config
+        figures (dict): Figures of indicators, the same structure as report config
+        pages (dict): Figures drawn on pages as lists [x_position, y_position, figure string], key is number of page
+            starting 0 as string
+    '''
+
+    def __init__(self, trial_balance_key, template_key, output_key, indicators, figures, pages):
+        self.trial_balance_key = trial_balance_key
+        self.template_key = template_key
+        self.output_key = output_key
+        self.indicators = indicators
+        self.figures = figures
+        self.pages = pages
+
+    @staticmethod
+    def get_state_path(report_output_path):
+        '''
+        Gets path to state file saved next to report output
+        '''
+        return f"{path.splitext(report_output_path)[0]}.state.json"
+
+    @staticmethod
+    def get_output_key(report_output_data):
+        return sha256(report_output_data).hexdigest()
+
+    @classmethod
+    def from_report(cls, trial_balance_key, template_key, report_output_data, calculation_plan, report_calculated):
+        '''
+        Creates state of report just written
+
+        Args:
+            trial_balance_key (str): Key of trial balance given by TrialBalanceCache.get_key
+            template_key (str): Hash of report template
+            report_output_data (bytes): Content of report output
+            calculation_plan (CalculationPlan): Plan the report was calculated by
+            report_calculated (dict): Calculated report written to report output
+
+        Returns:
+            report_state (ReportState): State of report
+        '''
+        indicators = {}
+        figures = {}
+        for (section, row, column), settings in calculation_plan.indicators.items():
+            indicators.setdefault(section, {}).setdefault(row, {})[column] = settings
+            figures.setdefault(section, {}).setdefault(row, {})[column] = \
+                report_calculated[section][row][column]["figure"]
+
+        return cls(trial_balance_key, template_key, cls.get_output_key(report_output_data), indicators, figures,
+                   cls.get_pages(calculation_plan.report_layout, report_calculated))
+
+    @staticmethod
+    def get_pages(report_layout, report_calculated):
+        '''
+        Gets figures drawn on each page in the same form as they are drawn by ReportWriter
+
+        Returns:
+            pages (dict): Lists [x_position, y_position, figure string], key is number of page starting 0 as string
+        '''
+        pages = {}
+        for page_no, fields in report_layout.pages.items():
+            pages[str(page_no)] = sorted(
+                [x_position, y_position, f"{report_calculated[section][row][column]['figure']:,}".replace(',', ' ')]
+                for x_position, y_position, (section, row, column) in fields)
+
+        return pages
+
+    @classmethod
+    def load(cls, state_path):
+        '''
+        Loads state saved by last run
+
+        Returns:
+            report_state (ReportState): State of last run, None if there is no valid state
+        '''
+        try:
+            with open(state_path, encoding="utf-8") as state_file:
+                state = load(state_file)
+
+            if state.get("version") != STATE_VERSION:
+                return None
+
+            return cls(state["trial_balance_key"], state["template_key"], state["output_key"], state["indicators"],
+                       state["figures"], state["pages"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, state_path):
+        '''
+        Saves state, the file is replaced at once, so reader never sees state written only partly
+        '''
+        state = {"version": STATE_VERSION, "trial_balance_key": self.trial_balance_key,
+                 "template_key": self.template_key, "output_key": self.output_key, "indicators": self.indicators,
+                 "figures": self.figures, "pages": self.pages}
+
+        state_path_temp = f"{state_path}.{getpid()}.tmp"
+        with open(state_path_temp, "w", encoding="utf-8") as state_file:
+            dump(state, state_file, ensure_ascii=False)
+        replace(state_path_temp, state_path)
+
+    def get_changed_indicators(self, calculation_plan):
+        '''
+        Compares settings of calculation of indicators with given plan, changes of position of figure are not counted
+
+        Returns:
+            changed_indicators (set): Keys (section, row, column) of indicators added, removed or changed
+        '''
+        indicators = {(section, row, column): settings for section, rows in self.indicators.items()
+                      for row, columns in rows.items() for column, settings in columns.items()}
+
+        return {key for key in indicators.keys() | calculation_plan.indicators.keys()
+                if indicators.get(key) != calculation_plan.indicators.get(key)}
+
+    def get_report_calculated(self, calculation_plan):
+        '''
+        Creates calculated report from figures of last run and given plan, it can be used only if calculation settings
+        of no indicator changed
+
+        Returns:
+            report_calculated (dict): Calculated report in the same structure as Calculator.calculation_handler
+        '''
+        report_calculated = {}
+        for section, rows in calculation_plan.report_config.items():
+            for row, columns in rows.items():
+                for column, cell in columns.items():
+                    cell = dict(cell)
+                    if cell["method"] != "info":
+                        cell["figure"] = self.figures[section][row][column]
+                    report_calculated.setdefault(section, {}).setdefault(row, {})[column] = cell
+
+        return report_calculated
+
+    def get_changed_pages(self, report_layout, report_calculated, no_pages_template):
+        '''
+        Compares figures drawn on pages with given report
+
+        Returns:
+            changed_pages (set): Numbers of pages starting 0 with figures added, removed, changed or moved
+        '''
+        pages = self.get_pages(report_layout, report_calculated)
+
+        return {page_no for page_no in range(no_pages_template)
+                if self.pages.get(str(page_no), []) != pages.get(str(page_no), [])}
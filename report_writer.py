@@ -1,8 +1,140 @@
-from shutil import copy
-from PyPDF2 import PdfFileWriter, PdfFileReader
+from threading import Lock
+from hashlib import sha256
+from PyPDF2 import PdfFileWriter, PdfFileReader, PageObject
+from PyPDF2.generic import NameObject, DictionaryObject, ArrayObject, TextStringObject, BooleanObject, \
+    DecodedStreamObject, FloatObject
 from io import BytesIO
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+# Figures are drawn right aligned in Times-Roman of size 14
+FONT_SIZE = 14
+
+# Widths of characters of figures in Times-Roman in 1/1000 of font size, from Adobe font metrics (AFM), other
+# characters, e.g. of "nan" or "1e+16", are measured by reportlab
+TIMES_ROMAN_WIDTHS = {**dict.fromkeys("0123456789", 500), " ": 250, "-": 333, ".": 250}
+
+# Name of font resource added to template page, it must not be used by template itself
+FONT_RESOURCE_NAME = "/FStatS"
+
+def get_text_width(text, font_size=FONT_SIZE):
+    '''
+    Gets width of text in Times-Roman
+
+    Args:
+        text (str): Text, e.g. figure string
+        font_size (float): Size of font
+
+    Returns:
+        width (float): Width of text in points
+    '''
+    try:
+        return sum(TIMES_ROMAN_WIDTHS[char] for char in text) * font_size / 1000
+    except KeyError:
+        return stringWidth(text, "Times-Roman", font_size)
+
+def escape_pdf_string(text):
+    '''
+    Encodes text into literal string of PDF content stream written by standard font with WinAnsiEncoding
+
+    Args:
+        text (str): Text, e.g. figure string
+
+    Returns:
+        pdf_string (bytes): Text enclosed in parentheses with backslashes and parentheses escaped
+    '''
+    pdf_string = text.encode("cp1252", errors="replace")
+    return b"(" + pdf_string.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+class ReportTemplate:
+    '''
+    Report template parsed once and kept in memory, so it can be reused for writing of many reports
+
+    Args:
+        report_template_path (str): Path to file with report template
+    '''
+
+    def __init__(self, report_template_path):
+        self.report_template_path = report_template_path
+
+        with open(self.report_template_path, "rb") as report_template_file:
+            self.report_template_data = report_template_file.read()
+        self.report_template_key = sha256(self.report_template_data).hexdigest()
+
+        self.report_template = PdfFileReader(BytesIO(self.report_template_data))
+        self.no_pages_template = self.report_template._get_num_pages()
+
+        # Parsing all pages including their contents and resources at once, reader keeps parsed objects
+        self.pages = []
+        for page in self.report_template.pages:
+            page.get_contents()
+            page.get(NameObject("/Resources"))
+            self.pages.append(page)
+
+        # Reader of template is shared by all reports, so writing of reports cannot run concurrently
+        self.lock = Lock()
+
+    def get_page(self, page_no):
+        '''
+        Creates copy of template page, which can be merged with report output without changing template itself
+
+        Args:
+            page_no (int): Number of page in template starting 0
+
+        Returns:
+            page (PageObject): Copy of template page
+        '''
+        page = PageObject(self.report_template)
+        page.update(self.pages[page_no])
+        return page
+
+class ReportLayout:
+    '''
+    Positions of all figures of report indexed by page of report template, so writing of page touches only figures
+    placed on that page. Figure can be placed to form field of fillable template instead of position, then cell of
+    config contains "field_name" instead of "page", "x_position" and "y_position". Report config with form field
+    given for every figure is written by filling of form fields, see ReportWriter.write_report.
+
+    Args:
+        report_config (dict): Configuration of report or report calculated, both have the same structure
+    '''
+
+    def __init__(self, report_config):
+        self.pages = {}
+        self.form_fields = {}
+        no_figures = 0
+
+        for section, rows in report_config.items():
+            for row, columns in rows.items():
+                for column, cell in columns.items():
+                    if cell["method"] == "info":
+                        continue
+
+                    no_figures += 1
+                    if "field_name" in cell:
+                        self.form_fields[cell["field_name"]] = (section, row, column)
+                        if "page" not in cell:
+                            continue
+
+                    page_no_template = cell["page"] - 1  # Pages in config file starting 1, not 0
+                    self.pages.setdefault(page_no_template, []).append(
+                        (cell["x_position"], cell["y_position"], (section, row, column)))
+
+        # Form fields are filled only if all figures have them, config is never written partly in both ways
+        self.by_form_fields = no_figures > 0 and len(self.form_fields) == no_figures
+
+    def get_fields(self, page_no):
+        '''
+        Gets figures placed on given page
+
+        Args:
+            page_no (int): Number of page in template starting 0
+
+        Returns:
+            fields (list): List of tuples (x_position, y_position, key), key is tuple (section, row, column)
+        '''
+        return self.pages.get(page_no, [])
 
 class ReportWriter:
     '''
@@ -10,73 +142,395 @@ class ReportWriter:
 
     Args:
         report_calculated (dict): Calculated report including figures to be written to output file
-        report_template_path (str): Path to file with report template
+        report_template (str or ReportTemplate): Path to file with report template or template already loaded
         report_output_path (str): Path to file with report output
+        report_layout (ReportLayout): Layout of report built from report config, built from report calculated if not
+            given
     '''
 
-    def __init__(self, report_calculated, report_template_path, report_output_path):
+    def __init__(self, report_calculated, report_template, report_output_path, report_layout=None):
         self.report_calculated = report_calculated
-        self.report_template_path = report_template_path
         self.report_output_path = report_output_path
+        self.report_layout = report_layout or ReportLayout(report_calculated)
+
+        if isinstance(report_template, ReportTemplate):
+            self.report_template = report_template
+        else:
+            self.report_template = ReportTemplate(report_template)
+
+        self.report_template_path = self.report_template.report_template_path
+
+        # Number of template pages with figures merged into them and pages taken from previous output by last writing
+        self.pages_merged = 0
+        self.pages_reused = 0
+
+    def get_figure_string(self, key):
+        '''
+        Gets figure formatted for report output, thousands are separated by space
+
+        Args:
+            key (tuple): Key of figure (section, row, column)
+
+        Returns:
+            figure_string (str): Formatted figure
+        '''
+        section, row, column = key
+        return f"{self.report_calculated[section][row][column]['figure']:,}".replace(',', ' ')
+
+    def draw_fields(self, can, page_no):
+        '''
+        Draws figures placed on given page of report template to canvas
+
+        Args:
+            can (Canvas): Canvas with actual page
+            page_no (int): Number of page in template starting 0
+        '''
+        can.setFillColorRGB(0, 0, 0)
+        can.setFont("Times-Roman", 14)
+
+        for x_position, y_position, key in self.report_layout.get_fields(page_no):
+            can.drawRightString(x_position, y_position, self.get_figure_string(key))
+
+    def write_output(self):
+        '''
+        Writes output object to output file
+        '''
+        with self.report_template.lock:
+            with open(self.report_output_path, "wb") as self.report_output_file:
+                self.output.write(self.report_output_file)
+
+    def write_report(self):
+        '''
+        Writes report in the way selected by report config, form fields of fillable template are filled if config
+        gives them for all figures, otherwise figures are written into content streams of template pages
+        '''
+        if self.report_layout.by_form_fields:
+            self.write_report_by_form_fields()
+        else:
+            self.write_report_by_content_stream()
 
     def write_report_by_watermark(self):
         '''
         Reads given report template, creates output data based on give report calculated, writes it to
         report output and saves it to file in given path location.
         '''
-        # Files manipulation and opening ###############################################################################
-        copy(self.report_template_path, self.report_output_path)
-
-        self.report_template_file = open(self.report_template_path, "rb")
-        self.report_output_file = open(self.report_output_path, "wb")
-
         # Creating output ##############################################################################################
-        self.report_template = PdfFileReader(self.report_template_file)
-        self.no_pages_template = self.report_template._get_num_pages()
+        self.no_pages_template = self.report_template.no_pages_template
 
         self.output = PdfFileWriter()
+        self.pages_merged = 0
 
         # Iterating through pages of report template
         for i in range(self.no_pages_template):
-            # Creating packet for actual page
-            packet = BytesIO()
-            can = canvas.Canvas(packet, pagesize=letter)
-            can.setFillColorRGB(0, 0, 0)
-            can.setFont("Times-Roman", 14)
-
-            # Getting sections and its rows
-            for section in self.report_calculated:
-                rows = self.report_calculated[section]
-                for columns in rows.values():
-                    for column in columns.values():
-                        if column["method"] == "info":
-                            continue
+            page_output = self.render_page(i)
 
-                        page_no_template = column["page"] - 1  # Pages in config file starting 1, not 0
+            # Adding page output to output object
+            with self.report_template.lock:
+                self.output.add_page(page_output)
+
+        # Writing output object to output file #########################################################################
+        self.write_output()
+
+    def render_page(self, page_no):
+        '''
+        Creates page of report output from template page and figures placed on it
 
-                        if i == page_no_template:
-                            # Drawing figure
-                            figure = column["figure"]
-                            figure_string = f"{figure:,}".replace(',', ' ')
-                            can.drawRightString(column["x_position"], column["y_position"], figure_string)
+        Args:
+            page_no (int): Number of page in template starting 0
+
+        Returns:
+            page_output (PageObject): Page of report output
+        '''
+        packet = BytesIO()
+
+        # Creating packet for actual page, pages without figures are taken from template as they are
+        if self.report_layout.get_fields(page_no):
+            can = canvas.Canvas(packet, pagesize=letter)
+            self.draw_fields(can, page_no)
 
             # Creating page output
             can.save()
             packet.seek(0)
 
-            page_output = self.report_template.pages[i]
+        with self.report_template.lock:
+            page_output = self.report_template.get_page(page_no)
 
             if packet.getbuffer().nbytes > 0:
                 report_input = PdfFileReader(packet)
                 page_input = report_input.pages[0]
                 page_output.merge_page(page_input)
+                self.pages_merged += 1
 
-            # Adding page output to output object
-            self.output.add_page(page_output)
+        return page_output
+
+    def write_report_by_content_stream(self):
+        '''
+        Creates the same output as write_report_by_watermark, but text operators drawing figures are written directly
+        into content stream appended to template page, so no watermark is drawn, parsed nor merged
+        '''
+        # Creating output ##############################################################################################
+        self.no_pages_template = self.report_template.no_pages_template
+
+        self.output = PdfFileWriter()
+        self.font_ref = None
+        self.content_start_ref = None
+        self.pages_merged = 0
+
+        for i in range(self.no_pages_template):
+            page_output = self.render_page_by_content_stream(i)
+
+            with self.report_template.lock:
+                self.output.add_page(page_output)
+
+        # Writing output object to output file #########################################################################
+        self.write_output()
+
+    def get_content_stream(self, page_no):
+        '''
+        Creates text operators drawing figures placed on given page right aligned, see get_text_width
+
+        Args:
+            page_no (int): Number of page in template starting 0
+
+        Returns:
+            content (bytes): Content of stream drawing figures
+        '''
+        # Operators are the same as drawn by reportlab, font with leading is set once for all figures
+        operators = [b"0 0 0 rg", f"BT {FONT_RESOURCE_NAME} {FONT_SIZE} Tf {FONT_SIZE * 1.2:g} TL ET".encode("ascii")]
+
+        for x_position, y_position, key in self.report_layout.get_fields(page_no):
+            figure_string = self.get_figure_string(key)
+            x_start = x_position - get_text_width(figure_string)
+            operators.append(f"BT 1 0 0 1 {x_start:g} {y_position:g} Tm ".encode("ascii")
+                             + escape_pdf_string(figure_string) + b" Tj T* ET")
+
+        return b"\n".join(operators)
+
+    def render_page_by_content_stream(self, page_no):
+        '''
+        Creates page of report output from template page and figures placed on it, see write_report_by_content_stream.
+        Content of template page is enclosed in q and Q, so figures are drawn in default graphics state.
+
+        Args:
+            page_no (int): Number of page in template starting 0
+
+        Returns:
+            page_output (PageObject): Page of report output
+        '''
+        with self.report_template.lock:
+            page_output = self.report_template.get_page(page_no)
+
+            if not self.report_layout.get_fields(page_no):
+                return page_output
+
+            contents = page_output.get("/Contents")  # Reference to stream or array of references
+            if contents is None:
+                contents = []
+            elif isinstance(contents.get_object(), ArrayObject):
+                contents = list(contents.get_object())
+            else:
+                contents = [contents]
+
+            # Resources of template page are shared by all reports, so font is added to their copy
+            resources = DictionaryObject(page_output.get("/Resources", DictionaryObject()).get_object())
+            fonts = DictionaryObject(resources.get("/Font", DictionaryObject()).get_object())
+
+        # Font and start of content are the same for all pages, so they are written only once
+        if self.content_start_ref is None:
+            content_start = DecodedStreamObject()
+            content_start.set_data(b"q\n")
+            self.content_start_ref = self.output._add_object(content_start)
+
+        fonts[NameObject(FONT_RESOURCE_NAME)] = self.get_font_ref()
+        resources[NameObject("/Font")] = fonts
+        page_output[NameObject("/Resources")] = resources
+
+        content_figures = DecodedStreamObject()
+        content_figures.set_data(b"\nQ\n" + self.get_content_stream(page_no))
+
+        page_output[NameObject("/Contents")] = ArrayObject(
+            [self.content_start_ref, *contents, self.output._add_object(content_figures)])
+        self.pages_merged += 1
+
+        return page_output
+
+    def get_font_ref(self):
+        '''
+        Gets reference of Times-Roman font drawing figures, font is added to output at first use
+
+        Returns:
+            font_ref (IndirectObject): Reference of font in output
+        '''
+        if self.font_ref is None:
+            self.font_ref = self.output._add_object(DictionaryObject({
+                NameObject("/Type"): NameObject("/Font"), NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Times-Roman"),
+                NameObject("/Encoding"): NameObject("/WinAnsiEncoding")}))
+
+        return self.font_ref
+
+    def write_report_incrementally(self, previous_output_data, changed_pages):
+        '''
+        Creates the same output as write_report_by_content_stream, but only changed pages are rendered, other pages are
+        taken from previous report output
+
+        Args:
+            previous_output_data (bytes): Content of previous report output written from the same report template
+            changed_pages (set): Numbers of pages starting 0 to be rendered
+        '''
+        self.no_pages_template = self.report_template.no_pages_template
+        previous_output = PdfFileReader(BytesIO(previous_output_data))
+
+        self.output = PdfFileWriter()
+        self.font_ref = None
+        self.content_start_ref = None
+        self.pages_merged = 0
+        self.pages_reused = 0
+
+        for i in range(self.no_pages_template):
+            if i in changed_pages:
+                page_output = self.render_page_by_content_stream(i)
+                with self.report_template.lock:
+                    self.output.add_page(page_output)
+            else:
+                self.output.add_page(previous_output.pages[i])
+                self.pages_reused += 1
+
+        # Writing output object to output file #########################################################################
+        self.write_output()
+
+    def write_report_by_single_watermark(self):
+        '''
+        Creates the same output as write_report_by_watermark, but figures of all pages are drawn into one multi-page
+        canvas, which is parsed only once. Page of canvas is merged into page of report template with the same number.
+        '''
+        # Creating output ##############################################################################################
+        self.no_pages_template = self.report_template.no_pages_template
+
+        self.output = PdfFileWriter()
+
+        # Drawing figures of all pages, page of canvas is created also for page without figures to keep page numbers
+        packet = BytesIO()
+        can = canvas.Canvas(packet, pagesize=letter)
+
+        for i in range(self.no_pages_template):
+            self.draw_fields(can, i)
+            can.showPage()
+
+        can.save()
+        packet.seek(0)
+        report_input = PdfFileReader(packet)
+        self.pages_merged = 0
+
+        # Iterating through pages of report template
+        with self.report_template.lock:
+            for i in range(self.no_pages_template):
+                page_output = self.report_template.get_page(i)
+
+                if self.report_layout.get_fields(i):
+                    page_output.merge_page(report_input.pages[i])
+                    self.pages_merged += 1
+
+                # Adding page output to output object
+                self.output.add_page(page_output)
+
+        # Writing output object to output file #########################################################################
+        self.write_output()
+
+    def write_report_by_form_fields(self):
+        '''
+        Writes figures into form fields of fillable report template given by field names in report config. Values are
+        set directly to fields, no watermark is drawn nor merged. Each filled field gets simple appearance stream, see
+        get_appearance_stream, so it is shown also by viewers ignoring /NeedAppearances, e.g. printing or previews.
+        Only fields with name in their own widget annotation are filled, fields with widgets as kids are not supported.
+
+        Raises:
+            KeyError: If some field of report config is not found in report template
+        '''
+        # Creating output ##############################################################################################
+        self.no_pages_template = self.report_template.no_pages_template
+
+        self.output = PdfFileWriter()
+        self.font_ref = None
+        self.pages_merged = 0
+
+        values = {field_name: TextStringObject(self.get_figure_string(key))
+                  for field_name, key in self.report_layout.form_fields.items()}
+        fields_filled = {}  # Number of object of template field and reference of filled field in output
+        field_names_filled = set()
+
+        with self.report_template.lock:
+            for i in range(self.no_pages_template):
+                page_output = self.report_template.get_page(i)
+
+                if "/Annots" in page_output:
+                    annotations_output = ArrayObject()
+                    for annotation_ref in page_output["/Annots"]:
+                        annotation = annotation_ref.get_object()
+                        field_name = annotation.get("/T")
+
+                        # Annotation of template is shared by all reports, so filled field is its copy
+                        if field_name in values:
+                            annotation = DictionaryObject(annotation)
+                            annotation[NameObject("/V")] = values[field_name]
+                            # Appearance of empty field is replaced by appearance of figure
+                            annotation[NameObject("/AP")] = DictionaryObject({
+                                NameObject("/N"): self.output._add_object(
+                                    self.get_appearance_stream(annotation, values[field_name]))})
+                            annotation_ref_output = self.output._add_object(annotation)
+                            fields_filled[annotation_ref.idnum] = annotation_ref_output
+                            field_names_filled.add(field_name)
+                            annotations_output.append(annotation_ref_output)
+                        else:
+                            annotations_output.append(annotation_ref)
+
+                    page_output[NameObject("/Annots")] = annotations_output
+
+                self.output.add_page(page_output)
+
+            missing_fields = values.keys() - field_names_filled
+            if missing_fields:
+                raise KeyError(f"Form fields not found in report template: {', '.join(sorted(missing_fields))}")
+
+            # Form of output lists filled fields instead of fields of template
+            form = DictionaryObject(self.report_template.report_template.trailer["/Root"]["/AcroForm"])
+            form[NameObject("/Fields")] = ArrayObject(fields_filled.get(field_ref.idnum, field_ref)
+                                                      for field_ref in form["/Fields"])
+            form[NameObject("/NeedAppearances")] = BooleanObject(True)
+            self.output._root_object[NameObject("/AcroForm")] = self.output._add_object(form)
 
         # Writing output object to output file #########################################################################
-        self.output.write(self.report_output_file)
+        self.write_output()
+
+    def get_appearance_stream(self, annotation, figure_string):
+        '''
+        Creates normal appearance of text field filled by figure. Figure is drawn in Times-Roman aligned by quadding
+        /Q of field (0 left, 1 centered, 2 right) and centered vertically, font is made smaller for low field.
+
+        Args:
+            annotation (DictionaryObject): Widget annotation of text field
+            figure_string (str): Figure formatted for report
+
+        Returns:
+            appearance (DecodedStreamObject): Form XObject drawing figure in bounding box of field
+        '''
+        x_1, y_1, x_2, y_2 = (float(coordinate) for coordinate in annotation["/Rect"])
+        width, height = abs(x_2 - x_1), abs(y_2 - y_1)
+
+        # Padding of 2 points is used by PDF viewers generating appearance too
+        font_size = max(min(FONT_SIZE, height - 4), 1)
+        text_width = get_text_width(figure_string, font_size)
+        x_start = {1: (width - text_width) / 2, 2: width - 2 - text_width}.get(annotation.get("/Q", 0), 2)
+        y_start = (height - font_size * 0.7) / 2  # Digits are about 0.7 of font size high
+
+        appearance = DecodedStreamObject()
+        appearance.set_data(
+            f"/Tx BMC q BT {FONT_RESOURCE_NAME} {font_size:g} Tf 0 g {x_start:g} {y_start:g} Td ".encode("ascii")
+            + escape_pdf_string(figure_string) + b" Tj ET Q EMC")
+        appearance.update({
+            NameObject("/Type"): NameObject("/XObject"), NameObject("/Subtype"): NameObject("/Form"),
+            NameObject("/BBox"): ArrayObject(FloatObject(coordinate) for coordinate in (0, 0, width, height)),
+            NameObject("/Resources"): DictionaryObject({NameObject("/Font"): DictionaryObject({
+                NameObject(FONT_RESOURCE_NAME): self.get_font_ref()})})})
 
-        # File closing #################################################################################################
-        self.report_template_file.close()
-        self.report_output_file.close()
+        return appearance
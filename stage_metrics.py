@@ -0,0 +1,182 @@
+from sys import platform
+from os import path, getpid
+from json import dumps
+from time import perf_counter, thread_time
+from datetime import datetime
+from threading import Lock
+from contextlib import contextmanager
+import tracemalloc
+
+def get_peak_rss():
+    '''
+    Gets peak resident set size of this process since its start, it is not peak of one stage
+
+    Returns:
+        peak_rss (int): Peak resident set size in bytes, None if it cannot be found out on this platform
+    '''
+    try:
+        from resource import getrusage, RUSAGE_SELF
+    except ImportError:
+        return get_peak_rss_windows()
+
+    # Linux gives kilobytes, macOS gives bytes
+    peak_rss = getrusage(RUSAGE_SELF).ru_maxrss
+    return peak_rss if platform == "darwin" else peak_rss * 1024
+
+def get_peak_rss_windows():
+    '''
+    Gets peak working set of this process on Windows, where module resource is not available
+    '''
+    try:
+        from ctypes import windll, Structure, sizeof, byref, c_ulong, c_size_t
+    except ImportError:
+        return None
+
+    class ProcessMemoryCounters(Structure):
+        _fields_ = [("cb", c_ulong), ("PageFaultCount", c_ulong), ("PeakWorkingSetSize", c_size_t),
+                    ("WorkingSetSize", c_size_t), ("QuotaPeakPagedPoolUsage", c_size_t),
+                    ("QuotaPagedPoolUsage", c_size_t), ("QuotaPeakNonPagedPoolUsage", c_size_t),
+                    ("QuotaNonPagedPoolUsage", c_size_t), ("PagefileUsage", c_size_t),
+                    ("PeakPagefileUsage", c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = sizeof(counters)
+    if not windll.psapi.GetProcessMemoryInfo(windll.kernel32.GetCurrentProcess(), byref(counters), counters.cb):
+        return None
+
+    return counters.PeakWorkingSetSize
+
+class StageMetrics:
+    '''
+    Measures stages of report job and writes one json line per stage into metrics file next to log file. Each line
+    contains wall time, CPU time of thread running the stage, peak RSS of process since its start, peak of memory
+    traced by tracemalloc during the stage and counts given by the stage, e.g. number of rows read.
+
+    Optionally one slow job of each process is profiled by cProfile or pyinstrument and its profile is dumped to file
+    with pid of process added to given path.
+
+    Args:
+        metrics_path (str): Path to file with json lines, metrics are only kept in memory if not given
+        trace_memory (bool): Traces python allocations by tracemalloc, it slows down stages considerably
+        profile_path (str): Path to file with profile, pid is added before extension, jobs are not profiled if not
+            given
+        profile_threshold (float): Only job taking at least given number of seconds is dumped
+        profiler (str): "cprofile" for profile readable by pstats or "pyinstrument" for html report
+    '''
+
+    def __init__(self, metrics_path=None, trace_memory=False, profile_path=None, profile_threshold=0.0,
+                 profiler="cprofile"):
+        self.metrics_path = metrics_path
+        self.trace_memory = trace_memory
+        self.profile_path = profile_path
+        self.profile_threshold = profile_threshold
+        self.profiler = profiler
+
+        self.records = []
+        self.profile_dumped = False
+        self.lock = Lock()
+
+    def __getstate__(self):
+        # Lock cannot be pickled and records are not sent to worker processes
+        state = self.__dict__.copy()
+        del state["lock"]
+        state["records"] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = Lock()
+
+    @contextmanager
+    def measure(self, stage, **context):
+        '''
+        Measures stage running inside of with statement. Counts are added by stage into yielded record, stage running
+        in another process adds its own CPU time and peak RSS.
+
+        Args:
+            stage (str): Name of stage
+            context: Values identifying the stage, e.g. path to trial balance
+
+        Yields:
+            record (dict): Record of stage written after the stage ends
+        '''
+        record = {"timestamp": datetime.now().isoformat(), "pid": getpid(), "stage": stage, **context}
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        time_start = perf_counter()
+        cpu_time_start = thread_time()
+        status = "error"
+        try:
+            yield record
+            status = "ok"
+        finally:
+            record["status"] = status
+            record["wall_time"] = perf_counter() - time_start
+            # Stage waiting for another process sets CPU time and peak RSS measured by that process
+            record.setdefault("cpu_time", thread_time() - cpu_time_start)
+            record.setdefault("process_peak_rss", get_peak_rss())
+            record["peak_traced"] = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+            self.write_record(record)
+
+    def write_record(self, record):
+        '''
+        Keeps record and appends it as one json line to metrics file
+        '''
+        with self.lock:
+            self.records.append(record)
+
+            if self.metrics_path is not None:
+                with open(self.metrics_path, "a", encoding="utf-8") as metrics_file:
+                    metrics_file.write(dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def get_profile_path(self):
+        '''
+        Gets path to profile of this process, so worker processes do not overwrite profiles of each other
+
+        Returns:
+            profile_path (str): Given path to profile with pid added before extension, e.g. profile.1234.prof
+        '''
+        root, extension = path.splitext(self.profile_path)
+        return f"{root}.{getpid()}{extension}"
+
+    @contextmanager
+    def profile(self):
+        '''
+        Profiles code running inside of with statement, the profile is dumped only for first run of process reaching
+        threshold
+        '''
+        if self.profile_path is None or self.profile_dumped:
+            yield
+            return
+
+        if self.profiler == "pyinstrument":
+            from pyinstrument import Profiler  # Optional, needed only for profiling by pyinstrument
+            profiler = Profiler()
+            profiler.start()
+        else:
+            from cProfile import Profile
+            profiler = Profile()
+            profiler.enable()
+
+        time_start = perf_counter()
+        try:
+            yield
+        finally:
+            if self.profiler == "pyinstrument":
+                profiler.stop()
+            else:
+                profiler.disable()
+
+            with self.lock:
+                if not self.profile_dumped and perf_counter() - time_start >= self.profile_threshold:
+                    self.profile_dumped = True
+
+                    if self.profiler == "pyinstrument":
+                        with open(self.get_profile_path(), "w", encoding="utf-8") as profile_file:
+                            profile_file.write(profiler.output_html())
+                    else:
+                        profiler.dump_stats(self.get_profile_path())
@@ -0,0 +1,113 @@
+from sys import meta_path
+from time import perf_counter
+from threading import local
+
+class ImportTimer:
+    '''
+    Measures time of importing modules in the same way as python option -X importtime. Time of each module is measured
+    including its nested imports (cumulative) and without them (self). Modules imported by other threads at the same
+    time are measured by their own stacks.
+    '''
+
+    def __init__(self):
+        self.import_times = {}
+        self.local = local()
+
+    @property
+    def stack(self):
+        '''
+        Stack of modules being imported by current thread, items are start time and nested time of module
+        '''
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def install(self):
+        '''
+        Starts measuring of following imports
+        '''
+        if self not in meta_path:
+            meta_path.insert(0, self)
+
+    def uninstall(self):
+        '''
+        Stops measuring of imports
+        '''
+        if self in meta_path:
+            meta_path.remove(self)
+
+    def find_spec(self, fullname, path=None, target=None):
+        '''
+        Finds module by other finders and wraps its loader, so execution of module is measured
+        '''
+        for finder in meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = TimedLoader(spec.loader, self)
+                return spec
+
+        return None
+
+    def start(self):
+        '''
+        Starts measuring of one module
+        '''
+        self.stack.append([perf_counter(), 0.0])
+
+    def stop(self, fullname):
+        '''
+        Stops measuring of one module, its time is added to nested time of module importing it
+        '''
+        time_start, time_nested = self.stack.pop()
+        time_cumulative = perf_counter() - time_start
+        self.import_times[fullname] = (time_cumulative - time_nested, time_cumulative)
+
+        if self.stack:
+            self.stack[-1][1] += time_cumulative
+
+    def log_import_times(self, logger, limit=25):
+        '''
+        Logs modules with the longest cumulative time of import
+
+        Args:
+            logger (instance): Instance of logger provided by executive file
+            limit (int): Number of logged modules
+        '''
+        import_times = sorted(self.import_times.items(), key=lambda item: item[1][1], reverse=True)
+
+        logger.info(f"Import times of {len(import_times)} modules, self [us] | cumulative [us] | module:")
+        for fullname, (time_self, time_cumulative) in import_times[:limit]:
+            logger.info(f"{time_self * 1e6:10.0f} | {time_cumulative * 1e6:10.0f} | {fullname}")
+
+class TimedLoader:
+    '''
+    Loader of module measuring its execution by ImportTimer
+
+    Args:
+        loader (instance): Original loader of module
+        import_timer (ImportTimer): Timer collecting times of imports
+    '''
+
+    def __init__(self, loader, import_timer):
+        self.loader = loader
+        self.import_timer = import_timer
+
+    def create_module(self, spec):
+        if hasattr(self.loader, "create_module"):
+            return self.loader.create_module(spec)
+        return None
+
+    def exec_module(self, module):
+        module.__loader__ = self.loader
+        self.import_timer.start()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.import_timer.stop(module.__name__)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
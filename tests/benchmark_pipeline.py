@@ -0,0 +1,187 @@
+from sys import argv, exit, version
+from os import path, makedirs
+from json import load, dump
+from time import perf_counter
+from datetime import datetime
+from statistics import median
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+from trial_balance_reader import TrialBalanceReader
+from calculations import Calculator
+from report_writer import ReportWriter
+from trial_balance_generator import TrialBalanceGenerator
+from helper_form_template import create_form_template
+
+'''
+Benchmark of stages reading, calculating and writing of report.
+Based on:
+    - Trial balances used in calculation tests
+    - Synthetic trial balances with given number of rows, clean and messy ones (see trial_balance_generator.py)
+    - Config and template of 2023 quarterly report "P 6-04 (a)", writing is measured also for fillable copy of
+      template with form field at position of each figure (see helper_form_template.py)
+
+Usage:
+    python benchmark_pipeline.py --output benchmark.json
+    python benchmark_pipeline.py --output benchmark_new.json --compare benchmark.json --threshold 0.2
+'''
+
+TESTS_DIR = path.dirname(path.abspath(__file__))
+REPORT_CONFIG_PATH = path.join(TESTS_DIR, "../reports/2023/quarter/P_6-04_a.json")
+REPORT_TEMPLATE_PATH = path.join(TESTS_DIR, "../reports/2023/quarter/P_6-04_a.pdf")
+SYNTHETIC_DIR = path.join(TESTS_DIR, "benchmark/synthetic")
+
+# Trial balances used in calculation tests: name, file path, sheet and columns
+FIXTURES = [
+    ("general_1", "calculations/general_2022_quarter_P_6_04_a/Helios - AZP - obratová předvaha.xls",
+     "AZP - obratová předvaha", "A", "C", "D", "E"),
+    ("general_2", "calculations/general_2022_quarter_P_6_04_a/Forza Sole - obratová předvaha k 30062016.xlsx",
+     "List1", "A", "D", "E", "G"),
+    ("general_3", "calculations/general_2022_quarter_P_6_04_a/Helios - obratová předvaha 12_2017 po auditu.xlsx",
+     "HELIOS Orange - Denní stavy účt", "A", "F", "G", "H"),
+    ("general_4", "calculations/general_2022_quarter_P_6_04_a/Helios - TECHP předvaha 2021.xlsx",
+     "Obratová předvaha (L-M)", "A", "D", "E", "J"),
+    ("general_5", "calculations/general_2022_quarter_P_6_04_a/Obratova PREDVAHA 10_2015.xls",
+     "Sheet1", "A", "E", "F", "G"),
+    ("general_6", "calculations/general_2022_quarter_P_6_04_a/Obratová předvaha 2014.XLS",
+     "Obratová předvaha 2014", "A", "G", "I", "M"),
+    ("general_7", "calculations/general_2022_quarter_P_6_04_a/obratová předvaha 2014.xlsx",
+     "List1", "B", "R", "V", "X"),
+    ("general_8", "calculations/general_2022_quarter_P_6_04_a/Obratová předvaha po opr.rezerv a 425.xlsx",
+     "List1", "A", "E", "G", "H"),
+]
+
+SYNTHETIC_SIZES = (10_000, 100_000, 1_000_000)
+
+def get_cases(sizes):
+    '''
+    Gets trial balances to be benchmarked, synthetic trial balances are generated if they do not exist yet
+
+    Args:
+        sizes (list): Numbers of rows of synthetic trial balances
+
+    Returns:
+        cases (list): Tuples of name, file path, sheet and columns
+    '''
+    cases = [(name, path.join(TESTS_DIR, file_path), *columns) for name, file_path, *columns in FIXTURES
+             if path.exists(path.join(TESTS_DIR, file_path))]
+
+    makedirs(SYNTHETIC_DIR, exist_ok=True)
+    for rows in sizes:
+        for name, messy in ((f"synthetic_{rows}", False), (f"synthetic_messy_{rows}", True)):
+            file_path = path.join(SYNTHETIC_DIR, f"{name}.xlsx")
+            if not path.exists(file_path):
+                TrialBalanceGenerator(rows, messy=messy).write(file_path)
+            cases.append((name, file_path, "List1", "A", "D", "E", "F"))
+
+    return cases
+
+def measure(function, repeat):
+    '''
+    Runs function repeatedly and measures its time
+
+    Returns:
+        times (list): Times of all runs in seconds
+        result: Result of last run
+    '''
+    times = []
+    for _ in range(repeat):
+        time_start = perf_counter()
+        result = function()
+        times.append(perf_counter() - time_start)
+
+    return times, result
+
+def run_benchmark(sizes, repeat):
+    '''
+    Measures stages reading, calculating and writing for all trial balances
+
+    Returns:
+        results (dict): Times of runs and their median and minimum, key is "<trial balance>/<stage>"
+    '''
+    results = {}
+
+    with TemporaryDirectory() as output_dir:
+        with open(REPORT_CONFIG_PATH, encoding="utf-8") as report_config_file:
+            report_config = load(report_config_file)
+        form_template_path = path.join(output_dir, "form_template.pdf")
+        form_config = create_form_template(report_config, REPORT_TEMPLATE_PATH, form_template_path)
+
+        for name, file_path, sheet, account_col, debit_turnover_col, credit_turnover_col, end_balance_col in \
+                get_cases(sizes):
+            reader = TrialBalanceReader(file_path, sheet, account_col, debit_turnover_col, credit_turnover_col,
+                                        end_balance_col)
+            times_read, final_df = measure(reader.get_final_df, repeat)
+
+            times_calculate, report_calculated = measure(
+                lambda: Calculator(REPORT_CONFIG_PATH, final_df).calculation_handler(), repeat)
+
+            report_output_path = path.join(output_dir, f"{name}.pdf")
+            times_write, _ = measure(
+                lambda: ReportWriter(report_calculated, REPORT_TEMPLATE_PATH,
+                                     report_output_path).write_report_by_watermark(), repeat)
+            times_write_content_stream, _ = measure(
+                lambda: ReportWriter(report_calculated, REPORT_TEMPLATE_PATH,
+                                     report_output_path).write_report_by_content_stream(), repeat)
+
+            # Figures calculated are the same, only their places are given by form fields
+            for section, rows in form_config.items():
+                for row, columns in rows.items():
+                    for column, cell in columns.items():
+                        if "field_name" in cell:
+                            report_calculated[section][row][column]["field_name"] = cell["field_name"]
+            times_write_form, _ = measure(
+                lambda: ReportWriter(report_calculated, form_template_path,
+                                     report_output_path).write_report_by_form_fields(), repeat)
+
+            for stage, times in (("read", times_read), ("calculate", times_calculate), ("write", times_write),
+                                 ("write_content_stream", times_write_content_stream),
+                                 ("write_form", times_write_form)):
+                results[f"{name}/{stage}"] = {"median": median(times), "min": min(times), "runs": times}
+                print(f"{name}/{stage}: median {median(times):.4f} s, min {min(times):.4f} s")
+
+    return results
+
+def compare(results, baseline_results, threshold):
+    '''
+    Compares medians of results with baseline
+
+    Args:
+        results (dict): Results of actual run
+        baseline_results (dict): Results of baseline run
+        threshold (float): Allowed relative slowdown, e.g. 0.2 for 20 %
+
+    Returns:
+        regressions (list): Keys of results slower than baseline by more than threshold
+    '''
+    regressions = []
+    for key in sorted(set(results) & set(baseline_results)):
+        ratio = results[key]["median"] / max(baseline_results[key]["median"], 1e-9)
+        regressed = ratio > 1 + threshold
+        print(f"{'REGRESSION' if regressed else 'ok':10} {key}: {ratio:.2f}x of baseline")
+        if regressed:
+            regressions.append(key)
+
+    return regressions
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark of reading, calculating and writing of report.")
+    parser.add_argument("--output", default="benchmark.json", help="Path to json file with results")
+    parser.add_argument("--compare", default=None, help="Path to json file with results of baseline run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative slowdown against baseline")
+    parser.add_argument("--sizes", type=int, nargs="*", default=SYNTHETIC_SIZES,
+                        help="Numbers of rows of synthetic trial balances")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each stage")
+    args = parser.parse_args(argv[1:])
+
+    results = run_benchmark(args.sizes, args.repeat)
+
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        dump({"timestamp": datetime.now().isoformat(), "python": version, "results": results}, output_file,
+             indent=4)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline_results = load(baseline_file)["results"]
+
+        if compare(results, baseline_results, args.threshold):
+            exit(1)
@@ -0,0 +1,70 @@
+from copy import deepcopy
+from io import BytesIO
+from PyPDF2 import PdfFileReader, PdfFileWriter
+from PyPDF2.generic import NameObject, NumberObject, DictionaryObject, ArrayObject
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+from report_writer import ReportLayout
+
+'''
+Fillable report template made from report template and positions of figures of report config, used by tests and
+benchmark of writing of report by filling of form fields
+'''
+
+FIELD_WIDTH = 120
+FIELD_HEIGHT = 18
+
+def create_form_template(report_config, report_template_path, form_template_path):
+    '''
+    Adds text field to report template at position of each figure of report config
+
+    Args:
+        report_config (dict): Configuration of report or report calculated with positions of figures
+        report_template_path (str): Path to file with report template
+        form_template_path (str): Path to file with fillable report template to be created
+
+    Returns:
+        form_config (dict): Copy of report config with "field_name" added to each figure
+    '''
+    form_config = deepcopy(report_config)
+    report_layout = ReportLayout(report_config)
+
+    with open(report_template_path, "rb") as report_template_file:
+        report_template = PdfFileReader(BytesIO(report_template_file.read()))
+
+    # Drawing text fields, fields are right aligned the same way as figures drawn by watermark
+    packet = BytesIO()
+    can = canvas.Canvas(packet, pagesize=letter)
+    for page_no in range(report_template._get_num_pages()):
+        for x_position, y_position, (section, row, column) in report_layout.get_fields(page_no):
+            field_name = f"{section}_{row}_{column}"
+            form_config[section][row][column]["field_name"] = field_name
+            can.acroForm.textfield(name=field_name, x=x_position - FIELD_WIDTH, y=y_position - 4, width=FIELD_WIDTH,
+                                   height=FIELD_HEIGHT, borderWidth=0, fontName="Times-Roman", fontSize=14)
+        can.showPage()
+    can.save()
+    packet.seek(0)
+    fields = PdfFileReader(packet)
+
+    output = PdfFileWriter()
+    fields_output = ArrayObject()
+    for page_no, page in enumerate(report_template.pages):
+        page.merge_page(fields.pages[page_no])
+
+        for annotation_ref in page.get("/Annots", []):
+            if annotation_ref.pdf is fields:
+                annotation_ref.get_object()[NameObject("/Q")] = NumberObject(2)
+                fields_output.append(annotation_ref)
+        output.add_page(page)
+
+    form = DictionaryObject(report_template.trailer["/Root"]["/AcroForm"])
+    form[NameObject("/Fields")] = ArrayObject(list(form["/Fields"]) + fields_output)
+    fonts = DictionaryObject(form.get("/DR", {}).get("/Font", {}))
+    fonts.update(fields.trailer["/Root"]["/AcroForm"]["/DR"]["/Font"])
+    form[NameObject("/DR")] = DictionaryObject({NameObject("/Font"): fonts})
+    output._root_object[NameObject("/AcroForm")] = output._add_object(form)
+
+    with open(form_template_path, "wb") as form_template_file:
+        output.write(form_template_file)
+
+    return form_config
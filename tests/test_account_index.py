@@ -0,0 +1,39 @@
+from unittest import TestCase
+from numpy import nan
+from pandas import DataFrame
+from account_index import AccountPrefixIndex
+
+'''
+Tests of sums over accounts by prefix. Expected sums are made by filtering the whole trial balance.
+'''
+
+FINAL_DF = DataFrame({"account": ["501100", "211000", "501200", "502000", "013000", "5011", "601000", "504100"],
+                      "debit_turnover": [100.5, 20.0, 30.25, 7.0, 1000.0, 1.0, 0.0, nan],
+                      "credit_turnover": [0.0, 15.0, 2.0, 1.0, 0.0, 0.0, 500.0, 3.0],
+                      "end_balance": [100.5, 5.0, 28.25, 6.0, 1000.0, 1.0, -500.0, 4.0]})
+
+class TestAccountPrefixIndex(TestCase):
+
+    def setUp(self):
+        self.index = AccountPrefixIndex(FINAL_DF)
+
+    def filtered_sum(self, prefixes, amount_column):
+        return FINAL_DF[FINAL_DF["account"].str.startswith(tuple(prefixes))][amount_column].sum()
+
+    def test_sum_prefix(self):
+        for prefix in ("5", "50", "501", "5011", "501100", "013", "211", "9", ""):
+            for amount_column in ("debit_turnover", "credit_turnover", "end_balance"):
+                self.assertAlmostEqual(self.index.sum_prefix(prefix, amount_column),
+                                       self.filtered_sum([prefix], amount_column))
+
+    def test_sum_prefixes_counts_overlapping_accounts_once(self):
+        self.assertAlmostEqual(self.index.sum_prefixes(["50", "501", "601"], "end_balance"),
+                               self.filtered_sum(["50", "601"], "end_balance"))
+
+    def test_sum_range(self):
+        self.assertAlmostEqual(self.index.sum_range("501", "502", "debit_turnover"),
+                               self.filtered_sum(["501", "502"], "debit_turnover"))
+
+    def test_count_prefix(self):
+        self.assertEqual(self.index.count_prefix("501"), 3)
+        self.assertEqual(self.index.count_prefix("7"), 0)
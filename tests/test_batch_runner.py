@@ -0,0 +1,170 @@
+from os import path, getpid
+from json import dump
+from copy import deepcopy
+from shutil import copyfile
+from logging import getLogger
+from threading import enumerate as enumerate_threads
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from concurrent.futures import ProcessPoolExecutor
+from pandas.testing import assert_frame_equal
+from batch_runner import BatchRunner, BatchJob, FanOutJob, ReportJob, find_reports
+from account_index import AccountPrefixIndex
+from calculation_plan import CalculationPlan
+from compact_trial_balance import CompactTrialBalance
+from report_writer import ReportTemplate
+from test_report_writer import REPORT_TEMPLATE_PATH, REPORT_CALCULATED
+from test_trial_balance_cache import StubTrialBalanceCache, FINAL_DF
+
+'''
+Tests of processing of one trial balance into more reports. Calculation is replaced by stub returning figures made up
+for testing, trial balance is read by stub cache.
+'''
+
+class StubCalculationPlan(CalculationPlan):
+
+    def __init__(self, report_config_path, error=None):
+        super().__init__(report_config_path)
+        self.error = error
+        self.evaluated = []  # Trial balances and prefix indexes given to evaluate
+
+    def evaluate(self, final_df, prefix_index=None):
+        self.evaluated.append((final_df, prefix_index))
+        if self.error is not None:
+            raise self.error
+        return deepcopy(REPORT_CALCULATED)
+
+def write_report_config(report_config_path, report_code_snake_case):
+    '''
+    Writes report config made from report calculated used by tests with given report code
+    '''
+    report_config = deepcopy(REPORT_CALCULATED)
+    report_config["Info"]["01"]["1"]["report_code_snake_case"] = report_code_snake_case
+    for rows in report_config.values():
+        for columns in rows.values():
+            for cell in columns.values():
+                cell.pop("figure", None)
+
+    with open(report_config_path, "w", encoding="utf-8") as report_config_file:
+        dump(report_config, report_config_file)
+
+class TestFanOutJob(TestCase):
+
+    def setUp(self):
+        self.reports_dir = TemporaryDirectory()
+        self.trial_balance_path = path.join(self.reports_dir.name, "trial_balance.xlsx")
+        with open(self.trial_balance_path, "wb") as trial_balance_file:
+            trial_balance_file.write(b"trial balance")
+
+        self.report_template = ReportTemplate(REPORT_TEMPLATE_PATH)
+        self.trial_balance_cache = StubTrialBalanceCache(path.join(self.reports_dir.name, "cache"))
+        self.job = BatchJob(self.trial_balance_path, "List1", "A", "D", "E", "F")
+
+    def tearDown(self):
+        self.reports_dir.cleanup()
+
+    def create_calculation_plan(self, report_code_snake_case, error=None):
+        report_config_path = path.join(self.reports_dir.name, f"{report_code_snake_case}.json")
+        write_report_config(report_config_path, report_code_snake_case)
+        return StubCalculationPlan(report_config_path, error)
+
+    def create_runner(self, calculation_plans):
+        runner = BatchRunner(getLogger(), "test", calculation_plans[0].report_config_path, REPORT_TEMPLATE_PATH,
+                             calculation_plans[0], self.trial_balance_cache)
+        runner.reports = [(calculation_plan, self.report_template) for calculation_plan in calculation_plans]
+        return runner
+
+    def test_failed_report_does_not_stop_others(self):
+        runner = self.create_runner([self.create_calculation_plan("P_A", KeyError("A_01_1")),
+                                     self.create_calculation_plan("P_B")])
+
+        result = runner.process_job(self.job, include_figures=True)
+
+        report_output_path_failed, report_output_path = result["report_output_paths"]
+        self.assertEqual(result["status"], "error")
+        self.assertEqual(result["error"], "1 of 2 reports failed")
+        self.assertEqual(result["report_errors"], {report_output_path_failed: "KeyError('A_01_1')"})
+        self.assertFalse(path.exists(report_output_path_failed))
+        self.assertTrue(path.exists(report_output_path))
+        self.assertEqual(result["figures"][0], None)
+        self.assertEqual(result["figures"][1]["A"]["01"], {"1": 1234567, "2": -89})
+        self.assertEqual(self.trial_balance_cache.no_reads, 1)
+
+    def test_reports_get_own_trial_balance_and_shared_index(self):
+        calculation_plans = [self.create_calculation_plan("P_A"), self.create_calculation_plan("P_B")]
+        report_jobs = [ReportJob(self.job, path.join(self.reports_dir.name, f"{report_code}.pdf"), calculation_plan,
+                                 self.report_template, self.trial_balance_cache)
+                       for report_code, calculation_plan in zip(("P_A", "P_B"), calculation_plans)]
+        fan_out_job = FanOutJob(report_jobs)
+        final_df = fan_out_job.read()
+
+        # First report changes its trial balance
+        calculation_plans[0].evaluate = lambda final_df, prefix_index=None: final_df.drop(columns="end_balance",
+                                                                                           inplace=True)
+        fan_out_job.calculate(final_df)
+
+        assert_frame_equal(final_df, FINAL_DF)
+        (final_df_b, prefix_index), = calculation_plans[1].evaluated
+        assert_frame_equal(final_df_b, FINAL_DF)
+        self.assertIsNot(final_df_b, final_df)
+        self.assertIsInstance(prefix_index, AccountPrefixIndex)
+        self.assertEqual(prefix_index.sum_prefix("0", "end_balance"), 1000.0)
+        self.assertEqual(self.trial_balance_cache.no_reads, 1)
+
+    def test_pipeline_reads_compact_trial_balance(self):
+        runner = self.create_runner([self.create_calculation_plan("P_A"), self.create_calculation_plan("P_B")])
+        fan_out_job = runner.create_fan_out_job(self.job)
+
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            final_df = fan_out_job.read(executor)
+        self.assertIsInstance(final_df, CompactTrialBalance)
+        assert_frame_equal(final_df.to_df(), FINAL_DF)
+
+        results = runner.run_pipeline([self.job, self.job], read_workers=1)
+        self.assertEqual([result["status"] for result in results], ["ok", "ok"])
+
+        # Reading is measured by worker process, not by thread waiting for it
+        records = [record for record in runner.stage_metrics.records if record["stage"] == "read"]
+        self.assertEqual(len(records), 3)
+        self.assertTrue(all(record["worker_pid"] != getpid() for record in records))
+
+    def test_pipeline_stopped_when_job_cannot_be_created(self):
+        runner = self.create_runner([self.create_calculation_plan("P_A")])
+        create_fan_out_job = runner.create_fan_out_job
+        jobs = [self.job, BatchJob(None, "List1", "A", "D", "E", "F")]
+
+        def create_fan_out_job_failing(job):
+            if job.trial_balance_path is None:
+                raise TypeError("Trial balance not given")
+            return create_fan_out_job(job)
+
+        runner.create_fan_out_job = create_fan_out_job_failing
+        with self.assertRaises(TypeError):
+            runner.run_pipeline(jobs, read_workers=1)
+        self.assertEqual([thread.name for thread in enumerate_threads() if thread.name.startswith("pipeline-")], [])
+
+    def test_all_reports_failed(self):
+        report_jobs = [ReportJob(self.job, path.join(self.reports_dir.name, f"{report_code}.pdf"),
+                                 self.create_calculation_plan(report_code, ValueError(report_code)),
+                                 self.report_template, self.trial_balance_cache)
+                       for report_code in ("P_A", "P_B")]
+        fan_out_job = FanOutJob(report_jobs)
+
+        with self.assertRaisesRegex(ValueError, "P_B"):
+            fan_out_job.run()
+        self.assertEqual(len(fan_out_job.errors), 2)
+
+    def test_duplicate_report_codes_rejected(self):
+        for report_name in ("P_6-04_a", "P_6-04_a_copy", "P_5-01"):
+            write_report_config(path.join(self.reports_dir.name, f"{report_name}.json"),
+                                "P_5_01" if report_name == "P_5-01" else "P_6_04_a")
+            copyfile(REPORT_TEMPLATE_PATH, path.join(self.reports_dir.name, f"{report_name}.pdf"))
+
+        with self.assertRaisesRegex(ValueError, "P_6-04_a.json and P_6-04_a_copy.json"):
+            find_reports(self.reports_dir.name)
+
+        report_config_path = path.join(self.reports_dir.name, "P_6-04_a.json")
+        with self.assertRaisesRegex(ValueError, "same report codes"):
+            BatchRunner(getLogger(), "test", report_config_path, REPORT_TEMPLATE_PATH,
+                        StubCalculationPlan(report_config_path),
+                        additional_reports=[(report_config_path.replace(".json", "_copy.json"), REPORT_TEMPLATE_PATH)])
@@ -0,0 +1,69 @@
+from pickle import dumps, loads
+from unittest import TestCase
+from numpy import nan
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
+from compact_trial_balance import CompactTrialBalance, MISSING_AMOUNT
+from test_account_index import FINAL_DF
+
+'''
+Tests of conversion of trial balance to compact form and back and of sums in compact form
+'''
+
+class TestCompactTrialBalance(TestCase):
+
+    def setUp(self):
+        self.compact_trial_balance = CompactTrialBalance.from_df(FINAL_DF)
+
+    def test_conversion_lossless(self):
+        assert_frame_equal(self.compact_trial_balance.to_df(), FINAL_DF)
+
+        final_df = FINAL_DF.iloc[::-1].copy()
+        final_df["end_balance"] = [0.1, 0.2, -123456789.99, 1e12, nan, 0.0, -0.01, 5.55]
+        assert_frame_equal(CompactTrialBalance.from_df(final_df).to_df(), final_df)
+
+    def test_conversion_keeps_types_of_amounts(self):
+        final_df = FINAL_DF.copy()
+        final_df["debit_turnover"] = [100, 20, 30, -7, 1000, 1, 0, 12345678901234]
+        final_df["credit_turnover"] = final_df["credit_turnover"].astype("float32")
+        final_df["count"] = final_df["debit_turnover"].astype("uint16")
+        compact_trial_balance = CompactTrialBalance.from_df(final_df)
+
+        assert_frame_equal(compact_trial_balance.to_df(), final_df)
+        assert_frame_equal(loads(dumps(compact_trial_balance)).to_df(), final_df)
+        self.assertEqual(compact_trial_balance.sum_prefix("50", "debit_turnover"), 12345678901234 * 100 + 12400)
+
+        final_df["end_balance"] = final_df["end_balance"].astype(object)
+        with self.assertRaises(ValueError):
+            CompactTrialBalance.from_df(final_df)
+
+    def test_accounts_sorted_categorical(self):
+        self.assertEqual(list(self.compact_trial_balance.categories), sorted(set(FINAL_DF["account"])))
+        self.assertEqual(list(self.compact_trial_balance.get_accounts()), list(FINAL_DF["account"]))
+
+    def test_sum_prefix_in_halere(self):
+        self.assertEqual(self.compact_trial_balance.sum_prefix("501", "debit_turnover"), 13175)
+        self.assertEqual(self.compact_trial_balance.sum_prefix("50", "debit_turnover"), 13875)
+        self.assertEqual(self.compact_trial_balance.sum_prefix("9", "end_balance"), 0)
+
+        # Sums by cumulative sums are the same as sums of rows found by mask
+        for prefix in ("5", "50", "501", "5011", "501100", "013", "211", ""):
+            for amount_column in ("debit_turnover", "credit_turnover", "end_balance"):
+                amounts = self.compact_trial_balance.get_amounts(amount_column)[
+                    self.compact_trial_balance.get_prefix_mask(prefix)]
+                self.assertEqual(self.compact_trial_balance.sum_prefix(prefix, amount_column),
+                                 amounts[amounts != MISSING_AMOUNT].sum())
+
+    def test_float_rounding_errors_accepted(self):
+        final_df = DataFrame({"account": ["501", "502", "503"], "end_balance": [0.1 + 0.2, 1234.56 - 0.01, -0.07 * 3]})
+        compact_trial_balance = CompactTrialBalance.from_df(final_df)
+
+        self.assertEqual(list(compact_trial_balance.get_amounts("end_balance")), [30, 123455, -21])
+        self.assertEqual(list(compact_trial_balance.to_df()["end_balance"]), [0.3, 1234.55, -0.21])
+        self.assertEqual(len(compact_trial_balance), 3)
+
+    def test_rejects_lossy_trial_balance(self):
+        with self.assertRaises(ValueError):
+            CompactTrialBalance.from_df(DataFrame({"account": ["501"], "end_balance": [0.001]}))
+        with self.assertRaises(ValueError):
+            CompactTrialBalance.from_df(DataFrame({"account": [501], "end_balance": [1.0]}))
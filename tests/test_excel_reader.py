@@ -0,0 +1,146 @@
+from os import path, utime
+from zipfile import ZipFile
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+from openpyxl import load_workbook
+from excel_reader import list_sheets, read_trial_balance_columns, write_trial_balance_xlsx, get_file_content, \
+    PROJECTED_SHEET, TRIAL_BALANCE_COLUMNS
+from trial_balance_generator import TrialBalanceGenerator
+
+'''
+Tests of reading of trial balance from csv and ods files. Values read from those are expected to be the same as values
+of rows generated into them.
+'''
+
+class TestExcelReader(TestCase):
+
+    def setUp(self):
+        self.trial_balance_dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.trial_balance_dir.cleanup()
+
+    def read(self, file_name, generator):
+        file_path = path.join(self.trial_balance_dir.name, file_name)
+        generator.write(file_path)
+        return read_trial_balance_columns(file_path, list_sheets(file_path)[0], "A", "D", "E", "F")
+
+    def get_generated(self, generator):
+        rows = generator.generate_rows()
+        return {column: [row[column_index] for row in rows]
+                for column, column_index in zip(TRIAL_BALANCE_COLUMNS, (0, 3, 4, 5))}
+
+    def test_csv_same_as_generated(self):
+        generator = TrialBalanceGenerator(200, seed=1, drop_leading_zeros=False)
+
+        self.assertEqual(self.read("trial_balance.csv", generator), self.get_generated(generator))
+
+    def test_csv_with_amounts_as_text(self):
+        columns = self.read("trial_balance.csv", TrialBalanceGenerator(200, seed=1, messy=True,
+                                                                        drop_leading_zeros=False))
+        columns_clean = self.get_generated(TrialBalanceGenerator(200, seed=1, drop_leading_zeros=False))
+
+        # Messy trial balance has three rows above header, amounts written as "-1 234,56" are read as numbers
+        self.assertEqual(columns["account"][:3], ["Obratová předvaha", "Vygenerováno se semínkem 1", None])
+        for column in columns:
+            self.assertEqual(columns[column][3:10], columns_clean[column][:7])
+
+    def test_csv_encodings_and_separators(self):
+        for encoding, separator in (("cp1250", ";"), ("utf-8", ";"), ("utf-8-sig", "\t"), ("cp1250", ",")):
+            file_path = path.join(self.trial_balance_dir.name, "trial_balance.csv")
+            with open(file_path, "w", encoding=encoding) as csv_file:
+                csv_file.write(separator.join(["Účet", "Název", "x", "MD", "D", "Zůstatek"]) + "\n")
+                csv_file.write(separator.join(["013100", "Software", "", "1 000", "-2", '"3,5"']) + "\n")
+
+            columns = read_trial_balance_columns(file_path, list_sheets(file_path)[0], "A", "D", "E", "F")
+
+            self.assertEqual(columns["account"], ["Účet", "013100"])
+            self.assertEqual(columns["end_balance"], ["Zůstatek", 3.5])
+            self.assertEqual(columns["debit_turnover"][1], 1000.0)
+
+    def test_ods_same_as_generated(self):
+        generator = TrialBalanceGenerator(200, seed=2)
+
+        self.assertEqual(self.read("trial_balance.ods", generator), self.get_generated(generator))
+
+    def test_projected_xlsx_same_as_csv_and_ods(self):
+        generator = TrialBalanceGenerator(200, seed=3, drop_leading_zeros=False)
+        projected_path = path.join(self.trial_balance_dir.name, "projected.xlsx")
+
+        for file_name in ("trial_balance.csv", "trial_balance.ods"):
+            file_path = path.join(self.trial_balance_dir.name, file_name)
+            generator.write(file_path)
+            write_trial_balance_xlsx(file_path, list_sheets(file_path)[0], "A", "D", "E", "F", projected_path)
+
+            self.assertEqual(list_sheets(projected_path), [PROJECTED_SHEET])
+            workbook = load_workbook(projected_path, read_only=True)
+            rows = list(workbook[PROJECTED_SHEET].iter_rows(values_only=True))
+            workbook.close()
+            self.assertEqual(dict(zip(TRIAL_BALANCE_COLUMNS, map(list, zip(*rows)))), self.read(file_name, generator))
+
+    def test_ods_repeated_rows(self):
+        file_path = path.join(self.trial_balance_dir.name, "trial_balance.ods")
+        cell = '<table:table-cell office:value-type="float" office:value="{0}"><text:p>{0}</text:p></table:table-cell>'
+        rows_xml = ('<table:table-row table:number-rows-repeated="3"><table:table-cell office:value-type="string">'
+                    '<text:p>501000</text:p></table:table-cell><table:table-cell table:number-columns-repeated="2"/>'
+                    f'{cell.format(10.5)}{cell.format(0)}{cell.format(-2)}</table:table-row>'
+                    '<table:table-row table:number-rows-repeated="2"><table:table-cell/></table:table-row>'
+                    f'<table:table-row><table:table-cell table:number-columns-repeated="3"/>{cell.format(1)}'
+                    '</table:table-row><table:table-row table:number-rows-repeated="1048000"><table:table-cell '
+                    'table:number-columns-repeated="1024"/></table:table-row>')
+        with ZipFile(file_path, "w") as ods_zip:
+            ods_zip.writestr("content.xml", '<?xml version="1.0" encoding="UTF-8"?><office:document-content '
+                             'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+                             'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+                             'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"><office:body>'
+                             '<office:spreadsheet><table:table table:name="List1">'
+                             f'{rows_xml}</table:table></office:spreadsheet></office:body></office:document-content>')
+
+        columns = read_trial_balance_columns(file_path, "List1", "A", "D", "E", "F")
+
+        self.assertEqual(columns["account"], ["501000"] * 3 + [None] * 3)
+        self.assertEqual(columns["debit_turnover"], [10.5] * 3 + [None, None, 1.0])
+        self.assertEqual(columns["end_balance"], [-2.0] * 3 + [None] * 3)
+
+    def test_file_listed_and_read_once(self):
+        file_path = path.join(self.trial_balance_dir.name, "trial_balance.ods")
+        generator = TrialBalanceGenerator(50, seed=4)
+        generator.write(file_path)
+        self.assertEqual(list_sheets(file_path), ["List1"])
+
+        def open_zip_in_memory(file):
+            self.assertNotIsInstance(file, str, "File opened again")
+            return ZipFile(file)
+
+        with patch("excel_reader.open", side_effect=AssertionError("File opened again"), create=True), \
+                patch("excel_reader.ZipFile", open_zip_in_memory):
+            self.assertEqual(read_trial_balance_columns(file_path, "List1", "A", "D", "E", "F"),
+                             self.get_generated(generator))
+
+        # Changed file is read again
+        generator = TrialBalanceGenerator(60, seed=5)
+        generator.write(file_path)
+        utime(file_path, (1, 1))
+        self.assertEqual(read_trial_balance_columns(file_path, "List1", "A", "D", "E", "F"),
+                         self.get_generated(generator))
+
+        # Large file is not kept in memory
+        with patch("excel_reader.MAX_CACHED_FILE_SIZE", 1024):
+            self.assertIsNone(get_file_content(file_path))
+            self.assertEqual(list_sheets(file_path), ["List1"])
+
+    def test_xls_sheets_listed(self):
+        from xlwt import Workbook  # Package xlwt is needed only for generating of xls files
+
+        file_path = path.join(self.trial_balance_dir.name, "trial_balance.xls")
+        workbook = Workbook()
+        for sheet in ("Obratová předvaha", "List2", "List3"):
+            workbook.add_sheet(sheet).write(0, 0, sheet)
+        workbook.save(file_path)
+
+        self.assertEqual(list_sheets(file_path), ["Obratová předvaha", "List2", "List3"])
+
+        # Rows of excel files are read only by TrialBalanceReader
+        with self.assertRaises(ValueError):
+            read_trial_balance_columns(file_path, "List2", "A", "B", "C", "D")
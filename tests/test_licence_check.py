@@ -0,0 +1,151 @@
+from os import path, stat, name
+from json import dumps, loads
+from time import sleep
+from threading import Thread
+from tempfile import TemporaryDirectory
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from unittest import TestCase
+from requests import Timeout
+from licence_check import LicenceClient, LicenceToken, load_token_key, is_licence_token_valid, LICENCE_VALID, \
+    USER_UNKNOWN, PASSWORD_INVALID, LICENCE_EXPIRED
+
+'''
+Tests of licence check against local stub of web and of token saved after successful check
+'''
+
+# Headers of response of stub by encrypted username
+STUB_USERS = {
+    "valid": {"user_exists": "True", "user_is_authenticated": "True", "licence_is_valid": "True"},
+    "expired": {"user_exists": "True", "user_is_authenticated": "True", "licence_is_valid": "False"},
+    "wrong_password": {"user_exists": "True", "user_is_authenticated": "False", "licence_is_valid": "False"},
+    "slow": {"user_exists": "True", "user_is_authenticated": "True", "licence_is_valid": "True"}}
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        username = parse_qs(urlparse(self.path).query).get("username_encrypted", [""])[0]
+        if username == "slow":
+            sleep(1)
+
+        self.send_response(200)
+        for header, value in STUB_USERS.get(username, {"user_exists": "False"}).items():
+            self.send_header(header, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class TestLicenceClient(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(("127.0.0.1", 0), StubHandler)
+        cls.server_thread = Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/user_zone/external_request/"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.client = LicenceClient(self.url, timeout=(1, 0.5))
+
+    def tearDown(self):
+        self.client.close()
+
+    def check(self, username):
+        return self.client.check({"username_encrypted": username, "product_name": "test"})
+
+    def test_results(self):
+        self.assertEqual(self.check("valid"), LICENCE_VALID)
+        self.assertEqual(self.check("expired"), LICENCE_EXPIRED)
+        self.assertEqual(self.check("wrong_password"), PASSWORD_INVALID)
+        self.assertEqual(self.check("nobody"), USER_UNKNOWN)
+
+    def test_timeout(self):
+        with self.assertRaises(Timeout):
+            self.check("slow")
+
+class TestLicenceToken(TestCase):
+
+    def setUp(self):
+        self.token_dir = TemporaryDirectory()
+        self.token_path = path.join(self.token_dir.name, "licence_token.json")
+        self.token = LicenceToken(self.token_path, b"key")
+
+    def tearDown(self):
+        self.token_dir.cleanup()
+
+    def test_valid_for_same_user_and_product(self):
+        self.assertFalse(self.token.is_valid("user@dcba.cz", "product"))
+
+        self.token.save("user@dcba.cz", "product")
+
+        self.assertTrue(self.token.is_valid("user@dcba.cz", "product"))
+        self.assertFalse(self.token.is_valid("other@dcba.cz", "product"))
+        self.assertFalse(self.token.is_valid("user@dcba.cz", "other product"))
+        self.assertFalse(LicenceToken(self.token_path, b"other key").is_valid("user@dcba.cz", "product"))
+
+    def test_expired(self):
+        LicenceToken(self.token_path, b"key", validity=-1).save("user@dcba.cz", "product")
+
+        self.assertFalse(self.token.is_valid("user@dcba.cz", "product"))
+
+    def test_changed(self):
+        self.token.save("user@dcba.cz", "product")
+
+        with open(self.token_path, encoding="utf-8") as token_file:
+            token = loads(token_file.read())
+        payload = loads(token["payload"])
+        payload["expires"] += 3600
+        token["payload"] = dumps(payload)
+        with open(self.token_path, "w", encoding="utf-8") as token_file:
+            token_file.write(dumps(token))
+
+        self.assertFalse(self.token.is_valid("user@dcba.cz", "product"))
+
+    def test_key_created_once(self):
+        key_path = path.join(self.token_dir.name, "keys", "licence_token.key")
+        key = load_token_key(key_path)
+
+        self.assertEqual(len(key), 32)
+        self.assertEqual(load_token_key(key_path), key)
+        if name == "posix":
+            self.assertEqual(stat(key_path).st_mode & 0o777, 0o600)
+
+        # Damaged key is replaced, so tokens signed by it are not valid anymore
+        LicenceToken(self.token_path, key).save("user@dcba.cz", "product")
+        with open(key_path, "wb") as key_file:
+            key_file.write(b"AAA=")
+        key_new = load_token_key(key_path)
+
+        self.assertNotEqual(key_new, key)
+        self.assertEqual(load_token_key(key_path), key_new)
+        self.assertFalse(LicenceToken(self.token_path, key_new).is_valid("user@dcba.cz", "product"))
+
+    def test_valid_for_run_without_user_interface(self):
+        key_path = path.join(self.token_dir.name, "licence_token.key")
+        username_stamp_path = path.join(self.token_dir.name, "username_stamp.txt")
+
+        def is_valid(product_name="product"):
+            return is_licence_token_valid(product_name, self.token_path, username_stamp_path, key_path)
+
+        # Nobody logged in yet
+        self.assertFalse(is_valid())
+
+        with open(username_stamp_path, "w") as username_stamp_file:
+            username_stamp_file.write("user@dcba.cz")
+        self.assertFalse(is_valid())
+
+        LicenceToken(self.token_path, load_token_key(key_path)).save("user@dcba.cz", "product")
+        self.assertTrue(is_valid())
+        self.assertFalse(is_valid("other product"))
+
+        # Other user logged in last
+        with open(username_stamp_path, "w") as username_stamp_file:
+            username_stamp_file.write("other@dcba.cz")
+        self.assertFalse(is_valid())
@@ -0,0 +1,73 @@
+from os import path
+from shutil import copyfile
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from PyPDF2 import PdfFileReader
+from PyPDF2.generic import NameObject, DictionaryObject, ArrayObject, DecodedStreamObject
+from report_writer import ReportWriter, ReportTemplate
+from report_optimizer import ReportOptimizer, get_object_key
+from test_report_writer import REPORT_TEMPLATE_PATH, REPORT_CALCULATED
+
+'''
+Tests of optimization of size of report output
+'''
+
+class TestReportOptimizer(TestCase):
+
+    def setUp(self):
+        self.output_dir = TemporaryDirectory()
+        self.report_output_path = path.join(self.output_dir.name, "report.pdf")
+        ReportWriter(REPORT_CALCULATED, ReportTemplate(REPORT_TEMPLATE_PATH),
+                     self.report_output_path).write_report_by_watermark()
+
+    def tearDown(self):
+        self.output_dir.cleanup()
+
+    def read_pages(self, report_output_path):
+        '''
+        Gets text, filters of content streams and numbers of appearance streams of form fields of each page
+        '''
+        pages = []
+        with open(report_output_path, "rb") as report_output_file:
+            for page in PdfFileReader(report_output_file).pages:
+                contents = page["/Contents"]
+                contents = contents if isinstance(contents, ArrayObject) else [contents]
+                pages.append((page.extract_text(), {content.get_object().get("/Filter") for content in contents},
+                              {annotation.get_object()["/AP"].raw_get("/N").idnum
+                               for annotation in page.get("/Annots", [])}))
+
+        return pages
+
+    def test_identical_objects_same_key(self):
+        font = DictionaryObject({NameObject("/Type"): NameObject("/Font"),
+                                 NameObject("/BaseFont"): NameObject("/Times-Roman")})
+        stream_1, stream_2 = DecodedStreamObject(), DecodedStreamObject()
+        stream_1.set_data(b"q Q")
+        stream_2.set_data(b"q Q")
+
+        self.assertEqual(get_object_key(font), get_object_key(DictionaryObject(font)))
+        self.assertEqual(get_object_key(stream_1), get_object_key(stream_2))
+        stream_2.set_data(b"Q")
+        self.assertNotEqual(get_object_key(stream_1), get_object_key(stream_2))
+
+    def test_output_smaller_with_same_pages(self):
+        report_original_path = path.join(self.output_dir.name, "report_original.pdf")
+        copyfile(self.report_output_path, report_original_path)
+
+        size_before, size_after = ReportOptimizer().optimize(self.report_output_path)
+        pages_original = self.read_pages(report_original_path)
+        pages_optimized = self.read_pages(self.report_output_path)
+
+        self.assertEqual((size_before, size_after), (path.getsize(report_original_path),
+                                                     path.getsize(self.report_output_path)))
+        self.assertLess(size_after, size_before)
+        self.assertEqual([text for text, _, _ in pages_optimized], [text for text, _, _ in pages_original])
+
+        # Merged pages had uncompressed contents, identical appearance streams of template are shared
+        self.assertIn(None, set.union(*(content_filters for _, content_filters, _ in pages_original)))
+        self.assertEqual(set.union(*(content_filters for _, content_filters, _ in pages_optimized)), {"/FlateDecode"})
+        self.assertLess(len({idnum for _, _, idnums in pages_optimized for idnum in idnums}),
+                        len({idnum for _, _, idnums in pages_original for idnum in idnums}))
+
+        # Optimized output does not change any more
+        self.assertEqual(ReportOptimizer().optimize(self.report_output_path), (size_after, size_after))
@@ -0,0 +1,69 @@
+from time import sleep
+from logging import getLogger
+from threading import Event
+from unittest import TestCase
+from report_pipeline import PipelineItem, PipelineStage
+
+'''
+Tests of stages of pipeline with bounded queues
+'''
+
+class BatchJob:
+    trial_balance_path = "tb.xlsx"
+
+class TestPipelineStage(TestCase):
+
+    def create_items(self, no_items):
+        return [PipelineItem(job_no, BatchJob(), None, {"status": "ok", "error": None, "timings": {}})
+                for job_no in range(no_items)]
+
+    def test_backpressure(self):
+        released = Event()
+        done = []
+        slow_stage = PipelineStage("slow", lambda item: released.wait(), 1, 2, getLogger())
+        fast_stage = PipelineStage("fast", lambda item: None, 1, 2, getLogger())
+        done_stage = PipelineStage("done", done.append, 1, 10, getLogger())
+
+        done_stage.start()
+        slow_stage.start(done_stage)
+        fast_stage.start(slow_stage)
+        for item in self.create_items(10):
+            fast_stage.put(item)
+            if item.job_no == 5:
+                # Slow stage holds one item and its queue is full, fast stage waits with one item
+                sleep(0.2)
+                self.assertEqual(slow_stage.get_stats()["queue_depth"], 2)
+                self.assertEqual(fast_stage.get_stats()["processed"], 4)
+                released.set()
+
+        fast_stage.stop()
+        slow_stage.stop()
+        done_stage.stop()
+
+        self.assertEqual(sorted(item.job_no for item in done), list(range(10)))
+        self.assertEqual(slow_stage.get_stats()["max_queue_depth"], 2)
+        self.assertEqual(slow_stage.get_stats()["processed"], 10)
+
+    def test_failed_item_skipped(self):
+        done = []
+
+        def fail(item):
+            if item.job_no == 1:
+                raise ValueError("Sheet not found")
+
+        failing_stage = PipelineStage("read", fail, 2, 2, getLogger())
+        next_stage = PipelineStage("calculate", lambda item: None, 1, 2, getLogger())
+        done_stage = PipelineStage("done", done.append, 1, 2, getLogger(), skip_failed=False)
+
+        done_stage.start()
+        next_stage.start(done_stage)
+        failing_stage.start(next_stage)
+        for item in self.create_items(3):
+            failing_stage.put(item)
+        for stage in (failing_stage, next_stage, done_stage):
+            stage.stop()
+
+        self.assertEqual({item.job_no: item.result["status"] for item in done}, {0: "ok", 1: "error", 2: "ok"})
+        self.assertEqual(failing_stage.get_stats()["failed"], 1)
+        self.assertEqual(next_stage.get_stats()["processed"], 2)
+        self.assertEqual(done_stage.get_stats()["processed"], 3)
@@ -0,0 +1,210 @@
+from os import path
+from json import dumps, loads
+from time import sleep, perf_counter
+from logging import getLogger
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+from unittest.mock import patch
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor
+import batch_runner
+from report_service import ReportService, ReportRequestHandler, ServiceError, HOST
+
+'''
+Tests of local report service. Jobs are processed by stub runner of worker process instead of runner with loaded
+reports, job with sheet "slow" never finishes in time.
+'''
+
+JOB = {"trial_balance_path": "trial_balance.xlsx", "sheet": "List1", "account_col": "A", "debit_turnover_col": "D",
+       "credit_turnover_col": "E", "end_balance_col": "F"}
+
+class StubWorkerRunner:
+
+    def process_job(self, job, include_figures=False):
+        if job.sheet == "slow":
+            sleep(60)
+        return {"trial_balance_path": job.trial_balance_path, "report_output_path": job.report_output_path,
+                "status": "ok", "error": None, "timings": {"total": 0.0}}
+
+def _init_stub_worker():
+    batch_runner._worker_runner = StubWorkerRunner()
+
+class StubRunner:
+
+    def __init__(self):
+        self.logger = getLogger(__name__)
+        self.report_info = {"product_name": "test"}
+        self.report_code_snake_case = "p_test"
+
+    def create_executor(self, workers):
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_stub_worker)
+
+class TestReportService(TestCase):
+
+    def setUp(self):
+        self.output_dir = TemporaryDirectory()
+        self.service = ReportService(StubRunner(), workers=1, max_jobs=1, timeout=1.0, output_dir=self.output_dir.name,
+                                     check_licence=False)
+        self.service.start()
+
+    def tearDown(self):
+        self.service.restart(self.service.executor, terminate=True)
+        self.service.stop()
+        self.output_dir.cleanup()
+
+    def wait_for_slots(self):
+        time_start = perf_counter()
+        while self.service.get_health()["running"] and perf_counter() - time_start < 10:
+            sleep(0.05)
+
+    def test_job_processed(self):
+        result = self.service.submit(JOB)
+
+        self.assertEqual(result["status"], "ok")
+        self.assertEqual(self.service.get_metrics()["ok"], 1)
+        self.assertEqual(self.service.get_health()["running"], 0)
+
+    def test_timed_out_job_stopped(self):
+        executor = self.service.executor
+        with self.assertRaises(ServiceError) as context:
+            self.service.submit({**JOB, "sheet": "slow"})
+        self.assertEqual(context.exception.http_status, 504)
+
+        # Worker of timed out job is stopped, so its slot is free for next job
+        self.assertIsNot(self.service.executor, executor)
+        self.wait_for_slots()
+        self.assertEqual(self.service.submit(JOB)["status"], "ok")
+        self.assertEqual(self.service.get_metrics()["timed_out"], 1)
+
+    def test_jobs_over_limit_rejected(self):
+        thread = Thread(target=self.assertRaises, args=(ServiceError, self.service.submit, {**JOB, "sheet": "slow"}))
+        thread.start()
+        while not self.service.get_health()["running"]:
+            sleep(0.01)
+
+        with self.assertRaises(ServiceError) as context:
+            self.service.submit(JOB)
+        self.assertEqual(context.exception.http_status, 429)
+        thread.join()
+
+    def test_other_job_stopped_with_timed_out_job(self):
+        service = ReportService(StubRunner(), workers=1, max_jobs=2, timeout=1.0, check_licence=False)
+        service.start()
+        try:
+            thread = Thread(target=self.assertRaises, args=(ServiceError, service.submit, {**JOB, "sheet": "slow"}))
+            thread.start()
+            while not service.get_health()["running"]:
+                sleep(0.01)
+            sleep(0.5)  # Job is sent later, so it has half of its time left when slow job times out
+
+            # Job waits for worker of slow job, which is terminated when slow job is not finished in time
+            with self.assertRaises(ServiceError) as context:
+                service.submit(JOB)
+            self.assertEqual(context.exception.http_status, 503)
+            thread.join()
+
+            metrics = service.get_metrics()
+            self.assertEqual((metrics["timed_out"], metrics["stopped"], metrics["failed"]), (1, 1, 0))
+        finally:
+            service.restart(service.executor, terminate=True)
+            service.stop()
+
+    def test_default_report_output_path_unique_in_output_dir(self):
+        report_output_paths = [self.service.submit(JOB)["report_output_path"] for _ in range(2)]
+
+        self.assertNotEqual(report_output_paths[0], report_output_paths[1])
+        for report_output_path in report_output_paths:
+            self.assertEqual(path.dirname(report_output_path), path.realpath(self.output_dir.name))
+            self.assertTrue(path.basename(report_output_path).startswith("p_test_trial_balance_"))
+
+    def test_job_rejected_without_licence(self):
+        self.service.check_licence = True
+        with patch("report_service.is_licence_token_valid", return_value=False) as is_licence_token_valid:
+            with self.assertRaises(ServiceError) as context:
+                self.service.submit(JOB)
+        self.assertEqual(context.exception.http_status, 403)
+        is_licence_token_valid.assert_called_once_with("test")
+
+        with patch("report_service.is_licence_token_valid", return_value=True):
+            self.assertEqual(self.service.submit(JOB)["status"], "ok")
+
+    def test_report_output_path_in_output_dir(self):
+        result = self.service.submit({**JOB, "report_output_path": "report.pdf"})
+        self.assertEqual(result["report_output_path"], path.join(path.realpath(self.output_dir.name), "report.pdf"))
+
+        for report_output_path in ("../report.pdf", path.join(path.dirname(self.output_dir.name), "report.pdf"),
+                                   "report.json", 5):
+            with self.assertRaises(ServiceError, msg=report_output_path) as context:
+                self.service.submit({**JOB, "report_output_path": report_output_path})
+            self.assertIn(context.exception.http_status, (400, 403))
+
+        # Service without output folder does not accept any report output path
+        self.service.output_dir = None
+        with self.assertRaises(ServiceError):
+            self.service.submit({**JOB, "report_output_path": path.join(self.output_dir.name, "report.pdf")})
+        self.assertEqual(self.service.get_metrics()["accepted"], 1)
+
+class TestReportRequestHandler(TestCase):
+
+    def setUp(self):
+        self.service = ReportService(StubRunner(), workers=1, secret="secret", check_licence=False)
+        self.service.start()
+
+        self.server = ThreadingHTTPServer((HOST, 0), ReportRequestHandler)
+        self.server.service = self.service
+        self.server_thread = Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+        self.service.stop()
+
+    def request(self, method, url, body=None, **headers):
+        headers = {"Content-Type": "application/json", "X-Service-Secret": "secret", **headers}
+        connection = HTTPConnection(HOST, self.server.server_address[1], timeout=10)
+        try:
+            connection.request(method, url, body and dumps(body), {name.replace("_", "-"): value
+                                                                   for name, value in headers.items()})
+            response = connection.getresponse()
+            return response.status, loads(response.read())
+        finally:
+            connection.close()
+
+    def test_job_posted(self):
+        status, result = self.request("POST", "/jobs", JOB)
+        self.assertEqual(status, 200)
+        self.assertEqual(result["trial_balance_path"], "trial_balance.xlsx")
+
+        status, health = self.request("GET", "/health")
+        self.assertEqual((status, health["status"]), (200, "ok"))
+
+    def test_request_without_access_rejected(self):
+        self.assertEqual(self.request("POST", "/jobs", JOB, Host="localhost:8765")[0], 200)
+        self.assertEqual(self.request("POST", "/jobs", JOB, Host="attacker.example:8765")[0], 403)
+        self.assertEqual(self.request("GET", "/metrics", Host="attacker.example")[0], 403)
+        self.assertEqual(self.request("POST", "/jobs", JOB, X_Service_Secret="wrong")[0], 403)
+        self.assertEqual(self.request("POST", "/jobs", JOB, Content_Type="text/plain")[0], 415)
+        self.assertEqual(self.service.get_metrics()["accepted"], 1)
+
+    def test_invalid_content_length(self):
+        for content_length, http_status in ((None, 411), ("abc", 400), ("-1", 400), (str(1024 ** 3), 413)):
+            connection = HTTPConnection(HOST, self.server.server_address[1], timeout=10)
+            try:
+                connection.putrequest("POST", "/jobs")
+                connection.putheader("Content-Type", "application/json")
+                connection.putheader("X-Service-Secret", "secret")
+                if content_length is not None:
+                    connection.putheader("Content-Length", content_length)
+                connection.endheaders()
+                self.assertEqual(connection.getresponse().status, http_status, msg=content_length)
+            finally:
+                connection.close()
+
+    def test_invalid_job(self):
+        status, result = self.request("POST", "/jobs", {"sheet": "List1"})
+        self.assertEqual(status, 400)
+        self.assertIn("trial_balance_path", result["error"])
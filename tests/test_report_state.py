@@ -0,0 +1,73 @@
+from os import path
+from copy import deepcopy
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from PyPDF2 import PdfFileReader
+from report_writer import ReportWriter, ReportTemplate, ReportLayout
+from report_state import ReportState
+from test_report_writer import REPORT_TEMPLATE_PATH, REPORT_CALCULATED
+
+'''
+Tests of state of last run used by incremental writing of report
+'''
+
+class TestReportState(TestCase):
+
+    def setUp(self):
+        self.output_dir = TemporaryDirectory()
+        self.report_template = ReportTemplate(REPORT_TEMPLATE_PATH)
+        self.report_output_path = path.join(self.output_dir.name, "report.pdf")
+
+        # Report calculated of second run, figure on page 3 changed
+        self.report_calculated_changed = deepcopy(REPORT_CALCULATED)
+        self.report_calculated_changed["A"]["02"]["1"]["figure"] = 42
+
+    def tearDown(self):
+        self.output_dir.cleanup()
+
+    def get_state(self, report_calculated):
+        figures = {"A": {"01": {"1": 1234567, "2": -89}, "02": {"1": 0}}}
+        return ReportState("trial balance", self.report_template.report_template_key, "output", {}, figures,
+                           ReportState.get_pages(ReportLayout(report_calculated), report_calculated))
+
+    def read_pages_text(self, report_output_path):
+        with open(report_output_path, "rb") as report_output_file:
+            return [page.extract_text() for page in PdfFileReader(report_output_file).pages]
+
+    def test_saved_and_loaded(self):
+        state_path = ReportState.get_state_path(self.report_output_path)
+        self.assertIsNone(ReportState.load(state_path))
+
+        self.get_state(REPORT_CALCULATED).save(state_path)
+        report_state = ReportState.load(state_path)
+
+        self.assertEqual(report_state.figures["A"]["01"]["2"], -89)
+        self.assertEqual(report_state.get_changed_pages(ReportLayout(REPORT_CALCULATED), REPORT_CALCULATED,
+                                                        self.report_template.no_pages_template), set())
+
+    def test_changed_pages(self):
+        report_state = self.get_state(REPORT_CALCULATED)
+        no_pages_template = self.report_template.no_pages_template
+
+        self.assertEqual(report_state.get_changed_pages(ReportLayout(self.report_calculated_changed),
+                                                        self.report_calculated_changed, no_pages_template), {2})
+
+        report_calculated_moved = deepcopy(REPORT_CALCULATED)
+        report_calculated_moved["A"]["01"]["2"]["page"] = 2
+        self.assertEqual(report_state.get_changed_pages(ReportLayout(report_calculated_moved),
+                                                        report_calculated_moved, no_pages_template), {0, 1})
+
+    def test_incremental_output_same_as_full_output(self):
+        ReportWriter(REPORT_CALCULATED, self.report_template, self.report_output_path).write_report_by_watermark()
+        with open(self.report_output_path, "rb") as report_output_file:
+            previous_output_data = report_output_file.read()
+
+        writer = ReportWriter(self.report_calculated_changed, self.report_template, self.report_output_path)
+        writer.write_report_incrementally(previous_output_data, {2})
+
+        report_full_path = path.join(self.output_dir.name, "report_full.pdf")
+        ReportWriter(self.report_calculated_changed, self.report_template, report_full_path).write_report_by_watermark()
+
+        self.assertEqual((writer.pages_merged, writer.pages_reused), (1, self.report_template.no_pages_template - 1))
+        self.assertEqual(self.read_pages_text(self.report_output_path), self.read_pages_text(report_full_path))
+        self.assertIn("42", self.read_pages_text(self.report_output_path)[2])
@@ -0,0 +1,166 @@
+from os import path
+from copy import deepcopy
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from PyPDF2 import PdfFileReader
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from report_writer import ReportWriter, ReportTemplate, ReportLayout, TIMES_ROMAN_WIDTHS, get_text_width, \
+    escape_pdf_string
+from helper_form_template import create_form_template
+
+'''
+Tests of writing calculated report into report template.
+Based on:
+    - Template of 2023 quarterly report "P 6-04 (a)"
+    - Report calculated made up for testing, it contains figures only on some pages of template
+'''
+
+REPORT_TEMPLATE_PATH = path.join(path.dirname(__file__), "../reports/2023/quarter/P_6-04_a.pdf")
+
+REPORT_CALCULATED = {
+    "Info": {"01": {"1": {"method": "info", "report_code_snake_case": "P_6_04_a"}}},
+    "A": {"01": {"1": {"method": "sum", "page": 1, "x_position": 400, "y_position": 500, "figure": 1234567},
+                 "2": {"method": "sum", "page": 1, "x_position": 480, "y_position": 500, "figure": -89}},
+          "02": {"1": {"method": "sum", "page": 3, "x_position": 400, "y_position": 300, "figure": 0}}}}
+
+class TestReportLayout(TestCase):
+
+    def test_fields_indexed_by_page(self):
+        report_layout = ReportLayout(REPORT_CALCULATED)
+
+        self.assertEqual(report_layout.get_fields(0), [(400, 500, ("A", "01", "1")), (480, 500, ("A", "01", "2"))])
+        self.assertEqual(report_layout.get_fields(1), [])
+        self.assertEqual(report_layout.get_fields(2), [(400, 300, ("A", "02", "1"))])
+        self.assertFalse(report_layout.by_form_fields)
+
+    def test_form_fields_selected_by_config(self):
+        report_config = {"A": {"01": {"1": {"method": "sum", "field_name": "A_01_1"},
+                                      "2": {"method": "sum", "field_name": "A_01_2"}}}}
+        report_layout = ReportLayout(report_config)
+
+        self.assertTrue(report_layout.by_form_fields)
+        self.assertEqual(report_layout.form_fields, {"A_01_1": ("A", "01", "1"), "A_01_2": ("A", "01", "2")})
+        self.assertEqual(report_layout.get_fields(0), [])
+
+        # Config with form field missing for some figure is written by watermark
+        del report_config["A"]["01"]["2"]["field_name"]
+        report_config["A"]["01"]["2"].update({"page": 1, "x_position": 480, "y_position": 500})
+        self.assertFalse(ReportLayout(report_config).by_form_fields)
+
+class TestReportWriter(TestCase):
+
+    def setUp(self):
+        self.output_dir = TemporaryDirectory()
+        self.report_template = ReportTemplate(REPORT_TEMPLATE_PATH)
+
+    def tearDown(self):
+        self.output_dir.cleanup()
+
+    def write_report(self, file_name, write_method="write_report_by_watermark", report_calculated=REPORT_CALCULATED):
+        report_output_path = path.join(self.output_dir.name, file_name)
+        writer = ReportWriter(report_calculated, self.report_template, report_output_path)
+        getattr(writer, write_method)()
+
+        with open(report_output_path, "rb") as report_output_file:
+            report_output = PdfFileReader(report_output_file)
+            return [page.extract_text() for page in report_output.pages]
+
+    def test_figures_written_to_their_pages(self):
+        pages_text = self.write_report("report.pdf")
+
+        self.assertEqual(len(pages_text), self.report_template.no_pages_template)
+        self.assertIn("1 234 567", pages_text[0])
+        self.assertIn("-89", pages_text[0])
+        self.assertNotIn("1 234 567", pages_text[1])
+
+    def test_template_reused_for_more_reports(self):
+        self.assertEqual(self.write_report("report_1.pdf"), self.write_report("report_2.pdf"))
+
+    def test_single_watermark_same_as_watermark(self):
+        self.assertEqual(self.write_report("report_1.pdf"),
+                         self.write_report("report_2.pdf", "write_report_by_single_watermark"))
+
+    def test_content_stream_same_as_watermark(self):
+        self.assertEqual(self.write_report("report_1.pdf"),
+                         self.write_report("report_2.pdf", "write_report_by_content_stream"))
+
+        # Template page keeps its own resources and contents
+        page = self.report_template.get_page(0)
+        self.assertNotIn("/FStatS", page["/Resources"]["/Font"])
+
+    def test_content_stream_with_figures_not_only_digits(self):
+        report_calculated = deepcopy(REPORT_CALCULATED)
+        report_calculated["A"]["01"]["1"]["figure"] = float("nan")
+        report_calculated["A"]["01"]["2"]["figure"] = 1e16
+        report_calculated["A"]["02"]["1"]["figure"] = float("-inf")
+
+        pages_text = self.write_report("report_1.pdf", report_calculated=report_calculated)
+        self.assertEqual(pages_text, self.write_report("report_2.pdf", "write_report_by_content_stream",
+                                                       report_calculated))
+        self.assertIn("1e+16", pages_text[0])
+
+    def test_times_roman_widths(self):
+        for char, width in TIMES_ROMAN_WIDTHS.items():
+            self.assertEqual(width, stringWidth(char, "Times-Roman", 1000))
+
+        self.assertAlmostEqual(get_text_width("-1 234.5"), stringWidth("-1 234.5", "Times-Roman", 14))
+        self.assertAlmostEqual(get_text_width("1e+16"), stringWidth("1e+16", "Times-Roman", 14))
+
+    def test_pdf_string_escaped(self):
+        self.assertEqual(escape_pdf_string("1 234"), b"(1 234)")
+        self.assertEqual(escape_pdf_string("(a) \\ b"), b"(\\(a\\) \\\\ b)")
+
+class TestReportWriterFormFields(TestCase):
+
+    def setUp(self):
+        self.output_dir = TemporaryDirectory()
+        self.form_template_path = path.join(self.output_dir.name, "form_template.pdf")
+        self.report_calculated = create_form_template(REPORT_CALCULATED, REPORT_TEMPLATE_PATH,
+                                                      self.form_template_path)
+        self.report_template = ReportTemplate(self.form_template_path)
+
+    def tearDown(self):
+        self.output_dir.cleanup()
+
+    def get_field_values(self, pdf_path):
+        with open(pdf_path, "rb") as pdf_file:
+            fields = PdfFileReader(pdf_file).get_fields()
+            return {field_name: fields[field_name].get("/V") for field_name in ("A_01_1", "A_01_2", "A_02_1")}
+
+    def get_appearances(self, pdf_path):
+        with open(pdf_path, "rb") as pdf_file:
+            return {annotation.get_object()["/T"]: annotation.get_object()["/AP"]["/N"].get_object().get_data()
+                    for page in PdfFileReader(pdf_file).pages for annotation in page.get("/Annots", [])}
+
+    def write_report(self, file_name, report_calculated):
+        report_output_path = path.join(self.output_dir.name, file_name)
+        writer = ReportWriter(report_calculated, self.report_template, report_output_path)
+        writer.write_report()
+        self.assertEqual(writer.pages_merged, 0)
+        return report_output_path
+
+    def test_figures_filled_to_form_fields(self):
+        report_output_path = self.write_report("report_1.pdf", self.report_calculated)
+        self.assertEqual(self.get_field_values(report_output_path),
+                         {"A_01_1": "1 234 567", "A_01_2": "-89", "A_02_1": "0"})
+
+        # Fields are shown by their appearance also without regenerating by viewer
+        appearances = self.get_appearances(report_output_path)
+        self.assertIn(b"(1 234 567) Tj", appearances["A_01_1"])
+        self.assertIn(b"(-89) Tj", appearances["A_01_2"])
+
+        # Template shared by reports keeps its empty fields, so next report has only its own figures
+        report_calculated = deepcopy(self.report_calculated)
+        report_calculated["A"]["01"]["1"]["figure"] = float("nan")
+        report_output_path = self.write_report("report_2.pdf", report_calculated)
+        self.assertEqual(self.get_field_values(report_output_path),
+                         {"A_01_1": "nan", "A_01_2": "-89", "A_02_1": "0"})
+        self.assertIn(b"(nan) Tj", self.get_appearances(report_output_path)["A_01_1"])
+
+    def test_missing_form_field(self):
+        self.report_calculated["A"]["02"]["1"]["field_name"] = "A_99_1"
+        writer = ReportWriter(self.report_calculated, self.report_template,
+                              path.join(self.output_dir.name, "report.pdf"))
+
+        with self.assertRaises(KeyError):
+            writer.write_report()
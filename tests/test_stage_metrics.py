@@ -0,0 +1,73 @@
+from os import path, listdir, getpid
+from json import loads
+from pstats import Stats
+from pickle import dumps, loads as pickle_loads
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from stage_metrics import StageMetrics
+
+'''
+Tests of metrics of stages written as json lines and of profiling of slow job
+'''
+
+class TestStageMetrics(TestCase):
+
+    def setUp(self):
+        self.metrics_dir = TemporaryDirectory()
+        self.metrics_path = path.join(self.metrics_dir.name, "metrics.jsonl")
+
+    def tearDown(self):
+        self.metrics_dir.cleanup()
+
+    def read_records(self):
+        with open(self.metrics_path, encoding="utf-8") as metrics_file:
+            return [loads(line) for line in metrics_file]
+
+    def test_records_written_as_json_lines(self):
+        stage_metrics = StageMetrics(self.metrics_path, trace_memory=True)
+
+        with stage_metrics.measure("read", trial_balance_path="tb.xlsx") as record:
+            data = list(range(100_000))
+            record["rows_read"] = len(data)
+
+        with self.assertRaises(ValueError):
+            with stage_metrics.measure("calculate", trial_balance_path="tb.xlsx"):
+                raise ValueError("failed")
+
+        records = self.read_records()
+        self.assertEqual(records, stage_metrics.records)
+        self.assertEqual([(record["stage"], record["status"]) for record in records],
+                         [("read", "ok"), ("calculate", "error")])
+        self.assertEqual(records[0]["rows_read"], 100_000)
+        self.assertEqual(records[0]["trial_balance_path"], "tb.xlsx")
+        self.assertGreater(records[0]["wall_time"], 0)
+        self.assertGreaterEqual(records[0]["cpu_time"], 0)
+        self.assertGreater(records[0]["peak_traced"], 100_000 * 8)
+        self.assertIn("process_peak_rss", records[0])
+
+    def test_profile_dumped_once_for_slow_run(self):
+        profile_path = path.join(self.metrics_dir.name, "profile.prof")
+        stage_metrics = StageMetrics(profile_path=profile_path, profile_threshold=3600)
+
+        with stage_metrics.profile():
+            sum(range(1000))
+        self.assertEqual(listdir(self.metrics_dir.name), [])
+
+        stage_metrics.profile_threshold = 0
+        with stage_metrics.profile():
+            sorted(range(1000), reverse=True)
+        self.assertTrue(stage_metrics.profile_dumped)
+        self.assertEqual(listdir(self.metrics_dir.name), [f"profile.{getpid()}.prof"])
+        self.assertGreater(Stats(stage_metrics.get_profile_path()).total_calls, 0)
+
+    def test_picklable(self):
+        stage_metrics = StageMetrics(self.metrics_path)
+        with stage_metrics.measure("read"):
+            pass
+
+        stage_metrics_copy = pickle_loads(dumps(stage_metrics))
+
+        self.assertEqual(stage_metrics_copy.records, [])
+        with stage_metrics_copy.measure("write"):
+            pass
+        self.assertEqual([record["stage"] for record in self.read_records()], ["read", "write"])
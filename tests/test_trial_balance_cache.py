@@ -0,0 +1,100 @@
+from os import path, listdir, remove, utime
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
+from trial_balance_cache import TrialBalanceCache
+
+'''
+Tests of cache of trial balances, reading of file is replaced by stub counting the reads
+'''
+
+FINAL_DF = DataFrame({"account": ["011000", "211000", "311100"], "debit_turnover": [100.5, 0.0, 20.0],
+                      "credit_turnover": [0.0, 30.25, 0.0], "end_balance": [1000.0, -30.25, 20.0]})
+
+class StubTrialBalanceCache(TrialBalanceCache):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.no_reads = 0
+
+    def read(self, file_path, sheet, account_col, debit_turnover_col, credit_turnover_col, end_balance_col):
+        self.no_reads += 1
+        return FINAL_DF.copy()
+
+class TestTrialBalanceCache(TestCase):
+
+    def setUp(self):
+        self.cache_dir = TemporaryDirectory()
+        self.trial_balance_path = path.join(self.cache_dir.name, "trial_balance.xlsx")
+        with open(self.trial_balance_path, "wb") as trial_balance_file:
+            trial_balance_file.write(b"trial balance")
+        self.cache = StubTrialBalanceCache(path.join(self.cache_dir.name, "cache"))
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def get_final_df(self, sheet="Sheet1"):
+        return self.cache.get_final_df(self.trial_balance_path, sheet, "A", "B", "C", "D")
+
+    def get_cache_path(self):
+        cached_files = listdir(self.cache.cache_dir)
+        self.assertEqual(len(cached_files), 1)
+        return path.join(self.cache.cache_dir, cached_files[0])
+
+    def test_read_once(self):
+        assert_frame_equal(self.get_final_df(), FINAL_DF)
+        assert_frame_equal(self.get_final_df(), FINAL_DF)
+        self.assertEqual(self.cache.no_reads, 1)
+
+        # Other sheet has other key
+        self.get_final_df("Sheet2")
+        self.assertEqual(self.cache.no_reads, 2)
+
+    def test_corrupt_entry_read_again(self):
+        self.get_final_df()
+        cache_path = self.get_cache_path()
+        with open(cache_path, "r+b") as cache_file:
+            cache_file.truncate(20)
+
+        assert_frame_equal(self.get_final_df(), FINAL_DF)
+        self.assertEqual(self.cache.no_reads, 2)
+
+        # Entry is overwritten by trial balance read again
+        assert_frame_equal(self.get_final_df(), FINAL_DF)
+        self.assertEqual(self.cache.no_reads, 2)
+
+    def test_entry_removed_after_exists(self):
+        self.get_final_df()
+        cache_path = self.get_cache_path()
+        load = self.cache.load
+
+        def load_removed(cache_path):
+            # Entry evicted by another process between check of its existence and loading
+            remove(cache_path)
+            return load(cache_path)
+
+        self.cache.load = load_removed
+        assert_frame_equal(self.get_final_df(), FINAL_DF)
+        self.assertEqual(self.cache.no_reads, 2)
+        self.assertTrue(path.exists(cache_path))
+
+    def test_least_recently_used_evicted(self):
+        self.get_final_df("Sheet1")
+        entry_size = path.getsize(self.get_cache_path())
+        self.cache.max_size = 2 * entry_size
+
+        self.get_final_df("Sheet2")
+        for cache_path, time in zip(sorted(listdir(self.cache.cache_dir)), (1, 2)):
+            utime(path.join(self.cache.cache_dir, cache_path), (time, time))
+        self.get_final_df("Sheet3")
+
+        self.assertEqual(len(listdir(self.cache.cache_dir)), 2)
+        self.assertEqual(self.cache.no_reads, 3)
+
+    def test_disabled(self):
+        cache = StubTrialBalanceCache(path.join(self.cache_dir.name, "disabled"), enabled=False)
+        cache.get_final_df(self.trial_balance_path, "Sheet1", "A", "B", "C", "D")
+        cache.get_final_df(self.trial_balance_path, "Sheet1", "A", "B", "C", "D")
+        self.assertEqual(cache.no_reads, 2)
+        self.assertFalse(path.exists(cache.cache_dir))
@@ -0,0 +1,266 @@
+from sys import argv
+from os import path
+from csv import writer as csv_writer
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+from xml.sax.saxutils import escape, quoteattr
+from random import Random
+from argparse import ArgumentParser
+
+'''
+Generator of synthetic trial balances for load and scaling tests. Generated trial balance has columns account, name,
+opening balance, debit turnover, credit turnover and end balance, so it is read with columns "A", "D", "E", "F".
+'''
+
+# Synthetic accounts of Czech chart of accounts with their names
+SYNTHETIC_ACCOUNTS = [
+    ("013", "Software"), ("022", "Hmotné movité věci a jejich soubory"), ("042", "Pořizování dlouhodobého majetku"),
+    ("073", "Oprávky k softwaru"), ("082", "Oprávky k hmotným movitým věcem"), ("112", "Materiál na skladě"),
+    ("132", "Zboží na skladě"), ("211", "Pokladna"), ("221", "Bankovní účty"), ("311", "Odběratelé"),
+    ("314", "Poskytnuté zálohy"), ("321", "Dodavatelé"), ("324", "Přijaté zálohy"), ("331", "Zaměstnanci"),
+    ("336", "Zúčtování s institucemi sociálního a zdravotního pojištění"), ("341", "Daň z příjmů"),
+    ("342", "Ostatní přímé daně"), ("343", "Daň z přidané hodnoty"), ("381", "Náklady příštích období"),
+    ("383", "Výdaje příštích období"), ("395", "Vnitřní zúčtování"), ("411", "Základní kapitál"),
+    ("428", "Nerozdělený zisk minulých let"), ("431", "Výsledek hospodaření ve schvalovacím řízení"),
+    ("461", "Dlouhodobé bankovní úvěry"), ("501", "Spotřeba materiálu"), ("502", "Spotřeba energie"),
+    ("504", "Prodané zboží"), ("511", "Opravy a udržování"), ("512", "Cestovné"), ("513", "Náklady na reprezentaci"),
+    ("518", "Ostatní služby"), ("521", "Mzdové náklady"), ("524", "Zákonné sociální a zdravotní pojištění"),
+    ("527", "Zákonné sociální náklady"), ("538", "Ostatní daně a poplatky"), ("548", "Ostatní provozní náklady"),
+    ("551", "Odpisy dlouhodobého majetku"), ("562", "Úroky"), ("563", "Kurzové ztráty"),
+    ("568", "Ostatní finanční náklady"), ("591", "Daň z příjmů splatná"), ("601", "Tržby za vlastní výrobky"),
+    ("602", "Tržby z prodeje služeb"), ("604", "Tržby za zboží"), ("641", "Tržby z prodeje dlouhodobého majetku"),
+    ("648", "Ostatní provozní výnosy"), ("662", "Úroky"), ("663", "Kurzové zisky"), ("701", "Počáteční účet rozvažný"),
+    ("702", "Konečný účet rozvažný"), ("710", "Účet zisků a ztrát"),
+]
+
+HEADER = ["Účet", "Název účtu", "Počáteční stav", "Obrat MD", "Obrat D", "Konečný stav"]
+
+class TrialBalanceGenerator:
+    '''
+    Generates trial balance with given number of analytical accounts. The same seed gives the same trial balance.
+
+    Args:
+        rows (int): Number of analytical accounts
+        seed (int): Seed of random generator
+        messy (bool): Adds title rows, empty rows and amounts written as text with spaces and decimal comma
+        total_rows (bool): Adds row with totals after each synthetic account and after each class of accounts
+        drop_leading_zeros (bool): Writes accounts as numbers, so accounts of class 0 lose leading zero
+    '''
+
+    def __init__(self, rows, seed=0, messy=False, total_rows=True, drop_leading_zeros=True):
+        self.rows = rows
+        self.seed = seed
+        self.messy = messy
+        self.total_rows = total_rows
+        self.drop_leading_zeros = drop_leading_zeros
+
+    def generate_accounts(self, random):
+        '''
+        Generates analytical accounts spread over synthetic accounts
+
+        Returns:
+            accounts (list): Tuples of synthetic account, analytical account and name, sorted by account
+        '''
+        analytics_per_synthetic = max(1, -(-self.rows // len(SYNTHETIC_ACCOUNTS)))
+        analytics_width = max(3, len(str(analytics_per_synthetic)))
+
+        accounts = []
+        for synthetic_account, name in SYNTHETIC_ACCOUNTS:
+            for analytic in sorted(random.sample(range(1, 10 ** analytics_width), analytics_per_synthetic)):
+                accounts.append((synthetic_account, f"{synthetic_account}{analytic:0{analytics_width}d}",
+                                 f"{name} - analytika {analytic}"))
+
+        return sorted(random.sample(accounts, self.rows))
+
+    def format_account(self, account):
+        '''
+        Formats account as it is written to file
+
+        Args:
+            account (str): Analytical account with leading zeros
+
+        Returns:
+            account (int or str): Account as number if leading zeros are dropped, otherwise as text
+        '''
+        if self.drop_leading_zeros:
+            return int(account)
+        return account
+
+    def format_amount(self, amount):
+        '''
+        Formats amount as it is written to file
+
+        Args:
+            amount (float): Amount rounded to hundredths
+
+        Returns:
+            amount (float or str): Amount as text with spaces between thousands and decimal comma if trial balance is
+                messy, otherwise as number
+        '''
+        if self.messy:
+            return f"{amount:,.2f}".replace(",", " ").replace(".", ",")
+        return amount
+
+    def generate_rows(self):
+        '''
+        Generates rows of trial balance including header
+
+        Returns:
+            rows (list): Rows of trial balance, each row is list of values of columns
+        '''
+        random = Random(self.seed)
+        rows = []
+
+        if self.messy:
+            rows.append(["Obratová předvaha", None, None, None, None, None])
+            rows.append([f"Vygenerováno se semínkem {self.seed}", None, None, None, None, None])
+            rows.append([None] * len(HEADER))
+        rows.append(HEADER)
+
+        totals_synthetic = [0.0] * 4
+        totals_class = [0.0] * 4
+        accounts = self.generate_accounts(random)
+
+        for i, (synthetic_account, account, name) in enumerate(accounts):
+            opening_balance = round(random.uniform(-500_000, 500_000), 2) if synthetic_account[0] in "01234" else 0.0
+            debit_turnover = round(random.uniform(0, 1_000_000), 2)
+            credit_turnover = round(random.uniform(0, 1_000_000), 2)
+            end_balance = round(opening_balance + debit_turnover - credit_turnover, 2)
+            amounts = [opening_balance, debit_turnover, credit_turnover, end_balance]
+
+            rows.append([self.format_account(account), name] + [self.format_amount(amount) for amount in amounts])
+
+            totals_synthetic = [total + amount for total, amount in zip(totals_synthetic, amounts)]
+            totals_class = [total + amount for total, amount in zip(totals_class, amounts)]
+
+            synthetic_account_next = accounts[i + 1][0] if i + 1 < len(accounts) else None
+
+            if self.total_rows and synthetic_account_next != synthetic_account:
+                rows.append([f"Celkem {synthetic_account}", None]
+                            + [self.format_amount(round(total, 2)) for total in totals_synthetic])
+                totals_synthetic = [0.0] * 4
+
+            class_next = synthetic_account_next[0] if synthetic_account_next else None
+            if self.total_rows and class_next != synthetic_account[0]:
+                rows.append([f"Třída {synthetic_account[0]} celkem", None]
+                            + [self.format_amount(round(total, 2)) for total in totals_class])
+                totals_class = [0.0] * 4
+                if self.messy:
+                    rows.append([None] * len(HEADER))
+
+        return rows
+
+    def write_xlsx(self, file_path, sheet="List1"):
+        '''
+        Writes trial balance to xlsx file in write only mode of openpyxl
+        '''
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(sheet)
+        for row in self.generate_rows():
+            worksheet.append(row)
+        workbook.save(file_path)
+
+    def write_xls(self, file_path, sheet="List1"):
+        '''
+        Writes trial balance to xls file by xlwt, empty cells are not written
+        '''
+        # Package xlwt is needed only by tests for generating of xls files, it is not needed by application
+        from xlwt import Workbook
+
+        workbook = Workbook()
+        worksheet = workbook.add_sheet(sheet)
+        for row_no, row in enumerate(self.generate_rows()):
+            for column_no, value in enumerate(row):
+                if value is not None:
+                    worksheet.write(row_no, column_no, value)
+        workbook.save(file_path)
+
+    def write_csv(self, file_path, encoding="cp1250"):
+        '''
+        Writes trial balance to csv file separated by semicolons with decimal commas, as Czech accounting systems
+        export it
+        '''
+        with open(file_path, "w", encoding=encoding, newline="") as csv_file:
+            writer = csv_writer(csv_file, delimiter=";")
+            for row in self.generate_rows():
+                writer.writerow(["" if value is None else
+                                 str(value).replace(".", ",") if isinstance(value, float) else value
+                                 for value in row])
+
+    def write_ods(self, file_path, sheet="List1"):
+        '''
+        Writes OpenDocument spreadsheet without any other package, neighbouring empty cells are written as one repeated
+        cell and sheet ends with repeated empty rows in the same way as office applications save it
+        '''
+        rows_xml = []
+        for row in self.generate_rows():
+            cells_xml = []
+            empty_cells = 0
+            for value in row:
+                if value is None:
+                    empty_cells += 1
+                    continue
+                if empty_cells:
+                    cells_xml.append(f'<table:table-cell table:number-columns-repeated="{empty_cells}"/>')
+                    empty_cells = 0
+                if isinstance(value, (int, float)):
+                    cells_xml.append(f'<table:table-cell office:value-type="float" office:value="{value}">'
+                                     f'<text:p>{value}</text:p></table:table-cell>')
+                else:
+                    cells_xml.append(f'<table:table-cell office:value-type="string"><text:p>{escape(value)}</text:p>'
+                                     f'</table:table-cell>')
+            cells_xml.append('<table:table-cell table:number-columns-repeated="1018"/>')
+            rows_xml.append(f"<table:table-row>{''.join(cells_xml)}</table:table-row>")
+        rows_xml.append('<table:table-row table:number-rows-repeated="1048000"><table:table-cell '
+                        'table:number-columns-repeated="1024"/></table:table-row>')
+
+        content_xml = ('<?xml version="1.0" encoding="UTF-8"?><office:document-content '
+                       'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+                       'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+                       'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" office:version="1.2">'
+                       f'<office:body><office:spreadsheet><table:table table:name={quoteattr(sheet)}>'
+                       f"{''.join(rows_xml)}</table:table></office:spreadsheet></office:body>"
+                       '</office:document-content>')
+        manifest_xml = ('<?xml version="1.0" encoding="UTF-8"?><manifest:manifest '
+                        'xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" manifest:version="1.2">'
+                        '<manifest:file-entry manifest:full-path="/" '
+                        'manifest:media-type="application/vnd.oasis.opendocument.spreadsheet"/>'
+                        '<manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>'
+                        '</manifest:manifest>')
+
+        with ZipFile(file_path, "w") as ods_zip:
+            ods_zip.writestr("mimetype", "application/vnd.oasis.opendocument.spreadsheet", ZIP_STORED)
+            ods_zip.writestr("META-INF/manifest.xml", manifest_xml, ZIP_DEFLATED)
+            ods_zip.writestr("content.xml", content_xml, ZIP_DEFLATED)
+
+    def write(self, file_path, sheet="List1"):
+        '''
+        Writes trial balance to file, format is given by extension of file: xlsx, xls, ods or csv
+
+        Args:
+            file_path (str): Path to created file
+            sheet (str): Sheet with trial balance, not used for csv
+        '''
+        extension = path.splitext(file_path)[1].lower()
+        if extension == ".xls":
+            self.write_xls(file_path, sheet)
+        elif extension == ".csv":
+            self.write_csv(file_path)
+        elif extension == ".ods":
+            self.write_ods(file_path, sheet)
+        else:
+            self.write_xlsx(file_path, sheet)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Generates synthetic trial balance.")
+    parser.add_argument("file_path", help="Path to created file, format is given by extension: xlsx, xls, ods or csv")
+    parser.add_argument("--rows", type=int, default=10_000, help="Number of analytical accounts")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of random generator")
+    parser.add_argument("--messy", action="store_true", help="Adds title rows, empty rows and amounts as text")
+    parser.add_argument("--no-totals", action="store_true", help="Does not add rows with totals")
+    parser.add_argument("--keep-leading-zeros", action="store_true", help="Writes accounts as text")
+    args = parser.parse_args(argv[1:])
+
+    TrialBalanceGenerator(args.rows, args.seed, args.messy, not args.no_totals,
+                          not args.keep_leading_zeros).write(args.file_path)
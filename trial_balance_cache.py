@@ -0,0 +1,194 @@
+from os import path, makedirs, listdir, remove, replace, stat, utime, getpid
+from hashlib import sha256
+from zipfile import BadZipFile
+from tempfile import TemporaryDirectory
+from numpy import array, load, savez
+from pandas import DataFrame, Index
+from excel_reader import PROJECTED_EXTENSIONS, PROJECTED_SHEET, PROJECTED_COLUMNS, write_trial_balance_xlsx, \
+    get_file_content
+
+# Version of reading and normalization of trial balance, change of it invalidates all cached trial balances
+READER_VERSION = "1"
+
+class TrialBalanceCache:
+    '''
+    Cache of trial balances already read by TrialBalanceReader stored on disk. Key of cached trial balance is made of
+    content of file, sheet, columns and reader version, so changed file or different choice of columns is read again.
+    Least recently used trial balances are removed when size of cache exceeds its limit.
+
+    Args:
+        cache_dir (str): Path to folder with cached trial balances
+        max_size (int): Maximal size of all cached trial balances in bytes
+        enabled (bool): Turns cache off when False, trial balances are always read from file then
+    '''
+
+    def __init__(self, cache_dir="cache/trial_balances", max_size=500 * 1024 ** 2, enabled=True):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.enabled = enabled
+
+        if self.enabled:
+            makedirs(self.cache_dir, exist_ok=True)
+
+    def get_key(self, file_path, sheet, account_col, debit_turnover_col, credit_turnover_col, end_balance_col):
+        '''
+        Creates key of cached trial balance, content of file listed by excel_reader.list_sheets before is not read again
+
+        Returns:
+            key (str): Hash of file content, sheet, columns and reader version
+        '''
+        key_hash = sha256()
+        content = get_file_content(file_path)
+        if content is not None:
+            key_hash.update(content)
+        else:
+            with open(file_path, "rb") as trial_balance_file:
+                for chunk in iter(lambda: trial_balance_file.read(1024 ** 2), b""):
+                    key_hash.update(chunk)
+
+        settings = [sheet, account_col, debit_turnover_col, credit_turnover_col, end_balance_col, READER_VERSION]
+        key_hash.update("\0".join(settings).encode("utf-8"))
+        return key_hash.hexdigest()
+
+    def get_final_df(self, file_path, sheet, account_col, debit_turnover_col, credit_turnover_col, end_balance_col):
+        '''
+        Gets trial balance in shape given by TrialBalanceReader.get_final_df from cache or reads it from file and stores
+        it to cache
+
+        Args:
+            file_path (str): For TrialBalanceReader
+            sheet (str): For TrialBalanceReader
+            account_col (str): For TrialBalanceReader
+            debit_turnover_col (str): For TrialBalanceReader
+            credit_turnover_col (str): For TrialBalanceReader
+            end_balance_col (str): For TrialBalanceReader
+
+        Returns:
+            final_df (DataFrame): Trial balance
+        '''
+        if not self.enabled:
+            return self.read(file_path, sheet, account_col, debit_turnover_col, credit_turnover_col, end_balance_col)
+
+        key = self.get_key(file_path, sheet, account_col, debit_turnover_col, credit_turnover_col, end_balance_col)
+        cache_path = path.join(self.cache_dir, f"{key}.npz")
+
+        if path.exists(cache_path):
+            try:
+                utime(cache_path)  # Marking as recently used
+                return self.load(cache_path)
+            except (OSError, ValueError, KeyError, BadZipFile):
+                pass  # Removed by eviction of another process meanwhile or corrupt, read again and stored over it
+
+        final_df = self.read(file_path, sheet, account_col, debit_turnover_col, credit_turnover_col, end_balance_col)
+
+        if self.store(final_df, cache_path):
+            self.evict()
+
+        return final_df
+
+    def read(self, file_path, sheet, account_col, debit_turnover_col, credit_turnover_col, end_balance_col):
+        '''
+        Reads trial balance from file by TrialBalanceReader. Trial balance from csv or ods file is projected into
+        temporary xlsx file first, because TrialBalanceReader reads only excel files and its normalization of trial
+        balance is not available otherwise. Writing and parsing of the projected file make reading of csv or ods file
+        slower than reading of the same trial balance in xlsx file, cache then saves the whole reading.
+
+        Returns:
+            final_df (DataFrame): Trial balance
+        '''
+        from trial_balance_reader import TrialBalanceReader  # Imported at first use to speed up start of application
+
+        if path.splitext(file_path)[1].lower() not in PROJECTED_EXTENSIONS:
+            reader = TrialBalanceReader(file_path, sheet, account_col, debit_turnover_col, credit_turnover_col,
+                                        end_balance_col)
+            return reader.get_final_df()
+
+        with TemporaryDirectory() as projected_dir:
+            projected_path = path.join(projected_dir, "trial_balance.xlsx")
+            write_trial_balance_xlsx(file_path, sheet, account_col, debit_turnover_col, credit_turnover_col,
+                                     end_balance_col, projected_path)
+            reader = TrialBalanceReader(projected_path, PROJECTED_SHEET, *PROJECTED_COLUMNS)
+            return reader.get_final_df()
+
+    def store(self, final_df, cache_path):
+        '''
+        Stores trial balance to cache as numpy arrays, one array for each column. Columns of text are stored as fixed
+        width strings, trial balance with other objects in columns, index or column names is not stored.
+
+        Returns:
+            stored (bool): True if trial balance was stored
+        '''
+        if not all(isinstance(column, str) for column in final_df.columns):
+            return False
+
+        arrays = {"columns": array(list(final_df.columns)), "index": final_df.index.to_numpy()}
+
+        if arrays["index"].dtype == object:
+            return False
+
+        for column_no, column in enumerate(final_df.columns):
+            values = final_df[column].to_numpy()
+            if values.dtype == object:
+                if not all(isinstance(value, str) for value in values):
+                    return False
+                values = values.astype(str)
+            arrays[f"column_{column_no}"] = values
+
+        # Writing to temporary file first, so other process never loads half written file
+        temporary_path = f"{cache_path}.{getpid()}.tmp.npz"
+        savez(temporary_path, **arrays)
+        replace(temporary_path, cache_path)
+        return True
+
+    def load(self, cache_path):
+        '''
+        Loads trial balance stored in cache
+
+        Returns:
+            final_df (DataFrame): Trial balance
+        '''
+        with load(cache_path, allow_pickle=False) as arrays:
+            columns = list(arrays["columns"])
+            final_df = DataFrame({column: arrays[f"column_{column_no}"] for column_no, column in enumerate(columns)},
+                                 index=Index(arrays["index"]))
+
+        # Columns of text are returned as objects as they were given by TrialBalanceReader
+        for column in columns:
+            if final_df[column].dtype.kind == "U":
+                final_df[column] = final_df[column].astype(object)
+
+        return final_df
+
+    def evict(self):
+        '''
+        Removes least recently used trial balances until size of cache is within its limit
+        '''
+        cached_files = []
+        for file_name in listdir(self.cache_dir):
+            if file_name.endswith(".npz") and ".tmp." not in file_name:
+                try:
+                    file_stat = stat(path.join(self.cache_dir, file_name))
+                except FileNotFoundError:
+                    continue  # Removed by another process
+                cached_files.append((file_stat.st_mtime, file_stat.st_size, file_name))
+
+        cache_size = sum(file_size for _, file_size, _ in cached_files)
+        for _, file_size, file_name in sorted(cached_files):
+            if cache_size <= self.max_size:
+                break
+            try:
+                remove(path.join(self.cache_dir, file_name))
+            except FileNotFoundError:
+                pass  # Already removed by another process
+            cache_size -= file_size
+
+    def clear(self):
+        '''
+        Removes all cached trial balances
+        '''
+        if not path.isdir(self.cache_dir):
+            return
+
+        for file_name in listdir(self.cache_dir):
+            if file_name.endswith(".npz"):
+                remove(path.join(self.cache_dir, file_name))
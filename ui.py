@@ -1,14 +1,16 @@
 from sys import argv
 from json import load
-from pandas import ExcelFile
+from time import perf_counter
 from string import ascii_uppercase
-from trial_balance_reader import TrialBalanceReader
-from calculations import Calculator
-from report_writer import ReportWriter
-from os import path
-from PyQt6 import QtWidgets, QtGui
-from secret_keys import encrypt_message_with_key
-from requests import get
+from importlib import import_module
+from os import path, environ
+from PyQt6 import QtWidgets, QtGui, QtCore
+from licence_check import LicenceClient, LicenceToken, load_token_key, TOKEN_PATH, USERNAME_STAMP_PATH, \
+    LICENCE_VALID, USER_UNKNOWN, PASSWORD_INVALID, LICENCE_EXPIRED
+
+# Modules needed for calculation are imported at first use, not at start of application. Those are imported in
+# background as soon as user chooses trial balance.
+CALCULATION_MODULES = ("excel_reader", "calculation_plan", "report_writer", "stage_metrics", "batch_runner")
 
 class App(QtWidgets.QApplication):
     '''
@@ -17,13 +19,17 @@ class App(QtWidgets.QApplication):
     Args:
         logger (instance): Instance of logger provided by executive file
         timestamp (str): Stamp with time when executable file was run
+        time_start (float): Value of time.perf_counter when executable file was run, startup time is logged if given
+        import_timer (ImportTimer): Timer of imports since start of executable file, import times are logged if given
     '''
 
-    def __init__(self, logger, timestamp):
+    def __init__(self, logger, timestamp, time_start=None, import_timer=None):
         super(App, self).__init__(argv)
 
         self.logger = logger
         self.timestamp = timestamp
+        self.time_start = time_start
+        self.import_timer = import_timer
 
     def build(self, report_config_path, report_template_path):
         '''
@@ -54,8 +60,22 @@ class App(QtWidgets.QApplication):
         self.trialBalanceLoadForm.setup()
         self.trialBalanceSetForm.setup()
 
+        # Logging startup time as soon as event loop starts and first form is painted
+        QtCore.QTimer.singleShot(0, self.log_startup)
+
         self.exit(self.exec())
 
+    def log_startup(self):
+        '''
+        Logs time from start of executable file to showing of first form and times of imports
+        '''
+        if self.time_start is not None:
+            self.logger.info(f"First form shown {perf_counter() - self.time_start:.3f} s after start\n")
+
+        if self.import_timer is not None:
+            self.import_timer.uninstall()  # Imports at first use are not measured, finder is not slowing them down
+            self.import_timer.log_import_times(self.logger)
+
 class UserAuthenticationForm(QtWidgets.QWidget):
     '''
     Processing authentication of user. Validation of users license.
@@ -66,6 +86,10 @@ class UserAuthenticationForm(QtWidgets.QWidget):
          report_info (dict): Includes info part of configuration file
     '''
 
+    # Setting encryption
+    KEY = b'AAA='
+    KEY_FILENAME = "aaa.key"
+
     def __init__(self, root, logger, report_info, **kwargs):
         super(UserAuthenticationForm, self).__init__(**kwargs)
 
@@ -73,6 +97,10 @@ class UserAuthenticationForm(QtWidgets.QWidget):
         self.root = root
         self.logger = logger
 
+        # Licence checking on web, client is created at first login, and token of last successful check
+        self.licenceClient = None
+        self.licenceToken = LicenceToken(TOKEN_PATH, load_token_key())
+
         # Getting report information
         self.report_info = report_info
         self.report_year = self.report_info.get('report_year')
@@ -103,15 +131,15 @@ class UserAuthenticationForm(QtWidgets.QWidget):
         mainLayout.addWidget(authenticationLabel)
 
         # Read last known existing username
-        with open("logs/username_stamp.txt", "r") as username_stamp_file:
-            username_stamp = username_stamp_file.read()
+        with open(USERNAME_STAMP_PATH, "r") as username_stamp_file:
+            self.username_stamp = username_stamp_file.read()
         username_stamp_file.close()
 
         # Username input
         userNameLayout = QtWidgets.QHBoxLayout()
         userNameLayout.addWidget(QtWidgets.QLabel("Email uživatele:"))
         userNameLayout.addStretch()
-        self.username = QtWidgets.QLineEdit(username_stamp)
+        self.username = QtWidgets.QLineEdit(self.username_stamp)
         userNameLayout.addWidget(self.username)
         mainLayout.addLayout(userNameLayout)
 
@@ -145,59 +173,125 @@ class UserAuthenticationForm(QtWidgets.QWidget):
 
     def setup(self):
         '''
-        Sets up references to other forms
+        Sets up references to other forms. Continues directly to next form if licence was checked lately.
         '''
         self.trialBalanceLoadForm = self.root.trialBalanceLoadForm
 
+        if self.licenceToken.is_valid(self.username_stamp, self.report_info.get("product_name")):
+            self.logger.info("Licence check skipped, token of last check is valid")
+            self.trialBalanceLoadForm.show()
+            self.close()
+
     def loginButtonClicked(self):
         '''
-        Gets user credentials, encrypts them and sends them to web. Checks if user can continue to application based on
-        information provided by response from web.
+        Gets user credentials, encrypts them and sends them to web in background. Result is processed by
+        licenceChecked or licenceCheckFailed.
         '''
         self.loginErrorLabel.setText("")
         try:
-            # Setting encryption
-            KEY = b'AAA='
-            KEY_FILENAME = "aaa.key"
+            from secret_keys import encrypt_message_with_key  # Imported at first use to speed up start of application
+
+            if self.licenceClient is None:
+                self.licenceClient = LicenceClient()
 
             # Getting user credentials
             self.username_text = self.username.text()
             self.password_text = self.password.text()
 
-            self.username_encrypted = encrypt_message_with_key(self.username_text, KEY, KEY_FILENAME)
-            self.password_encrypted = encrypt_message_with_key(self.password_text, KEY, KEY_FILENAME)
+            self.username_encrypted = encrypt_message_with_key(self.username_text, self.KEY, self.KEY_FILENAME)
+            self.password_encrypted = encrypt_message_with_key(self.password_text, self.KEY, self.KEY_FILENAME)
 
-            # Sending get request
-            credentials = {"username_encrypted": self.username_encrypted, "username_key_filename": KEY_FILENAME,
-                           "password_encrypted": self.password_encrypted, "password_key_filename": KEY_FILENAME,
+            # Sending get request in background, form stays responsive
+            credentials = {"username_encrypted": self.username_encrypted, "username_key_filename": self.KEY_FILENAME,
+                           "password_encrypted": self.password_encrypted, "password_key_filename": self.KEY_FILENAME,
                            "product_name": self.report_info.get("product_name")}
-            response = get("https://dcba.cz/user_zone/external_request/", params=credentials)  # For production
-            # response = get("http://127.0.0.1:8000/user_zone/external_request/", params=credentials)  # For mirror
 
+            self.licenceCheckRunnable = LicenceCheckRunnable(self.licenceClient, credentials, self.logger)
+            self.licenceCheckRunnable.signals.finished.connect(self.licenceChecked)
+            self.licenceCheckRunnable.signals.failed.connect(self.licenceCheckFailed)
+
+            self.loginButton.setEnabled(False)
+            QtCore.QThreadPool.globalInstance().start(self.licenceCheckRunnable)
+
+        except:
+            self.logger.exception("")
+            self.loginErrorLabel.setText("Nepodařilo se spojit s webem dcba.cz.")
+
+    def licenceChecked(self, result):
+        '''
+        Checks if user can continue to application based on result of licence check
+
+        Args:
+            result (str): Result of LicenceClient.check
+        '''
+        self.loginButton.setEnabled(True)
+        try:
             # Write last known existing username
-            if response.headers.get("user_exists") == "True":
-                with open("logs/username_stamp.txt", "w") as username_stamp_file:
+            if result != USER_UNKNOWN:
+                with open(USERNAME_STAMP_PATH, "w") as username_stamp_file:
                     username_stamp_file.write(self.username_text)
                 username_stamp_file.close()
 
             # Checking if user can continue to application
-            if response.headers.get("user_exists") != "True":
+            if result == USER_UNKNOWN:
                 self.loginErrorLabel.setText("Neznámý uživatel. Zkontrolujte správné zadání emailu nebo se registrujte"
                                              " na webu dcba.cz.")
 
-            elif response.headers.get("user_is_authenticated") != "True":
+            elif result == PASSWORD_INVALID:
                 self.loginErrorLabel.setText("Neplatné heslo. Zkuste zadat znovu nebo navštivte web dcba.cz.")
 
-            elif response.headers.get("licence_is_valid") != "True":
+            elif result == LICENCE_EXPIRED:
                 self.loginErrorLabel.setText("Licence vypršela. Pro objednání nové navštivte web dcba.cz.")
 
-            else:
+            elif result == LICENCE_VALID:
+                self.licenceToken.save(self.username_text, self.report_info.get("product_name"))
                 self.trialBalanceLoadForm.show()
                 self.close()
 
         except:
             self.logger.exception("")
-            self.loginErrorLabel.setText("Nepodařilo se spojit s webem dcba.cz.")
+
+    def licenceCheckFailed(self):
+        '''
+        Shows error after licence check failed, e.g. web did not respond in time
+        '''
+        self.loginButton.setEnabled(True)
+        self.loginErrorLabel.setText("Nepodařilo se spojit s webem dcba.cz.")
+
+class LicenceCheckSignals(QtCore.QObject):
+    '''
+    Signals of LicenceCheckRunnable, runnable itself cannot emit signals
+    '''
+    finished = QtCore.pyqtSignal(str)
+    failed = QtCore.pyqtSignal()
+
+class LicenceCheckRunnable(QtCore.QRunnable):
+    '''
+    Checks licence on web in thread pool out of GUI thread
+
+    Args:
+        licence_client (LicenceClient): Client with session for licence checking
+        credentials (dict): Encrypted credentials for LicenceClient.check
+        logger (instance): Instance of logger provided by executive file
+    '''
+
+    def __init__(self, licence_client, credentials, logger):
+        super(LicenceCheckRunnable, self).__init__()
+
+        self.licence_client = licence_client
+        self.credentials = credentials
+        self.logger = logger
+        self.signals = LicenceCheckSignals()
+
+    def run(self):
+        '''
+        Runs licence check and emits signal with its result
+        '''
+        try:
+            self.signals.finished.emit(self.licence_client.check(self.credentials))
+        except:
+            self.logger.exception("")
+            self.signals.failed.emit()
 
 class TrialBalanceLoadForm(QtWidgets.QWidget):
     '''
@@ -244,8 +338,8 @@ class TrialBalanceLoadForm(QtWidgets.QWidget):
 
         # Choose trial balance to load
         loadLayout = QtWidgets.QHBoxLayout()
-        loadLayout.addWidget(QtWidgets.QLabel("Vyberte prosím excelový soubor, který obsahuje obratovou předvahu za"
-                                               " sledované období:"))
+        loadLayout.addWidget(QtWidgets.QLabel("Vyberte prosím soubor Excel, OpenDocument nebo CSV, který obsahuje"
+                                               " obratovou předvahu za sledované období:"))
         loadLayout.addStretch()
         self.loadButton = QtWidgets.QPushButton("Vybrat soubor")
         self.loadButton.clicked.connect(self.loadButtonClicked)
@@ -282,9 +376,14 @@ class TrialBalanceLoadForm(QtWidgets.QWidget):
         """
         try:
             self.trial_balance_path, self.filter = QtWidgets.QFileDialog.getOpenFileName(
-                parent=self, caption="Vybrat soubor", directory=".", filter="Excel (*.xlsx *.xls)")
+                parent=self, caption="Vybrat soubor", directory=".",
+                filter="Předvaha (*.xlsx *.xls *.ods *.csv);;Excel (*.xlsx *.xls);;OpenDocument (*.ods);;CSV (*.csv)")
             self.trial_balance_loaded.setText(f"Vybraný soubor: {self.trial_balance_path}")
             self.continueErrorLabel.setText("")
+
+            # Importing modules needed for calculation while user continues with setting of trial balance
+            if self.trial_balance_path != "":
+                QtCore.QThreadPool.globalInstance().start(ImportRunnable(CALCULATION_MODULES, self.logger))
         except:
             self.logger.exception("")
 
@@ -337,6 +436,13 @@ class TrialBalanceSetForm(QtWidgets.QWidget):
 
         self.trial_balance_path = ""
 
+        # Report config and template are prepared at first calculation and reused for following ones
+        self.calculation_plan = None
+        self.report_template = None
+        self.stage_metrics = None
+        self.trial_balance_cache = None
+        self.report_job = None
+
         # Creating bold font ###########################################################################################
         boldFont = QtGui.QFont()
         boldFont.setBold(True)
@@ -458,6 +564,10 @@ class TrialBalanceSetForm(QtWidgets.QWidget):
         self.calculationButton = QtWidgets.QPushButton("Vypočítat")
         self.calculationButton.clicked.connect(self.calculationButtonClicked)
         calculationLayout.addWidget(self.calculationButton)
+        self.cancelButton = QtWidgets.QPushButton("Zrušit")
+        self.cancelButton.clicked.connect(self.cancelButtonClicked)
+        self.cancelButton.setEnabled(False)
+        calculationLayout.addWidget(self.cancelButton)
         mainLayout.addLayout(calculationLayout)
 
         # End of form
@@ -484,8 +594,9 @@ class TrialBalanceSetForm(QtWidgets.QWidget):
         Finds all sheets in excel file and sets them to the box in form.
         '''
         try:
-            excel_sheets_file = ExcelFile(self.trial_balance_path)
-            self.excel_sheets = excel_sheets_file.sheet_names
+            from excel_reader import list_sheets  # Imported at first use to speed up start of application
+
+            self.excel_sheets = list_sheets(self.trial_balance_path)
             self.excelSheetsBox.addItems(self.excel_sheets)
         except:
             self.logger.exception("")
@@ -501,36 +612,161 @@ class TrialBalanceSetForm(QtWidgets.QWidget):
             self.calculationErrorLabel.setText("Nelze vypočítat! Nebyla provedena volba listu a všech slopců výše.")
         else:
             try:
-                # Reading trial balance and forming it to shape needed in Calculator class
-                reader = TrialBalanceReader(self.trial_balance_path,
-                                                                 self.excelSheetsBox.currentText(),
-                                                                 self.accountColBox.currentText(),
-                                                                 self.debitTurnoverColBox.currentText(),
-                                                                 self.creditTurnoverColBox.currentText(),
-                                                                 self.endBalanceColBox.currentText())
-                final_df = reader.get_final_df()
-
-                # Calculating report
-                calculator = Calculator(self.report_config_path, final_df)
-                report_calculated = calculator.calculation_handler()
-
-                # In case of need:
-                # calculator.save_report_to_json(self.timestamp)
+                # Imported at first use to speed up start of application
+                from calculation_plan import CalculationPlan
+                from report_writer import ReportTemplate
+                from batch_runner import BatchJob, ReportJob
+                from stage_metrics import StageMetrics
+                from trial_balance_cache import TrialBalanceCache
+
+                # Loading report config and template only once, metrics of stages are written next to log file and
+                # slow calculation is profiled if path to profile is set in environment variable STATS_PROFILE
+                if self.calculation_plan is None:
+                    self.calculation_plan = CalculationPlan(self.report_config_path)
+                    self.report_template = ReportTemplate(self.report_template_path)
+                    self.stage_metrics = StageMetrics(f"logs/metrics_{self.timestamp}.jsonl",
+                                                      profile_path=environ.get("STATS_PROFILE"))
+
+                    # Calculation repeated after change of columns or config does not parse the same file again, cache
+                    # is turned off by environment variable STATS_NO_CACHE
+                    self.trial_balance_cache = TrialBalanceCache(enabled="STATS_NO_CACHE" not in environ)
+
+                job = BatchJob(self.trial_balance_path, self.excelSheetsBox.currentText(),
+                               self.accountColBox.currentText(), self.debitTurnoverColBox.currentText(),
+                               self.creditTurnoverColBox.currentText(), self.endBalanceColBox.currentText())
 
                 # Creating output file name in the same folder where the trial balance is located
                 report_output_dirname = path.dirname(self.trial_balance_path)
                 self.report_output_path = f"{report_output_dirname}/{self.report_code_snake_case}_{self.timestamp}.pdf"
 
-                # Writing calculated report into output file
-                writer = ReportWriter(report_calculated, self.report_template_path, self.report_output_path)
-                report_output = writer.write_report_by_watermark()
-
-                # Changing error label
-                self.calculationErrorLabel.setStyleSheet("color: green;")
-                self.calculationErrorLabel.setText(f"Výkaz byl vypočítán a uložen do souboru: {self.report_output_path}")
+                # Reading, calculating and writing report runs in background, form stays responsive
+                self.report_job = ReportJob(job, self.report_output_path, self.calculation_plan, self.report_template,
+                                            self.trial_balance_cache, stage_metrics=self.stage_metrics)
+                self.reportJobRunnable = ReportJobRunnable(self.report_job, self.logger)
+                self.reportJobRunnable.signals.progress.connect(self.calculationProgress)
+                self.reportJobRunnable.signals.finished.connect(self.calculationFinished)
+                self.reportJobRunnable.signals.failed.connect(self.calculationFailed)
+                self.reportJobRunnable.signals.cancelled.connect(self.calculationCancelled)
+
+                self.calculationButton.setEnabled(False)
+                self.cancelButton.setEnabled(True)
+                QtCore.QThreadPool.globalInstance().start(self.reportJobRunnable)
             except:
                 self.logger.exception("")
 
+    def cancelButtonClicked(self):
+        '''
+        Requests cancellation of running calculation, it stops before next stage
+        '''
+        if self.report_job is not None:
+            self.report_job.cancel()
+            self.cancelButton.setEnabled(False)
+
+    def calculationProgress(self, stage):
+        '''
+        Shows stage of running calculation
+
+        Args:
+            stage (str): Name of stage from ReportJob.STAGES
+        '''
+        stage_texts = {"reading": "Načítání obratové předvahy...", "calculating": "Výpočet výkazu...",
+                       "writing": "Zápis výkazu do souboru..."}
+        self.calculationErrorLabel.setStyleSheet("color: black;")
+        self.calculationErrorLabel.setText(stage_texts.get(stage, ""))
+
+    def calculationFinished(self):
+        '''
+        Shows path to output file after calculation finished
+        '''
+        self.calculationButton.setEnabled(True)
+        self.cancelButton.setEnabled(False)
+        self.calculationErrorLabel.setStyleSheet("color: green;")
+        self.calculationErrorLabel.setText(f"Výkaz byl vypočítán a uložen do souboru: {self.report_output_path}")
+
+    def calculationFailed(self):
+        '''
+        Shows error after calculation failed, the error itself is logged by runnable
+        '''
+        self.calculationButton.setEnabled(True)
+        self.cancelButton.setEnabled(False)
+        self.calculationErrorLabel.setStyleSheet("color: red;")
+        self.calculationErrorLabel.setText("Výkaz se nepodařilo vypočítat. Zkontrolujte volbu listu a sloupců.")
+
+    def calculationCancelled(self):
+        '''
+        Shows info after calculation was cancelled
+        '''
+        self.calculationButton.setEnabled(True)
+        self.cancelButton.setEnabled(False)
+        self.calculationErrorLabel.setStyleSheet("color: #FF8C00;")
+        self.calculationErrorLabel.setText("Výpočet byl zrušen.")
+
+class ReportJobSignals(QtCore.QObject):
+    '''
+    Signals of ReportJobRunnable, runnable itself cannot emit signals
+    '''
+    progress = QtCore.pyqtSignal(str)
+    finished = QtCore.pyqtSignal()
+    failed = QtCore.pyqtSignal()
+    cancelled = QtCore.pyqtSignal()
+
+class ReportJobRunnable(QtCore.QRunnable):
+    '''
+    Runs report job in thread pool out of GUI thread. Progress and result of job are sent to form by signals.
+
+    Args:
+        report_job (ReportJob): Job to be run
+        logger (instance): Instance of logger provided by executive file
+    '''
+
+    def __init__(self, report_job, logger):
+        super(ReportJobRunnable, self).__init__()
+
+        self.report_job = report_job
+        self.logger = logger
+        self.signals = ReportJobSignals()
+        self.report_job.progress_callback = self.signals.progress.emit
+
+    def run(self):
+        '''
+        Runs report job and emits signal based on its result
+        '''
+        from batch_runner import JobCancelled
+
+        try:
+            self.report_job.run()
+            self.signals.finished.emit()
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except:
+            self.logger.exception("")
+            self.signals.failed.emit()
+
+class ImportRunnable(QtCore.QRunnable):
+    '''
+    Imports modules in thread pool out of GUI thread, so they are ready when they are needed
+
+    Args:
+        module_names (tuple): Names of modules to be imported
+        logger (instance): Instance of logger provided by executive file
+    '''
+
+    def __init__(self, module_names, logger):
+        super(ImportRunnable, self).__init__()
+
+        self.module_names = module_names
+        self.logger = logger
+
+    def run(self):
+        '''
+        Imports modules, error is only logged because import is repeated at first use of module
+        '''
+        try:
+            for module_name in self.module_names:
+                import_module(module_name)
+        except:
+            self.logger.exception("")
+
 '''
 Inspiration for running this application
 '''